@@ -0,0 +1,418 @@
+"""Indexed archive of completed manifests, rotated into monthly directories"""
+
+import datetime
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import zipfile
+from contextlib import closing
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+import yaml
+
+INDEX_NAME = "archive_index.sqlite"
+MONTH_FORMAT = "%Y-%m"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS manifests (
+    name TEXT NOT NULL,
+    path TEXT NOT NULL,
+    archived REAL NOT NULL,
+    sha256 TEXT
+);
+CREATE INDEX IF NOT EXISTS manifests_name ON manifests (name);
+"""
+
+
+class ArchiveEntry(NamedTuple):
+    """Latest archived manifest of a dataset name"""
+
+    name: str
+    path: str
+    archived: float
+    sha256: Optional[str]
+
+
+def manifest_digest(path: str) -> Optional[str]:
+    """SHA-256 of a manifest file, None if it cannot be read"""
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def _is_month(name: str) -> bool:
+    """True if a directory entry is named like a monthly archive directory"""
+    try:
+        datetime.datetime.strptime(name, MONTH_FORMAT)
+    except ValueError:
+        return False
+    return True
+
+
+class ManifestArchive:
+    """Index of the manifest complete directory
+
+    Archived manifests go to a ``YYYY-MM`` subdirectory, so no directory
+    listing grows without bound, and months older than a retention period are
+    compacted into ``YYYY-MM.zip``. The index maps each dataset name to its
+    latest archived manifest; it is kept in SQLite next to the archive and
+    loaded into a dictionary once, so duplicate checks are constant time.
+    Paths in the index are relative to the archive directory.
+    """
+
+    def __init__(self, directory: str):
+        """Construct ManifestArchive
+
+        Parameters
+        ----------
+        directory : str
+            manifest complete directory
+        """
+        self.directory = directory
+        self.index_path = os.path.join(directory, INDEX_NAME)
+        self._entries: Optional[Dict[str, ArchiveEntry]] = None
+        self._lock = threading.RLock()
+        # Held while rotating and compacting, which move and remove files
+        self._maintaining = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the index and create its table"""
+        connection = sqlite3.connect(self.index_path, timeout=30)
+        connection.executescript(SCHEMA)
+        return connection
+
+    def _load(self) -> Dict[str, ArchiveEntry]:
+        """Latest entry of every name, read from the index on first use"""
+        if self._entries is None:
+            with closing(self._connect()) as connection:
+                rows = connection.execute(
+                    "SELECT name, path, archived, sha256 FROM manifests"
+                    " ORDER BY archived"
+                )
+                self._entries = {row[0]: ArchiveEntry(*row) for row in rows}
+        return self._entries
+
+    def lookup(self, name: str) -> Optional[ArchiveEntry]:
+        """Latest archived manifest of a dataset name
+
+        Parameters
+        ----------
+        name : str
+            dataset name of the manifest
+
+        Returns
+        -------
+        Optional[ArchiveEntry]
+            None if the name was never archived
+        """
+        with self._lock:
+            return self._load().get(name)
+
+    def month_directory(self, when: Optional[datetime.datetime] = None) -> str:
+        """Archive directory of a month, created if needed
+
+        Parameters
+        ----------
+        when : Optional[datetime.datetime]
+            date in the month, now if None
+
+        Returns
+        -------
+        str
+            the monthly directory, or the archive directory itself if the
+            monthly directory cannot be created
+        """
+        month = (when or datetime.datetime.now()).strftime(MONTH_FORMAT)
+        path = os.path.join(self.directory, month)
+        try:
+            os.mkdir(path)
+        except FileExistsError:
+            pass
+        except OSError:
+            return self.directory
+        return path
+
+    def current_directory(self, keep_months: Optional[int]) -> str:
+        """This month's archive directory, compacting old months when a new
+        month starts
+
+        Parameters
+        ----------
+        keep_months : Optional[int]
+            number of recent months kept as directories, None never compacts
+
+        Returns
+        -------
+        str
+            directory to archive manifests to
+        """
+        path = os.path.join(
+            self.directory, datetime.datetime.now().strftime(MONTH_FORMAT)
+        )
+        if os.path.isdir(path):
+            return path
+        directory = self.month_directory()
+        if directory != self.directory:
+            self.maintain(keep_months)
+        return directory
+
+    def add(
+        self,
+        name: str,
+        path: str,
+        sha256: Optional[str],
+        archived: Optional[float] = None,
+    ) -> ArchiveEntry:
+        """Index an archived manifest
+
+        Parameters
+        ----------
+        name : str
+            dataset name of the manifest
+        path : str
+            archived manifest file
+        sha256 : Optional[str]
+            digest of the manifest content
+        archived : Optional[float]
+            time it was archived, now if None
+
+        Returns
+        -------
+        ArchiveEntry
+            the new entry
+        """
+        entry = ArchiveEntry(
+            name,
+            os.path.relpath(path, self.directory),
+            time.time() if archived is None else archived,
+            sha256,
+        )
+        self._insert([entry])
+        return entry
+
+    def _insert(self, entries: List[ArchiveEntry]) -> None:
+        """Write entries to the index in one transaction"""
+        with self._lock:
+            latest = self._load()
+            with closing(self._connect()) as connection, connection:
+                connection.executemany(
+                    "INSERT INTO manifests (name, path, archived, sha256)"
+                    " VALUES (?, ?, ?, ?)",
+                    entries,
+                )
+            for entry in entries:
+                if (
+                    entry.name not in latest
+                    or latest[entry.name].archived <= entry.archived
+                ):
+                    latest[entry.name] = entry
+
+    def rotate(self) -> int:
+        """Move manifests archived before rotation into their monthly
+        directory, by modification time, and index them. Manifests of a month
+        already compacted are added to its zip instead
+
+        Returns
+        -------
+        int
+            number of manifests moved
+        """
+        with os.scandir(self.directory) as entries:
+            loose = [
+                entry.path
+                for entry in entries
+                if entry.is_file() and "manifest" in entry.name
+            ]
+        indexed = []
+        compacted: Dict[str, List[Tuple[str, ArchiveEntry]]] = {}
+        for path in loose:
+            mtime = os.path.getmtime(path)
+            entry = ArchiveEntry(
+                self._manifest_name(path), path, mtime, manifest_digest(path)
+            )
+            when = datetime.datetime.fromtimestamp(mtime)
+            month = when.strftime(MONTH_FORMAT)
+            if os.path.isfile(os.path.join(self.directory, month + ".zip")):
+                compacted.setdefault(month, []).append((path, entry))
+                continue
+            target = os.path.join(self.month_directory(when), os.path.basename(path))
+            shutil.move(path, target)
+            indexed.append(entry._replace(path=os.path.relpath(target, self.directory)))
+        for month, files in compacted.items():
+            members = self._zip_files(month, [path for path, _ in files])
+            for path, entry in files:
+                os.remove(path)
+                indexed.append(entry._replace(path=f"{month}.zip/{members[path]}"))
+        self._insert([entry for entry in indexed if entry.name is not None])
+        return len(loose)
+
+    @staticmethod
+    def _manifest_name(path: str) -> Optional[str]:
+        """Dataset name of a manifest file, None if it cannot be parsed"""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return str(yaml.safe_load(f)["name"])
+        except Exception:
+            return None
+
+    def compact(self, keep_months: int, now: Optional[datetime.datetime] = None) -> int:
+        """Zip monthly directories older than keep_months and remove them
+
+        Parameters
+        ----------
+        keep_months : int
+            number of recent months kept as directories
+        now : Optional[datetime.datetime]
+            current date, now if None
+
+        Returns
+        -------
+        int
+            number of months compacted
+        """
+        now = now or datetime.datetime.now()
+        first_kept = now.year * 12 + now.month - keep_months
+        with os.scandir(self.directory) as entries:
+            old = [
+                entry.name
+                for entry in entries
+                if entry.is_dir()
+                and _is_month(entry.name)
+                and int(entry.name[:4]) * 12 + int(entry.name[5:]) <= first_kept
+            ]
+        for month in sorted(old):
+            self._compact_month(month)
+        return len(old)
+
+    def _compact_month(self, month: str) -> None:
+        """Zip one monthly directory and point its index entries into the zip"""
+        directory = os.path.join(self.directory, month)
+        names: List[str] = sorted(os.listdir(directory))
+        members = self._zip_files(
+            month, [os.path.join(directory, name) for name in names]
+        )
+        with self._lock:
+            with closing(self._connect()) as connection, connection:
+                connection.executemany(
+                    "UPDATE manifests SET path = ? WHERE path = ?",
+                    [
+                        (
+                            f"{month}.zip/{members[path]}",
+                            os.path.relpath(path, self.directory),
+                        )
+                        for path in members
+                    ],
+                )
+            self._entries = None
+        shutil.rmtree(directory)
+        logging.info("Compacted %s archived manifests of %s", len(names), month)
+
+    def _zip_files(self, month: str, paths: List[str]) -> Dict[str, str]:
+        """Add files to the zip of a month, keeping the members it already has
+
+        The zip is rebuilt next to the archive and replaces the old one once
+        complete, so an interrupted compaction never loses manifests. A file
+        named like a different member already in the zip is stored under a
+        numbered name.
+
+        Parameters
+        ----------
+        month : str
+            month of the zip, YYYY-MM
+        paths : List[str]
+            files to add
+
+        Returns
+        -------
+        Dict[str, str]
+            member name of every file added
+        """
+        target = os.path.join(self.directory, month + ".zip")
+        partial = target + ".partial"
+        if os.path.exists(target):
+            shutil.copyfile(target, partial)
+        elif os.path.exists(partial):
+            os.remove(partial)
+        members = {}
+        with zipfile.ZipFile(partial, "a", zipfile.ZIP_DEFLATED) as zf:
+            existing = set(zf.namelist())
+            for path in paths:
+                member = self._member_name(zf, existing, path)
+                if member not in existing:
+                    zf.write(path, member)
+                    existing.add(member)
+                members[path] = member
+        os.replace(partial, target)
+        return members
+
+    @staticmethod
+    def _member_name(zf: zipfile.ZipFile, existing: Set[str], path: str) -> str:
+        """Name of a file in a zip, reusing a member only if it has the same
+        content"""
+        stem, extension = os.path.splitext(os.path.basename(path))
+        member = stem + extension
+        number = 0
+        while member in existing:
+            with open(path, "rb") as f:
+                if zf.read(member) == f.read():
+                    return member
+            number += 1
+            member = f"{stem}_{number}{extension}"
+        return member
+
+    def maintain(self, keep_months: Optional[int]) -> None:
+        """Rotate manifests archived before rotation and compact old months,
+        logging instead of raising on failure. Skipped if another thread is
+        already maintaining the archive
+
+        Parameters
+        ----------
+        keep_months : Optional[int]
+            number of recent months kept as directories, None never compacts
+        """
+        if not self._maintaining.acquire(blocking=False):
+            return
+        try:
+            moved = self.rotate()
+            if moved:
+                logging.info(
+                    "Moved %s archived manifests into monthly directories", moved
+                )
+            if keep_months is not None:
+                self.compact(keep_months)
+        except (OSError, sqlite3.Error, zipfile.BadZipFile) as e:
+            logging.warning(
+                "Could not maintain manifest archive %s: %s", self.directory, e
+            )
+        finally:
+            self._maintaining.release()
+
+
+_shared: Dict[str, ManifestArchive] = {}
+_shared_lock = threading.Lock()
+
+
+def shared_archive(directory: str) -> ManifestArchive:
+    """Process-wide archive of a directory, shared by the event handler and
+    the jobs so its index is loaded once
+
+    Parameters
+    ----------
+    directory : str
+        manifest complete directory
+
+    Returns
+    -------
+    ManifestArchive
+        the archive
+    """
+    with _shared_lock:
+        if directory not in _shared:
+            _shared[directory] = ManifestArchive(directory)
+        return _shared[directory]
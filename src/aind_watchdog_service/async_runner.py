@@ -0,0 +1,114 @@
+"""asyncio job runner, an alternative to the thread based BackgroundScheduler"""
+
+import asyncio
+import logging
+import sys
+import threading
+from typing import Optional
+
+from apscheduler.executors.asyncio import AsyncIOExecutor
+from apscheduler.executors.base import run_coroutine_job, run_job
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.util import iscoroutinefunction_partial
+
+
+class BoundedAsyncIOExecutor(AsyncIOExecutor):
+    """Run coroutine jobs on the event loop, at most max_jobs at a time
+
+    Jobs over the limit wait on a semaphore as suspended tasks, which cost a
+    few kilobytes each instead of a blocked pool thread.
+    """
+
+    def __init__(self, max_jobs: int):
+        """Construct BoundedAsyncIOExecutor
+
+        Parameters
+        ----------
+        max_jobs : int
+            number of jobs running at the same time
+        """
+        super().__init__()
+        self.max_jobs = max_jobs
+        self._job_slots: Optional[asyncio.Semaphore] = None
+
+    async def _bounded(self, coro):
+        """Await a job coroutine once a job slot is free"""
+        if self._job_slots is None:
+            # Created on first use so it binds to the running loop
+            self._job_slots = asyncio.Semaphore(self.max_jobs)
+        async with self._job_slots:
+            return await coro
+
+    def _do_submit_job(self, job, run_times):
+        """Submit a job, bounding coroutine jobs by the job semaphore"""
+
+        def callback(f):
+            self._pending_futures.discard(f)
+            try:
+                events = f.result()
+            except BaseException:
+                self._run_job_error(job.id, *sys.exc_info()[1:])
+            else:
+                self._run_job_success(job.id, events)
+
+        if iscoroutinefunction_partial(job.func):
+            coro = run_coroutine_job(
+                job, job._jobstore_alias, run_times, self._logger.name
+            )
+            f = self._eventloop.create_task(self._bounded(coro))
+        else:
+            f = self._eventloop.run_in_executor(
+                None, run_job, job, job._jobstore_alias, run_times, self._logger.name
+            )
+        f.add_done_callback(callback)
+        self._pending_futures.add(f)
+
+
+class AsyncRunner:
+    """Own an event loop on a daemon thread and an AsyncIOScheduler bound to it
+
+    The scheduler exposes the same add_job, remove_job and modify_job calls
+    as BackgroundScheduler and they are safe to call from the observer and
+    status API threads.
+    """
+
+    def __init__(self, max_jobs: int):
+        """Construct AsyncRunner
+
+        Parameters
+        ----------
+        max_jobs : int
+            number of jobs running at the same time
+        """
+        self.loop = asyncio.new_event_loop()
+        self.scheduler = AsyncIOScheduler(
+            event_loop=self.loop,
+            executors={"default": BoundedAsyncIOExecutor(max_jobs)},
+        )
+        self._thread = threading.Thread(
+            target=self._run_loop, name="asyncio-runner", daemon=True
+        )
+
+    def _run_loop(self) -> None:
+        """Run the event loop until stop is called"""
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def start(self) -> None:
+        """Start the event loop thread and the scheduler"""
+        logging.info("Starting asyncio runner")
+        self._thread.start()
+        self.scheduler.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Shut down the scheduler and stop the event loop
+
+        Parameters
+        ----------
+        timeout : float
+            seconds to wait for the loop thread to exit
+        """
+        if self.scheduler.running:
+            self.scheduler.shutdown(wait=False)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
@@ -0,0 +1,114 @@
+"""Check staged files against their sources instead of trusting copy tool exit
+codes"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from aind_watchdog_service.compression import SUFFIX
+
+# SMB and FAT shares store modification times at 2 second resolution
+MTIME_TOLERANCE_NS = 2_000_000_000
+AUDIT_WORKERS = 8
+
+
+class Mismatch(NamedTuple):
+    """A staged file that does not match its source"""
+
+    source: str
+    staged: str
+    problem: str
+
+
+def _scan(directory: str) -> Dict[str, os.stat_result]:
+    """Stat every file of a directory in one scandir pass, empty if the
+    directory cannot be read"""
+    try:
+        with os.scandir(directory) as entries:
+            return {entry.name: entry.stat() for entry in entries if entry.is_file()}
+    except OSError:
+        return {}
+
+
+def compare(
+    source: os.stat_result, staged: Optional[os.stat_result], sized: bool = True
+) -> Optional[str]:
+    """Compare a staged file with its source
+
+    Parameters
+    ----------
+    source : os.stat_result
+        stat of the source file
+    staged : Optional[os.stat_result]
+        stat of the staged file, None if it is missing
+    sized : bool
+        compare sizes, False for compressed copies
+
+    Returns
+    -------
+    Optional[str]
+        "missing", "short", "size" or "mtime", None if the file matches
+    """
+    if staged is None:
+        return "missing"
+    if sized and staged.st_size < source.st_size:
+        return "short"
+    if sized and staged.st_size != source.st_size:
+        return "size"
+    if abs(staged.st_mtime_ns - source.st_mtime_ns) > MTIME_TOLERANCE_NS:
+        return "mtime"
+    return None
+
+
+def _audit_directory(
+    directory: str, files: List[Tuple[str, str, bool]]
+) -> List[Mismatch]:
+    """Compare the files expected in one directory with a single scan of it"""
+    staged = _scan(directory)
+    mismatches = []
+    for source, name, compressed in files:
+        try:
+            stat = os.stat(source)
+        except FileNotFoundError:
+            # Removed since the copy, there is nothing to compare against
+            continue
+        if compressed and name + SUFFIX in staged:
+            problem = compare(stat, staged[name + SUFFIX], sized=False)
+        else:
+            problem = compare(stat, staged.get(name))
+        if problem is not None:
+            mismatches.append(Mismatch(source, os.path.join(directory, name), problem))
+    return mismatches
+
+
+def audit(
+    expected: List[Tuple[str, str, bool]], workers: int = AUDIT_WORKERS
+) -> List[Mismatch]:
+    """Find staged files that are missing or differ from their source
+
+    Each destination directory is scanned once, directories in parallel.
+
+    Parameters
+    ----------
+    expected : List[Tuple[str, str, bool]]
+        source file, path it is staged at, and whether it may be staged
+        compressed as ``<path>.zst``
+    workers : int
+        directories scanned at the same time
+
+    Returns
+    -------
+    List[Mismatch]
+        files to copy again
+    """
+    by_directory: Dict[str, List[Tuple[str, str, bool]]] = {}
+    for source, staged, compressed in expected:
+        directory, name = os.path.split(staged)
+        by_directory.setdefault(directory, []).append((source, name, compressed))
+    if not by_directory:
+        return []
+    with ThreadPoolExecutor(
+        max_workers=min(workers, len(by_directory)), thread_name_prefix="audit"
+    ) as pool:
+        results = pool.map(lambda item: _audit_directory(*item), by_directory.items())
+        return [mismatch for mismatches in results for mismatch in mismatches]
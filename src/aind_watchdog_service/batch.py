@@ -0,0 +1,320 @@
+"""Run jobs that share a trigger time as one coordinated batch"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional, Tuple
+
+import requests
+from apscheduler.job import Job
+
+from aind_watchdog_service import tracker
+from aind_watchdog_service.job_control import JobCancelled
+from aind_watchdog_service.models.watch_config import WatchConfig
+from aind_watchdog_service.run_job import RunJob, submit_upload_jobs
+
+# A planned copy: the job it belongs to, the sources copied together and their
+# destination directories
+Transfer = Tuple[RunJob, List[str], list]
+
+
+def interleave(transfers: List[Transfer], sizes: List[int]) -> List[Transfer]:
+    """Order copies largest, smallest, next largest, next smallest...
+
+    Large files keep the network busy while small files, bound by per-file
+    metadata round trips, fill the gaps next to them.
+
+    Parameters
+    ----------
+    transfers : List[Transfer]
+        copies of every job in the batch
+    sizes : List[int]
+        bytes of each copy
+
+    Returns
+    -------
+    List[Transfer]
+        the copies in submission order
+    """
+    by_size = [
+        transfer
+        for _, transfer in sorted(
+            zip(sizes, transfers), key=lambda item: item[0], reverse=True
+        )
+    ]
+    ordered = []
+    while by_size:
+        ordered.append(by_size.pop(0))
+        if by_size:
+            ordered.append(by_size.pop())
+    return ordered
+
+
+class BatchJob:
+    """Jobs scheduled for the same trigger time, copied through one shared
+    worker pool and submitted to aind-data-transfer-service together
+
+    Each member keeps its own RunJob: progress, pause and cancel controls,
+    audit, packing, history and manifest archiving work as for a single job.
+    With health checks, copies and submissions wait while their target is
+    down; a member whose copy failed during an outage is replayed on its own,
+    and a failed submission is replayed for its whole group.
+    """
+
+    def __init__(self, watch_config: WatchConfig):
+        """Construct BatchJob
+
+        Parameters
+        ----------
+        watch_config : WatchConfig
+            service configuration, copy_workers bounds the batch's copies
+        """
+        self.watch_config = watch_config
+        self.members: Dict[str, RunJob] = {}
+        self.job: Optional[Job] = None
+        self.started = False
+        self._lock = threading.Lock()
+
+    def add(self, src_path: str, run: RunJob) -> bool:
+        """Add a job to the batch
+
+        Returns
+        -------
+        bool
+            False if the batch already started and the job must be scheduled
+            on its own
+        """
+        with self._lock:
+            if self.started:
+                return False
+            self.members[src_path] = run
+            return True
+
+    def discard(self, src_path: str) -> None:
+        """Remove a job that has not started from the batch"""
+        with self._lock:
+            if not self.started:
+                self.members.pop(src_path, None)
+
+    def run(self) -> None:
+        """Plan, copy, finish and submit every member"""
+        with self._lock:
+            self.started = True
+            runs = [run for run in self.members.values() if not run.control.cancelled]
+        logging.info(
+            {"Action": "Running batch", "Jobs": [run.config.name for run in runs]},
+            extra={"weblog": True},
+        )
+        starts = {run: run._log_job_start() for run in runs}
+        for run in runs:
+            run.control.state = "running"
+        try:
+            plans = self._plan(runs)
+            copy_start = time.time()
+            after_copy = {}
+            copied = self._copy(plans)
+            for run in plans:
+                if run not in copied and not run.control.cancelled:
+                    if self._guard(run, self._replay_copy, run, plans[run]):
+                        copied.append(run)
+            for run in copied:
+                if self._guard(run, self._finish, run, plans[run], copy_start):
+                    after_copy[run] = time.time()
+            self._submit(after_copy, starts)
+        finally:
+            for run in runs:
+                self._close(run)
+
+    def _guard(self, run: RunJob, step: Callable[..., bool], *args) -> bool:
+        """Run a step of a member, failing or cancelling the member instead of
+        the batch, also when the step raises"""
+        try:
+            if step(*args):
+                return True
+            run.control.state = "failed"
+        except JobCancelled:
+            self._cancelled(run)
+        except Exception as e:
+            logging.error(
+                {"Error": "Batch job step failed", "Exception": repr(e)}
+                | run.config.log_tags
+            )
+            run.control.state = "failed"
+        return False
+
+    @staticmethod
+    def _wait(run: RunJob, targets: List[str]) -> bool:
+        """Hold a member while one of its targets is down"""
+        run.wait_for_targets(targets)
+        return True
+
+    @staticmethod
+    def _cancelled(run: RunJob) -> None:
+        """Mark a member cancelled"""
+        run.control.state = "cancelled"
+        logging.info(
+            {"Action": "Job cancelled"} | run.config.log_tags,
+            extra={"weblog": True},
+        )
+
+    def _plan(self, runs: List[RunJob]) -> Dict[RunJob, tuple]:
+        """Wait for the sources of every member at once and plan their copies
+
+        Returns
+        -------
+        Dict[RunJob, tuple]
+            direct copies and files to pack of every member that can be copied
+        """
+        with ThreadPoolExecutor(
+            max_workers=max(len(runs), 1), thread_name_prefix="batch-wait"
+        ) as pool:
+            ready = list(
+                pool.map(lambda run: self._guard(run, run.wait_for_sources), runs)
+            )
+        plans: Dict[RunJob, tuple] = {}
+        for run, sources_ready in zip(runs, ready):
+            if sources_ready:
+                self._guard(run, self._plan_member, run, plans)
+        return plans
+
+    @staticmethod
+    def _plan_member(run: RunJob, plans: Dict[RunJob, tuple]) -> bool:
+        """Plan the copies of a member, adding them to plans"""
+        plan = run._plan_copy()
+        if plan is None:
+            return False
+        plans[run] = plan
+        return True
+
+    def _copy(self, plans: Dict[RunJob, tuple]) -> List[RunJob]:
+        """Copy every member's files through one pool, in interleaved order
+
+        Returns
+        -------
+        List[RunJob]
+            members whose copies to the primary destination all succeeded
+        """
+        transfers = [
+            (run, sources, dests)
+            for run, (direct, _) in plans.items()
+            for sources, dests in run._group_transfers(direct)
+        ]
+        sizes = [
+            sum(run._path_size(src) for src in sources) for run, sources, _ in transfers
+        ]
+        failed = set()
+
+        def copy(run: RunJob, sources: List[str], dests: list) -> bool:
+            if run in failed or run.control.cancelled:
+                return False
+            if not self._guard(run, self._wait, run, [run.config.destination]):
+                return False
+            return self._guard(run, run._copy_in_slot, sources, dests)
+
+        with ThreadPoolExecutor(
+            max_workers=self.watch_config.copy_workers, thread_name_prefix="batch-copy"
+        ) as pool:
+            futures = {
+                pool.submit(copy, *transfer): transfer
+                for transfer in interleave(transfers, sizes)
+            }
+            for future in as_completed(futures):
+                run, sources, _ = futures[future]
+                if not future.result() and run not in failed:
+                    logging.error("Error copying files %s", sources)
+                    failed.add(run)
+        return [run for run in plans if run not in failed]
+
+    @staticmethod
+    def _replay_copy(run: RunJob, plan: tuple) -> bool:
+        """Copy a failed member again on its own once its destination
+        recovers, if a probe finds the destination down"""
+        targets = [run.config.destination]
+        if not run._hold_for_replay(targets, 0):
+            return False
+        direct, _ = plan
+        return run._replay_on_outage(targets, lambda: run._copy_files(direct), replays=1)
+
+    def _finish(self, run: RunJob, plan: tuple, copy_start: float) -> bool:
+        """Audit, pack and copy schemas of a member once its copies are done"""
+        transfers, packs = plan
+        if self.watch_config.audit_copies and not run.audit_copies(transfers):
+            return run._log_copy_result(False, copy_start)
+        return run._log_copy_result(run._finish_copy(packs), copy_start)
+
+    def _submit(
+        self, after_copy: Dict[RunJob, float], starts: Dict[RunJob, float]
+    ) -> None:
+        """Submit the copied members to aind-data-transfer-service, one request
+        per endpoint
+
+        Parameters
+        ----------
+        after_copy : Dict[RunJob, float]
+            members ready to submit and the time their copy finished
+        starts : Dict[RunJob, float]
+            start time of every member
+        """
+        endpoints: Dict[str, List[RunJob]] = {}
+        for run in after_copy:
+            endpoints.setdefault(run.config.transfer_endpoint, []).append(run)
+        for endpoint, group in endpoints.items():
+            status = self._submit_group(endpoint, group)
+            for run in group:
+                run.transfer_response = status
+                run.control.state = run._log_trigger_result(
+                    status[0] == 200, starts[run], after_copy[run]
+                )
+
+    def _submit_group(
+        self, endpoint: str, group: List[RunJob]
+    ) -> Tuple[Optional[int], str]:
+        """Submit members to one endpoint, holding and replaying the request
+        while a probe finds the endpoint down. Members cancelled while held
+        leave the group
+
+        Returns
+        -------
+        Tuple[Optional[int], str]
+            status code and text of the last response
+        """
+        replays = 0
+        while True:
+            for run in list(group):
+                if not self._guard(run, self._wait, run, [endpoint]):
+                    group.remove(run)
+            if not group:
+                return None, "Every job was cancelled"
+            status = self._post(endpoint, group)
+            if status[0] == 200 or not group[0]._hold_for_replay([endpoint], replays):
+                return status
+            replays += 1
+
+    @staticmethod
+    def _post(endpoint: str, group: List[RunJob]) -> Tuple[Optional[int], str]:
+        """Submit members in one request and track the jobs it created"""
+        logging.info("Submitting %s jobs to aind-data-transfer-service", len(group))
+        try:
+            response = submit_upload_jobs(
+                endpoint, [run.upload_job_config() for run in group]
+            )
+        except requests.RequestException as e:
+            return None, str(e)
+        if response.status_code == 200:
+            job_ids = tracker.submitted_job_ids(response.text)
+            if len(job_ids) != len(group):
+                job_ids = [None] * len(group)
+            for run, job_id in zip(group, job_ids):
+                run.track_submission(job_id)
+        return response.status_code, response.text[:1000]
+
+    @staticmethod
+    def _close(run: RunJob) -> None:
+        """Record a member and archive its manifest if it succeeded"""
+        if run.control.state == "running":
+            run.control.state = "failed"
+        run.progress.finish()
+        run.record_history()
+        if run.control.state == "succeeded":
+            run.move_manifest_to_archive()
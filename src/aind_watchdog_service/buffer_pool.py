@@ -0,0 +1,97 @@
+"""Fixed pool of preallocated copy buffers shared by every copy thread"""
+
+import mmap
+import threading
+from typing import List, Optional
+
+# O_DIRECT needs buffers, offsets and lengths aligned to the logical block size.
+# Anonymous mmaps are page aligned, which covers every common block size.
+ALIGNMENT = mmap.PAGESIZE
+
+
+class BufferPool:
+    """Hand out a fixed set of page-aligned buffers
+
+    The pool is the memory ceiling of the in-process copier: a copy holds one
+    buffer while it streams a file and waits when every buffer is in use, so
+    memory does not grow with the number of workers or the size of files.
+    """
+
+    def __init__(self, buffer_size: int, max_bytes: int, direct: bool = False):
+        """Construct BufferPool
+
+        Parameters
+        ----------
+        buffer_size : int
+            size of each buffer, rounded up to ALIGNMENT
+        max_bytes : int
+            total memory of the pool, at least one buffer is allocated
+        direct : bool
+            read sources into these buffers bypassing the page cache
+        """
+        self.buffer_size = -(-buffer_size // ALIGNMENT) * ALIGNMENT
+        self.direct = direct
+        count = max(1, max_bytes // self.buffer_size)
+        self._free: List[mmap.mmap] = [
+            mmap.mmap(-1, self.buffer_size) for _ in range(count)
+        ]
+        self.capacity = count
+        self._condition = threading.Condition()
+
+    @property
+    def available(self) -> int:
+        """Number of buffers not in use"""
+        with self._condition:
+            return len(self._free)
+
+    def acquire(self) -> mmap.mmap:
+        """Take a buffer, waiting until one is free
+
+        Returns
+        -------
+        mmap.mmap
+            writable buffer of buffer_size bytes
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._free)
+            return self._free.pop()
+
+    def release(self, buffer: mmap.mmap) -> None:
+        """Return a buffer to the pool"""
+        with self._condition:
+            self._free.append(buffer)
+            self._condition.notify()
+
+
+_shared: Optional[BufferPool] = None
+_shared_lock = threading.Lock()
+
+
+def shared_pool(buffer_size: int, max_bytes: int, direct: bool = False) -> BufferPool:
+    """Process-wide pool, so the memory ceiling holds across concurrent jobs
+
+    Parameters
+    ----------
+    buffer_size : int
+        size of each buffer
+    max_bytes : int
+        total memory of the pool
+    direct : bool
+        read sources bypassing the page cache
+
+    Returns
+    -------
+    BufferPool
+        the existing pool if it was built with the same settings, otherwise a
+        new pool that replaces it
+    """
+    global _shared
+    with _shared_lock:
+        settings = (-(-buffer_size // ALIGNMENT) * ALIGNMENT, direct)
+        if (
+            _shared is None
+            or (_shared.buffer_size, _shared.direct) != settings
+            or _shared.capacity != max(1, max_bytes // settings[0])
+        ):
+            _shared = BufferPool(buffer_size, max_bytes, direct)
+        return _shared
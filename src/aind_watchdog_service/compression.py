@@ -0,0 +1,316 @@
+"""Streaming zstd compression for the in-process copy engine"""
+
+import os
+import threading
+import time
+from contextlib import closing
+from functools import partial
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from aind_watchdog_service.buffer_pool import BufferPool
+from aind_watchdog_service.copy_engine import (
+    CHUNK_SIZE,
+    TeeWriter,
+    read_chunks,
+    tee_file,
+    tee_tree,
+)
+from aind_watchdog_service.throttle import TokenBucket
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+SUFFIX = ".zst"
+PROBE_SIZE = 1024 * 1024
+
+
+def available() -> bool:
+    """True if the optional zstandard package is installed"""
+    return zstandard is not None
+
+
+class CompressionStats:
+    """Bytes in and out of the compressor, shared by the copy threads of a job"""
+
+    def __init__(self):
+        """Construct CompressionStats"""
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.seconds = 0.0
+        self.files_compressed = 0
+        self.files_skipped = 0
+        self._lock = threading.Lock()
+
+    def add(self, bytes_in: int, bytes_out: int, seconds: float) -> None:
+        """Count a compressed file"""
+        with self._lock:
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+            self.seconds += seconds
+            self.files_compressed += 1
+
+    def skip(self) -> None:
+        """Count a file copied uncompressed because it did not compress"""
+        with self._lock:
+            self.files_skipped += 1
+
+    def counters(self) -> dict:
+        """Raw counters, to hand them from a worker process to the job"""
+        with self._lock:
+            return {
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "seconds": self.seconds,
+                "files_compressed": self.files_compressed,
+                "files_skipped": self.files_skipped,
+            }
+
+    def merge(self, counters: dict) -> None:
+        """Add counters collected by a worker process"""
+        with self._lock:
+            self.bytes_in += counters["bytes_in"]
+            self.bytes_out += counters["bytes_out"]
+            self.seconds += counters["seconds"]
+            self.files_compressed += counters["files_compressed"]
+            self.files_skipped += counters["files_skipped"]
+
+    def snapshot(self) -> dict:
+        """Compression ratio and throughput
+
+        Returns
+        -------
+        dict
+            files compressed and skipped, ratio of input to output bytes and
+            compressor throughput in MB/s of input
+        """
+        return {
+            "files_compressed": self.files_compressed,
+            "files_skipped": self.files_skipped,
+            "compression_ratio": (
+                round(self.bytes_in / self.bytes_out, 2) if self.bytes_out else None
+            ),
+            "compression_mbps": (
+                round(self.bytes_in / self.seconds / 1_000_000, 2)
+                if self.seconds
+                else None
+            ),
+        }
+
+
+class _MeteredWriter:
+    """Charge the token bucket for compressed bytes before writing them"""
+
+    def __init__(self, writer: TeeWriter, bucket: Optional[TokenBucket]):
+        """Wrap writer"""
+        self._writer = writer
+        self._bucket = bucket
+        self.written = 0
+
+    def write(self, data: bytes) -> int:
+        """Write compressed data"""
+        if self._bucket is not None:
+            self._bucket.consume(len(data))
+        self._writer.write(data)
+        self.written += len(data)
+        return len(data)
+
+
+def probe_ratio(src: str, level: int, probe_size: int = PROBE_SIZE) -> float:
+    """Compress the start of a file to estimate how well it compresses
+
+    Parameters
+    ----------
+    src : str
+        file to probe
+    level : int
+        zstd level
+    probe_size : int
+        bytes read from the start of the file
+
+    Returns
+    -------
+    float
+        ratio of input to output bytes, 1.0 for empty files
+    """
+    with open(src, "rb") as f:
+        sample = f.read(probe_size)
+    if not sample:
+        return 1.0
+    return len(sample) / len(zstandard.ZstdCompressor(level=level).compress(sample))
+
+
+def tee_compressed_file(
+    src: str,
+    dest_dirs: List[str],
+    level: int = 3,
+    threads: int = 0,
+    min_ratio: float = 1.1,
+    stats: Optional[CompressionStats] = None,
+    bucket: Optional[TokenBucket] = None,
+    checkpoint: Optional[Callable[[], None]] = None,
+    chunk_size: int = CHUNK_SIZE,
+    progress: Optional[Callable[[int], None]] = None,
+    pool: Optional[BufferPool] = None,
+) -> Tuple[int, Dict[str, Optional[OSError]]]:
+    """Compress a file into several directories as ``<name>.zst``, or copy it
+    unchanged when the probe shows it does not compress
+
+    The bucket is charged for compressed bytes, which is what crosses the
+    network, while progress counts source bytes.
+
+    Parameters
+    ----------
+    src : str
+        source file
+    dest_dirs : List[str]
+        destination directories
+    level : int
+        zstd level
+    threads : int
+        zstd worker threads, 0 compresses on the calling thread and -1 uses
+        every core
+    min_ratio : float
+        files whose first megabyte compresses less than this are copied as is
+    stats : Optional[CompressionStats]
+        accumulates ratio and throughput
+    bucket : Optional[TokenBucket]
+        token bucket throttling the copy
+    checkpoint : Optional[Callable[[], None]]
+        called between chunks, may block to pause the copy
+    chunk_size : int
+        bytes read per chunk
+    progress : Optional[Callable[[int], None]]
+        called with the size of every chunk read
+    pool : Optional[BufferPool]
+        pool lending the read buffers
+
+    Returns
+    -------
+    Tuple[int, Dict[str, Optional[OSError]]]
+        bytes read and the error of each destination, None if it succeeded
+    """
+    if probe_ratio(src, level) < min_ratio:
+        if stats is not None:
+            stats.skip()
+        return tee_file(src, dest_dirs, bucket, checkpoint, chunk_size, progress, pool)
+    dest = {
+        dest_dir: Path(dest_dir) / (Path(src).name + SUFFIX) for dest_dir in dest_dirs
+    }
+    writer = TeeWriter(dest)
+    metered = _MeteredWriter(writer, bucket)
+    compressor = zstandard.ZstdCompressor(level=level, threads=threads)
+    copied = 0
+    busy = 0.0
+    try:
+        with closing(read_chunks(src, chunk_size, pool, checkpoint)) as chunks:
+            with compressor.stream_writer(metered, closefd=False) as zst:
+                for chunk in chunks:
+                    if not writer:
+                        break
+                    start = time.perf_counter()
+                    zst.write(chunk)
+                    busy += time.perf_counter() - start
+                    copied += len(chunk)
+                    if progress is not None:
+                        progress(len(chunk))
+    finally:
+        written = writer.close()
+    if stats is not None:
+        stats.add(copied, metered.written, busy)
+    stat = os.stat(src)
+    for dest_dir in written:
+        os.utime(dest[dest_dir], ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    return copied, writer.errors
+
+
+def tee_compressed_tree(
+    src: str,
+    dest_dirs: List[str],
+    level: int = 3,
+    threads: int = 0,
+    min_ratio: float = 1.1,
+    stats: Optional[CompressionStats] = None,
+    bucket: Optional[TokenBucket] = None,
+    checkpoint: Optional[Callable[[], None]] = None,
+    chunk_size: int = CHUNK_SIZE,
+    progress: Optional[Callable[[int], None]] = None,
+    pool: Optional[BufferPool] = None,
+) -> Tuple[int, Dict[str, Optional[OSError]]]:
+    """Compress every file under a directory, matching robocopy /e
+
+    Parameters
+    ----------
+    src : str
+        source directory
+    dest_dirs : List[str]
+        destination directories receiving the contents of src
+    level : int
+        zstd level
+    threads : int
+        zstd worker threads
+    min_ratio : float
+        files compressing less than this are copied as is
+    stats : Optional[CompressionStats]
+        accumulates ratio and throughput
+    bucket : Optional[TokenBucket]
+        token bucket throttling the copy
+    checkpoint : Optional[Callable[[], None]]
+        called between chunks, may block to pause the copy
+    chunk_size : int
+        bytes read per chunk
+    progress : Optional[Callable[[int], None]]
+        called with the size of every chunk read
+    pool : Optional[BufferPool]
+        pool lending the read buffers
+
+    Returns
+    -------
+    Tuple[int, Dict[str, Optional[OSError]]]
+        bytes read and the first error of each destination, None if it succeeded
+    """
+    copier = partial(
+        tee_compressed_file,
+        level=level,
+        threads=threads,
+        min_ratio=min_ratio,
+        stats=stats,
+        bucket=bucket,
+        checkpoint=checkpoint,
+        chunk_size=chunk_size,
+        progress=progress,
+        pool=pool,
+    )
+    return tee_tree(src, dest_dirs, copier=copier)
+
+
+def compress_task(
+    src: str, dest_dirs: List[str], level: int, threads: int, min_ratio: float
+) -> Tuple[int, Dict[str, Optional[OSError]], dict]:
+    """Compress a file or directory in a CPU worker process
+
+    Parameters
+    ----------
+    src : str
+        source file or directory
+    dest_dirs : List[str]
+        destination directories
+    level : int
+        zstd level
+    threads : int
+        zstd worker threads
+    min_ratio : float
+        files compressing less than this are copied as is
+
+    Returns
+    -------
+    Tuple[int, Dict[str, Optional[OSError]], dict]
+        bytes read, the error of each destination and the compression
+        counters to merge into the job's CompressionStats
+    """
+    stats = CompressionStats()
+    tee = tee_compressed_tree if os.path.isdir(src) else tee_compressed_file
+    copied, errors = tee(src, dest_dirs, level, threads, min_ratio, stats)
+    return copied, errors, stats.counters()
@@ -0,0 +1,605 @@
+"""In-process chunked copy engine used by the python copy backend"""
+
+import errno
+import os
+from contextlib import closing
+from functools import partial
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+
+from aind_watchdog_service.buffer_pool import ALIGNMENT, BufferPool
+from aind_watchdog_service.throttle import TokenBucket
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+CHUNK_SIZE = 8 * 1024 * 1024
+
+# ioctl sharing the extents of a file on copy-on-write filesystems (linux/fs.h)
+FICLONE = 0x40049409
+
+FileCopier = Callable[[str, List[str]], Tuple[int, Dict[str, Optional[OSError]]]]
+
+
+class TeeWriter:
+    """Write the same chunks to several files, dropping the ones that fail"""
+
+    def __init__(self, paths: Dict[str, Path], append: bool = False):
+        """Open every destination file
+
+        Parameters
+        ----------
+        paths : Dict[str, Path]
+            destination file for each destination directory
+        append : bool
+            add to files this process started writing instead of replacing them
+        """
+        self.errors: Dict[str, Optional[OSError]] = {}
+        self._files = {}
+        self._position = 0
+        for key, path in paths.items():
+            try:
+                if not append:
+                    _break_hardlink(path)
+                self._files[key] = open(path, "ab" if append else "wb")
+                self.errors[key] = None
+            except OSError as e:
+                self.errors[key] = e
+
+    def __bool__(self) -> bool:
+        """True while at least one destination is still being written"""
+        return bool(self._files)
+
+    def write(self, chunk: bytes) -> None:
+        """Write a chunk to every remaining destination"""
+        for key, fdst in list(self._files.items()):
+            try:
+                fdst.write(chunk)
+            except OSError as e:
+                self.errors[key] = e
+                self._close(key)
+        self._position += len(chunk)
+
+    def tell(self) -> int:
+        """Bytes written so far, needed to stream archives through the writer"""
+        return self._position
+
+    def _close(self, key: str) -> None:
+        """Close one destination, recording errors raised by the final flush"""
+        try:
+            self._files.pop(key).close()
+        except OSError as e:
+            self.errors[key] = e
+
+    def close(self) -> List[str]:
+        """Close every destination
+
+        Returns
+        -------
+        List[str]
+            destinations written without errors
+        """
+        for key in list(self._files):
+            self._close(key)
+        return [key for key, error in self.errors.items() if error is None]
+
+
+def _open_source(src: str, direct: bool) -> Tuple[BinaryIO, bool]:
+    """Open a source file unbuffered
+
+    Parameters
+    ----------
+    src : str
+        source file
+    direct : bool
+        bypass the page cache with O_DIRECT where the platform and file
+        system support it
+
+    Returns
+    -------
+    Tuple[BinaryIO, bool]
+        the open file, and True if it was opened with O_DIRECT
+    """
+    if direct and hasattr(os, "O_DIRECT"):
+        try:
+            return open(os.open(src, os.O_RDONLY | os.O_DIRECT), "rb", buffering=0), True
+        except OSError:
+            # tmpfs and some network file systems refuse O_DIRECT
+            pass
+    return open(src, "rb", buffering=0), False
+
+
+def read_chunks(
+    src: str,
+    chunk_size: int = CHUNK_SIZE,
+    pool: Optional[BufferPool] = None,
+    checkpoint: Optional[Callable[[], None]] = None,
+) -> Iterator[memoryview]:
+    """Read a file chunk by chunk into one reusable buffer
+
+    Each chunk is a view of the same buffer and is only valid until the next
+    chunk is read. With a pool the buffer is borrowed for the whole file, so
+    the pool bounds the memory of every concurrent copy.
+
+    Parameters
+    ----------
+    src : str
+        source file
+    chunk_size : int
+        bytes read per chunk, capped at the pool's buffer size
+    pool : Optional[BufferPool]
+        pool lending the buffer. Without a pool a buffer is allocated per file
+    checkpoint : Optional[Callable[[], None]]
+        called before every read, may block to pause the copy
+
+    Yields
+    ------
+    memoryview
+        the bytes read
+    """
+    if pool is None:
+        buffer, direct = bytearray(chunk_size), False
+    else:
+        buffer, direct = pool.acquire(), pool.direct
+        chunk_size = min(chunk_size, pool.buffer_size)
+    view = memoryview(buffer)[:chunk_size]
+    try:
+        fsrc, bypassed = _open_source(src, direct and chunk_size % ALIGNMENT == 0)
+        with fsrc:
+            offset = 0
+            while True:
+                if checkpoint is not None:
+                    checkpoint()
+                nbytes = fsrc.readinto(view)
+                if not nbytes:
+                    break
+                if direct and not bypassed:
+                    _drop_cache(fsrc, offset, nbytes)
+                offset += nbytes
+                yield view[:nbytes]
+    finally:
+        view.release()
+        if pool is not None:
+            pool.release(buffer)
+
+
+def _drop_cache(fsrc: BinaryIO, offset: int, length: int) -> None:
+    """Ask the kernel to evict pages already read, when O_DIRECT is unavailable"""
+    if hasattr(os, "posix_fadvise"):
+        os.posix_fadvise(fsrc.fileno(), offset, length, os.POSIX_FADV_DONTNEED)
+
+
+def _break_hardlink(path: Path) -> None:
+    """Remove a destination file that has other hard links, such as one
+    staged by link_path, so writing it never changes the file it links to"""
+    try:
+        if os.stat(path).st_nlink > 1:
+            os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def is_identical(src: str, dest: str) -> bool:
+    """True if dest has the size and modification time of src, the check
+    rsync -t and robocopy use to skip files already copied"""
+    try:
+        src_stat, dest_stat = os.stat(src), os.stat(dest)
+    except OSError:
+        return False
+    return (src_stat.st_size, src_stat.st_mtime_ns) == (
+        dest_stat.st_size,
+        dest_stat.st_mtime_ns,
+    )
+
+
+def tee_file(
+    src: str,
+    dest_dirs: List[str],
+    bucket: Optional[TokenBucket] = None,
+    checkpoint: Optional[Callable[[], None]] = None,
+    chunk_size: int = CHUNK_SIZE,
+    progress: Optional[Callable[[int], None]] = None,
+    pool: Optional[BufferPool] = None,
+    skip_identical: bool = False,
+) -> Tuple[int, Dict[str, Optional[OSError]]]:
+    """Copy a single file into several directories, reading each chunk once
+
+    A destination that fails is dropped and the copy carries on to the
+    others. Read errors on the source fail every destination.
+
+    Parameters
+    ----------
+    src : str
+        source file
+    dest_dirs : List[str]
+        destination directories, the file keeps its name
+    bucket : Optional[TokenBucket]
+        token bucket throttling the copy, charged once per chunk read
+    checkpoint : Optional[Callable[[], None]]
+        called between chunks, may block to pause the copy
+    chunk_size : int
+        bytes read per chunk
+    progress : Optional[Callable[[int], None]]
+        called with the size of every chunk read
+    pool : Optional[BufferPool]
+        pool lending the read buffer
+    skip_identical : bool
+        leave destinations already holding a file of the same size and
+        modification time untouched
+
+    Returns
+    -------
+    Tuple[int, Dict[str, Optional[OSError]]]
+        bytes read and the error of each destination, None if it succeeded
+    """
+    dest = {dest_dir: Path(dest_dir) / Path(src).name for dest_dir in dest_dirs}
+    if skip_identical:
+        dest = {
+            dest_dir: path
+            for dest_dir, path in dest.items()
+            if not is_identical(src, str(path))
+        }
+        if not dest:
+            return 0, {dest_dir: None for dest_dir in dest_dirs}
+    writer = TeeWriter(dest)
+    copied = 0
+    try:
+        with closing(read_chunks(src, chunk_size, pool, checkpoint)) as chunks:
+            for chunk in chunks:
+                if not writer:
+                    break
+                if bucket is not None:
+                    bucket.consume(len(chunk))
+                writer.write(chunk)
+                copied += len(chunk)
+                if progress is not None:
+                    progress(len(chunk))
+    finally:
+        written = writer.close()
+    # Preserve modification times like rsync -t and robocopy do
+    stat = os.stat(src)
+    for dest_dir in written:
+        os.utime(dest[dest_dir], ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    return copied, {dest_dir: None for dest_dir in dest_dirs} | writer.errors
+
+
+def tee_tree(
+    src: str,
+    dest_dirs: List[str],
+    bucket: Optional[TokenBucket] = None,
+    checkpoint: Optional[Callable[[], None]] = None,
+    chunk_size: int = CHUNK_SIZE,
+    progress: Optional[Callable[[int], None]] = None,
+    pool: Optional[BufferPool] = None,
+    copier: Optional[FileCopier] = None,
+    skip_identical: bool = False,
+) -> Tuple[int, Dict[str, Optional[OSError]]]:
+    """Copy the contents of a directory into several directories, matching
+    robocopy /e and reading each file once
+
+    Parameters
+    ----------
+    src : str
+        source directory
+    dest_dirs : List[str]
+        destination directories receiving the contents of src
+    bucket : Optional[TokenBucket]
+        token bucket throttling the copy
+    checkpoint : Optional[Callable[[], None]]
+        called between chunks, may block to pause the copy
+    chunk_size : int
+        bytes read per chunk
+    progress : Optional[Callable[[int], None]]
+        called with the size of every chunk read
+    pool : Optional[BufferPool]
+        pool lending the read buffers
+    copier : Optional[FileCopier]
+        copies one file into a list of directories, replacing tee_file and
+        the copy arguments above, e.g. to transform files on the way
+    skip_identical : bool
+        leave files already staged with the same size and modification time
+        untouched
+
+    Returns
+    -------
+    Tuple[int, Dict[str, Optional[OSError]]]
+        bytes read and the first error of each destination, None if it succeeded
+    """
+    if copier is None:
+        copier = partial(
+            tee_file,
+            bucket=bucket,
+            checkpoint=checkpoint,
+            chunk_size=chunk_size,
+            progress=progress,
+            pool=pool,
+            skip_identical=skip_identical,
+        )
+    errors: Dict[str, Optional[OSError]] = {dest_dir: None for dest_dir in dest_dirs}
+    copied = 0
+    for root, _, files in os.walk(src):
+        targets = _make_targets(Path(root).relative_to(src), errors)
+        for name in files:
+            if not targets:
+                return copied, errors
+            nbytes, file_errors = copier(os.path.join(root, name), list(targets))
+            copied += nbytes
+            for target, error in file_errors.items():
+                if error is not None:
+                    errors[targets.pop(target)] = error
+    return copied, errors
+
+
+def _make_targets(relative: Path, errors: Dict[str, Optional[OSError]]) -> Dict[str, str]:
+    """Create a subdirectory in every destination that has not failed yet
+
+    Parameters
+    ----------
+    relative : Path
+        subdirectory relative to the destination directories
+    errors : Dict[str, Optional[OSError]]
+        error of each destination directory, updated on failure
+
+    Returns
+    -------
+    Dict[str, str]
+        destination directory for each created subdirectory
+    """
+    targets = {}
+    for dest_dir, error in errors.items():
+        if error is not None:
+            continue
+        try:
+            (Path(dest_dir) / relative).mkdir(parents=True, exist_ok=True)
+            targets[str(Path(dest_dir) / relative)] = dest_dir
+        except OSError as e:
+            errors[dest_dir] = e
+    return targets
+
+
+def copy_file(
+    src: str,
+    dest_dir: str,
+    bucket: Optional[TokenBucket] = None,
+    checkpoint: Optional[Callable[[], None]] = None,
+    chunk_size: int = CHUNK_SIZE,
+    progress: Optional[Callable[[int], None]] = None,
+    pool: Optional[BufferPool] = None,
+    skip_identical: bool = False,
+) -> int:
+    """Copy a single file into a directory chunk by chunk
+
+    Parameters
+    ----------
+    src : str
+        source file
+    dest_dir : str
+        destination directory, the file keeps its name
+    bucket : Optional[TokenBucket]
+        token bucket throttling the copy
+    checkpoint : Optional[Callable[[], None]]
+        called between chunks, may block to pause the copy
+    chunk_size : int
+        bytes read per chunk
+    progress : Optional[Callable[[int], None]]
+        called with the size of every chunk written
+    pool : Optional[BufferPool]
+        pool lending the read buffers
+    skip_identical : bool
+        leave files already staged with the same size and modification time
+        untouched
+
+    Returns
+    -------
+    int
+        number of bytes copied
+    """
+    copied, errors = tee_file(
+        src,
+        [dest_dir],
+        bucket,
+        checkpoint,
+        chunk_size,
+        progress,
+        pool,
+        skip_identical=skip_identical,
+    )
+    if errors[dest_dir] is not None:
+        raise errors[dest_dir]
+    return copied
+
+
+def copy_tree(
+    src: str,
+    dest_dir: str,
+    bucket: Optional[TokenBucket] = None,
+    checkpoint: Optional[Callable[[], None]] = None,
+    chunk_size: int = CHUNK_SIZE,
+    progress: Optional[Callable[[int], None]] = None,
+    pool: Optional[BufferPool] = None,
+    skip_identical: bool = False,
+) -> int:
+    """Copy the contents of a directory, matching robocopy /e
+
+    Parameters
+    ----------
+    src : str
+        source directory
+    dest_dir : str
+        destination directory receiving the contents of src
+    bucket : Optional[TokenBucket]
+        token bucket throttling the copy
+    checkpoint : Optional[Callable[[], None]]
+        called between chunks, may block to pause the copy
+    chunk_size : int
+        bytes read per chunk
+    progress : Optional[Callable[[int], None]]
+        called with the size of every chunk written
+    pool : Optional[BufferPool]
+        pool lending the read buffers
+    skip_identical : bool
+        leave files already staged with the same size and modification time
+        untouched
+
+    Returns
+    -------
+    int
+        number of bytes copied
+    """
+    copied, errors = tee_tree(
+        src,
+        [dest_dir],
+        bucket,
+        checkpoint,
+        chunk_size,
+        progress,
+        pool,
+        skip_identical=skip_identical,
+    )
+    if errors[dest_dir] is not None:
+        raise errors[dest_dir]
+    return copied
+
+
+def list_files(sources: List[str]) -> List[Tuple[str, str]]:
+    """Every file of a list of files and directories, with the path it is
+    staged at relative to the modality directory
+
+    Directory contents keep robocopy /e semantics: paths are relative to the
+    listed directory.
+
+    Parameters
+    ----------
+    sources : List[str]
+        files and directories
+
+    Returns
+    -------
+    List[Tuple[str, str]]
+        source file and its relative posix path
+    """
+    files = []
+    for source in sources:
+        if not os.path.isdir(source):
+            files.append((source, Path(source).name))
+            continue
+        for root, _, names in os.walk(source):
+            relative = Path(root).relative_to(source)
+            files.extend(
+                (os.path.join(root, name), (relative / name).as_posix()) for name in names
+            )
+    return files
+
+
+def path_size(path: str) -> int:
+    """Size of a file, or of every file under a directory
+
+    Parameters
+    ----------
+    path : str
+        file or directory
+
+    Returns
+    -------
+    int
+        size in bytes
+    """
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def reflink_file(src: str, dest: str) -> None:
+    """Create dest sharing the data blocks of src, without copying them
+
+    Parameters
+    ----------
+    src : str
+        source file
+    dest : str
+        new file, must not exist
+
+    Raises
+    ------
+    OSError
+        if the platform or filesystem cannot clone files
+    """
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, "Reflinks are not supported", dest)
+    with open(src, "rb") as fsrc, open(dest, "xb") as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            fdst.close()
+            os.unlink(dest)
+            raise
+    stat = os.stat(src)
+    os.utime(dest, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+
+def _link_file(src: str, dest: str, hardlink: bool) -> None:
+    """Reflink a file, or hard link it if reflinks fail and hardlink is set.
+    The link is made under a temporary name and replaces dest once complete,
+    so a file already staged at dest is kept if linking fails"""
+    partial = dest + ".partial"
+    if os.path.lexists(partial):
+        os.unlink(partial)
+    try:
+        reflink_file(src, partial)
+    except OSError:
+        if not hardlink:
+            raise
+        os.link(src, partial)
+    os.replace(partial, dest)
+
+
+def link_path(src: str, dest_dir: str, hardlink: bool = False) -> Optional[int]:
+    """Stage a file or the contents of a directory without copying data when
+    the destination is on the same device: every file is reflinked, or hard
+    linked if allowed and the filesystem cannot reflink
+
+    Hard links share the inode of the source, so a later change to either
+    file shows in both; reflinks are independent copy-on-write files.
+
+    Parameters
+    ----------
+    src : str
+        source file or directory
+    dest_dir : str
+        destination directory, with directory contents matching robocopy /e
+    hardlink : bool
+        fall back to hard links when reflinks fail
+
+    Returns
+    -------
+    Optional[int]
+        bytes staged, or None if the destination is on another device or a
+        file could not be linked. Files linked before the failure are removed
+        so the caller can copy normally
+    """
+    os.makedirs(dest_dir, exist_ok=True)
+    if os.stat(src).st_dev != os.stat(dest_dir).st_dev:
+        return None
+    linked = []
+    nbytes = 0
+    try:
+        for path, relative in list_files([src]):
+            target = os.path.join(dest_dir, relative)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            _link_file(path, target, hardlink)
+            linked.append(target)
+            nbytes += os.path.getsize(path)
+    except OSError:
+        for target in linked:
+            try:
+                os.unlink(target)
+            except OSError:
+                pass
+        return None
+    return nbytes
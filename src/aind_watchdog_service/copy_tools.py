@@ -0,0 +1,239 @@
+"""Helpers to drive rsync and robocopy over many files at once and read
+their output"""
+
+import ntpath
+import os
+import posixpath
+import re
+import subprocess
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List, NamedTuple, Optional, Set
+
+# Keeps a robocopy command line well under the 32767 character Windows limit
+MAX_GROUP_CHARS = 8000
+
+# rsync: [sender] send_files failed to open "/data/x.tiff": Permission denied (13)
+RSYNC_FILE_ERROR = re.compile(r'^rsync: .*?"([^"]+)"', re.MULTILINE)
+# 2024/01/01 12:00:00 ERROR 5 (0x00000005) Copying File D:\data\x.tiff
+ROBOCOPY_FILE_ERROR = re.compile(
+    r"ERROR \d+ \(0x[0-9A-Fa-f]+\) (?:Copying|Accessing Source|Opening Source) File"
+    r" (.+?)\s*$",
+    re.MULTILINE,
+)
+
+
+def chunk_files(files: List[str], max_chars: int = MAX_GROUP_CHARS) -> List[List[str]]:
+    """Split files into groups whose names fit on one command line
+
+    Parameters
+    ----------
+    files : List[str]
+        files of one directory
+    max_chars : int
+        total length of the file names of a group
+
+    Returns
+    -------
+    List[List[str]]
+        groups in the original order
+    """
+    groups: List[List[str]] = []
+    length = max_chars
+    for file in files:
+        name_length = len(os.path.basename(file)) + 1
+        if length + name_length > max_chars:
+            groups.append([])
+            length = 0
+        groups[-1].append(file)
+        length += name_length
+    return groups
+
+
+@contextmanager
+def files_from(names: List[str]) -> Iterator[str]:
+    """Temporary NUL separated file list for rsync --files-from --from0
+
+    Parameters
+    ----------
+    names : List[str]
+        paths relative to the rsync source directory
+
+    Yields
+    ------
+    str
+        path of the list file, removed on exit
+    """
+    fd, path = tempfile.mkstemp(prefix="watchdog-files-", suffix=".lst")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write("\0".join(names).encode())
+        yield path
+    finally:
+        os.remove(path)
+
+
+def _attribute(paths: List[str], names: List[str], basename) -> Set[str]:
+    """Names of the group mentioned in error lines, every name if none is"""
+    failed = {basename(path) for path in paths} & set(names)
+    return failed or set(names)
+
+
+def rsync_failed_files(run: subprocess.CompletedProcess, names: List[str]) -> Set[str]:
+    """Files of an rsync --files-from run that were not copied
+
+    Parameters
+    ----------
+    run : subprocess.CompletedProcess
+        finished rsync process
+    names : List[str]
+        file names passed to rsync
+
+    Returns
+    -------
+    Set[str]
+        names that failed. Every name if rsync failed without naming files
+    """
+    if run.returncode == 0:
+        return set()
+    stderr = (run.stderr or b"").decode(errors="replace")
+    return _attribute(RSYNC_FILE_ERROR.findall(stderr), names, posixpath.basename)
+
+
+def robocopy_failed_files(run: subprocess.CompletedProcess, names: List[str]) -> Set[str]:
+    """Files of a multi-file robocopy run that were not copied
+
+    Parameters
+    ----------
+    run : subprocess.CompletedProcess
+        finished robocopy process
+    names : List[str]
+        file names passed to robocopy
+
+    Returns
+    -------
+    Set[str]
+        names that failed. Every name if robocopy failed without naming files
+    """
+    if run.returncode <= 7:
+        return set()
+    stdout = (run.stdout or b"").decode(errors="replace")
+    return _attribute(ROBOCOPY_FILE_ERROR.findall(stdout), names, ntpath.basename)
+
+
+# A count, or a size with a unit when robocopy runs without /bytes: "1.25 g"
+_SUMMARY_VALUE = r"(\d+(?:\.\d+)?(?: [kmgt])?)"
+# Job summary rows: Total, Copied, Skipped, Mismatch, FAILED, Extras
+ROBOCOPY_SUMMARY_ROW = re.compile(
+    r"^\s*(Files|Bytes)\s*:" + r"\s+".join([""] + [_SUMMARY_VALUE] * 6) + r"\s*$",
+    re.MULTILINE,
+)
+ROBOCOPY_SPEED = re.compile(r"^\s*Speed\s*:\s*([\d.,]+) Bytes/sec", re.MULTILINE)
+_UNITS = {"k": 1024, "m": 1024**2, "g": 1024**3, "t": 1024**4}
+
+
+class RobocopySummary(NamedTuple):
+    """Job summary robocopy prints after a run"""
+
+    files_copied: int
+    files_skipped: int
+    files_failed: int
+    bytes_copied: int
+    bytes_skipped: int
+    bytes_failed: int
+    bytes_per_s: Optional[int]
+
+
+def _summary_value(value: str) -> int:
+    """Bytes or count of a summary cell"""
+    number, _, unit = value.partition(" ")
+    return int(float(number) * _UNITS.get(unit, 1))
+
+
+def parse_robocopy_summary(stdout: Optional[bytes]) -> Optional[RobocopySummary]:
+    """Read the job summary at the end of robocopy's output
+
+    Parameters
+    ----------
+    stdout : Optional[bytes]
+        output of a finished robocopy process
+
+    Returns
+    -------
+    Optional[RobocopySummary]
+        None if the output has no summary, for instance when robocopy could
+        not start copying
+    """
+    text = (stdout or b"").decode(errors="replace")
+    rows = {
+        match.group(1): [_summary_value(value) for value in match.groups()[1:]]
+        for match in ROBOCOPY_SUMMARY_ROW.finditer(text)
+    }
+    if set(rows) != {"Files", "Bytes"}:
+        return None
+    speed = ROBOCOPY_SPEED.search(text)
+    return RobocopySummary(
+        files_copied=rows["Files"][1],
+        files_skipped=rows["Files"][2],
+        files_failed=rows["Files"][4],
+        bytes_copied=rows["Bytes"][1],
+        bytes_skipped=rows["Bytes"][2],
+        bytes_failed=rows["Bytes"][4],
+        # Thousands separators depend on the Windows locale
+        bytes_per_s=int(re.sub(r"\D", "", speed.group(1))) if speed else None,
+    )
+
+
+class RobocopyStats:
+    """Totals of the robocopy runs of a job, shared by its copy threads"""
+
+    def __init__(self):
+        """Construct RobocopyStats"""
+        self.runs = 0
+        self.files_copied = 0
+        self.files_skipped = 0
+        self.files_failed = 0
+        self.bytes_copied = 0
+        self.bytes_skipped = 0
+        self.bytes_failed = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, summary: RobocopySummary) -> None:
+        """Count a robocopy run"""
+        with self._lock:
+            self.runs += 1
+            self.files_copied += summary.files_copied
+            self.files_skipped += summary.files_skipped
+            self.files_failed += summary.files_failed
+            self.bytes_copied += summary.bytes_copied
+            self.bytes_skipped += summary.bytes_skipped
+            self.bytes_failed += summary.bytes_failed
+            if summary.bytes_per_s:
+                self.seconds += summary.bytes_copied / summary.bytes_per_s
+
+    def snapshot(self) -> dict:
+        """Totals and throughput reported by robocopy
+
+        Returns
+        -------
+        dict
+            files and bytes copied, skipped and failed, and the throughput in
+            MB/s robocopy measured while copying
+        """
+        with self._lock:
+            return {
+                "robocopy_runs": self.runs,
+                "robocopy_files_copied": self.files_copied,
+                "robocopy_files_skipped": self.files_skipped,
+                "robocopy_files_failed": self.files_failed,
+                "robocopy_bytes_copied": self.bytes_copied,
+                "robocopy_bytes_skipped": self.bytes_skipped,
+                "robocopy_bytes_failed": self.bytes_failed,
+                "robocopy_mbps": (
+                    round(self.bytes_copied / self.seconds / 1e6, 2)
+                    if self.seconds
+                    else None
+                ),
+            }
@@ -0,0 +1,141 @@
+"""Process pool for CPU-bound staging work (hashing, compression, packing)"""
+
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, NamedTuple, Optional
+
+
+class CpuResult(NamedTuple):
+    """Return value of a task with the worker that ran it"""
+
+    value: Any
+    pid: int
+    cpu_s: float
+
+
+def _timed(func: Callable, args: tuple, kwargs: dict) -> CpuResult:
+    """Run a task in a worker and measure the CPU time it used"""
+    start = time.process_time()
+    value = func(*args, **kwargs)
+    return CpuResult(value, os.getpid(), time.process_time() - start)
+
+
+class CpuPool:
+    """Run CPU-bound functions in worker processes, away from the GIL held by
+    the observer and scheduler threads
+
+    Tasks receive paths and return small results over the executor's pipes;
+    workers read and write files themselves so no data is copied between
+    processes. Workers are recycled after max_tasks_per_child tasks to bound
+    leaks in native libraries.
+    """
+
+    def __init__(self, workers: int, max_tasks_per_child: int = 100):
+        """Construct CpuPool
+
+        Parameters
+        ----------
+        workers : int
+            number of worker processes
+        max_tasks_per_child : int
+            tasks a worker runs before it is replaced
+        """
+        self.workers = workers
+        self.max_tasks_per_child = max_tasks_per_child
+        self.cpu_seconds: Dict[int, float] = {}
+        self._lock = threading.Lock()
+        self._tasks = 0
+        self._executor = self._new_executor()
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        """Executor recycling its workers natively where Python supports it"""
+        if sys.version_info >= (3, 11):
+            return ProcessPoolExecutor(
+                self.workers, max_tasks_per_child=self.max_tasks_per_child
+            )
+        return ProcessPoolExecutor(self.workers)
+
+    def _executor_for_task(self) -> ProcessPoolExecutor:
+        """Executor for the next task, replacing it every max_tasks_per_child
+        tasks per worker before Python 3.11"""
+        with self._lock:
+            self._tasks += 1
+            if (
+                sys.version_info < (3, 11)
+                and self._tasks > self.workers * self.max_tasks_per_child
+            ):
+                # Running tasks finish in the old workers
+                self._executor.shutdown(wait=False)
+                self._executor = self._new_executor()
+                self._tasks = 1
+            return self._executor
+
+    def run(self, func: Callable, *args, **kwargs) -> CpuResult:
+        """Run a module-level function in a worker and wait for it
+
+        Parameters
+        ----------
+        func : Callable
+            picklable function
+        *args, **kwargs
+            picklable arguments
+
+        Returns
+        -------
+        CpuResult
+            the function's return value, worker pid and CPU seconds
+        """
+        result = self._executor_for_task().submit(_timed, func, args, kwargs).result()
+        with self._lock:
+            self.cpu_seconds[result.pid] = (
+                self.cpu_seconds.get(result.pid, 0.0) + result.cpu_s
+            )
+        return result
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop the workers
+
+        Parameters
+        ----------
+        wait : bool
+            wait for running tasks to finish
+        """
+        self._executor.shutdown(wait=wait)
+
+
+_shared: Optional[CpuPool] = None
+_shared_lock = threading.Lock()
+
+
+def shared_cpu_pool(workers: int, max_tasks_per_child: int = 100) -> Optional[CpuPool]:
+    """Process-wide pool shared by every job
+
+    Parameters
+    ----------
+    workers : int
+        number of worker processes, 0 disables the pool
+    max_tasks_per_child : int
+        tasks a worker runs before it is replaced
+
+    Returns
+    -------
+    Optional[CpuPool]
+        the pool, None when workers is 0
+    """
+    global _shared
+    if workers == 0:
+        return None
+    with _shared_lock:
+        if _shared is None or (_shared.workers, _shared.max_tasks_per_child) != (
+            workers,
+            max_tasks_per_child,
+        ):
+            if _shared is not None:
+                _shared.shutdown(wait=False)
+            logging.info("Starting %s CPU worker processes", workers)
+            _shared = CpuPool(workers, max_tasks_per_child)
+        return _shared
@@ -1,10 +1,18 @@
 """Event handler module"""
 
+import asyncio
 import datetime
+import fnmatch
 import logging
+import os
+import sqlite3
+import threading
 import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Union
+from typing import Callable, Deque, Dict, List, Optional, Union
 
 import apscheduler
 import yaml
@@ -18,9 +26,19 @@ from watchdog.events import (
     FileSystemEventHandler,
 )
 
-from aind_watchdog_service.models.manifest_config import ManifestConfig
+from aind_watchdog_service.archive import manifest_digest, shared_archive
+from aind_watchdog_service.batch import BatchJob
+from aind_watchdog_service.mirror import MIRROR_PATTERN, SessionMirror
+from aind_watchdog_service.models.manifest_config import ManifestConfig, MirrorConfig
 from aind_watchdog_service.models.watch_config import WatchConfig
-from aind_watchdog_service.run_job import RunJob
+from aind_watchdog_service.pending import PendingJob
+from aind_watchdog_service.run_job import PLATFORM, RunJob
+from aind_watchdog_service.throttle import TransferSchedule
+
+# Number of finished jobs kept for the status API
+FINISHED_HISTORY = 200
+
+MANIFEST_PATTERN = "*manifest*.*"
 
 
 class EventHandler(FileSystemEventHandler):
@@ -32,15 +50,116 @@ class EventHandler(FileSystemEventHandler):
         self.scheduler = scheduler
         self.config = config
         self.jobs: Dict[str, Job] = {}
+        self.runs: Dict[str, RunJob] = {}
+        # Jobs scheduled for later, turned into RunJob when they fire
+        self.pending: Dict[str, PendingJob] = {}
+        self.finished: Deque[RunJob] = deque(maxlen=FINISHED_HISTORY)
+        self.batches: Dict[datetime.datetime, BatchJob] = {}
+        # Live mirrors of sessions being acquired, by mirror file path
+        self.mirrors: Dict[str, SessionMirror] = {}
+        self.transfer_schedule = TransferSchedule(config.transfer_windows)
+        self.archive = shared_archive(config.manifest_complete)
+        # Guards jobs, runs and batches, changed by observer and ingestion threads
+        self._lock = threading.RLock()
+        self.startup_thread: Optional[threading.Thread] = None
         self._startup_manifest_check()
 
     def _startup_manifest_check(self) -> None:
-        """ " Check for manifests to process in the manifest directory on startup"""
-        manifest_dir = Path(self.config.flag_dir).glob("*manifest*.*")
-        for manifest in manifest_dir:
-            transfer_config = self._load_manifest(str(manifest))
-            if transfer_config:
-                self.schedule_job(str(manifest), transfer_config)
+        """Schedule the manifests already in the manifest directory on startup,
+        in the background so live events are handled meanwhile"""
+        self.startup_thread = threading.Thread(
+            target=self._ingest_backlog, name="startup-ingestion", daemon=True
+        )
+        self.startup_thread.start()
+
+    def _backlog(self) -> List[os.DirEntry]:
+        """Manifests in the manifest directory in ingestion order, skipping
+        the ones that cannot be read"""
+        with os.scandir(self.config.flag_dir) as entries:
+            manifests = [
+                entry
+                for entry in entries
+                if not entry.name.startswith(".")
+                and fnmatch.fnmatch(entry.name, MANIFEST_PATTERN)
+                and not self._is_mirror(entry.name)
+                and self._is_readable(entry)
+            ]
+        if self.config.startup_order == "smallest":
+            return sorted(manifests, key=lambda entry: entry.stat().st_size)
+        return sorted(manifests, key=lambda entry: entry.stat().st_mtime)
+
+    @staticmethod
+    def _is_readable(entry: os.DirEntry) -> bool:
+        """Whether a directory entry is a file whose stat can be read. The stat
+        is cached by the entry for sorting the backlog"""
+        try:
+            entry.stat()
+            return entry.is_file()
+        except OSError as e:
+            logging.warning("Could not read manifest %s: %s", entry.path, e)
+            return False
+
+    def _is_mirror(self, name: str) -> bool:
+        """Whether a file starts a mirror, only when mirroring is configured"""
+        return self.config.mirror is not None and fnmatch.fnmatch(name, MIRROR_PATTERN)
+
+    def _ingest_backlog(self) -> None:
+        """Load and schedule the backlog with a bounded pool and report the
+        ingestion rate"""
+        start = time.time()
+        try:
+            if self.config.mirror is not None:
+                with os.scandir(self.config.flag_dir) as entries:
+                    for entry in entries:
+                        if self._is_mirror(entry.name):
+                            self._start_mirror(entry.path)
+            backlog = self._backlog()
+        except OSError as e:
+            logging.error("Could not list manifest directory: %s", e)
+            return
+        if not backlog:
+            return
+        with ThreadPoolExecutor(
+            max_workers=self.config.startup_workers, thread_name_prefix="ingest"
+        ) as pool:
+            scheduled = sum(pool.map(self._ingest, [entry.path for entry in backlog]))
+        duration = time.time() - start
+        rate = round(len(backlog) / duration, 1) if duration else None
+        logging.info(
+            {
+                "Action": "Startup manifests ingested",
+                "Manifests": len(backlog),
+                "Scheduled": scheduled,
+                "Duration_s": round(duration, 2),
+                "Manifests_per_s": rate,
+                "Oldest_age_s": int(
+                    start - min(entry.stat().st_mtime for entry in backlog)
+                ),
+            },
+            extra={"weblog": True},
+        )
+
+    def _ingest(self, src_path: str) -> bool:
+        """Load and schedule one backlog manifest, unless a live event already
+        scheduled it
+
+        Returns
+        -------
+        bool
+            True if the manifest was scheduled
+        """
+        try:
+            transfer_config = self._load_manifest(src_path)
+        except OSError as e:
+            logging.error("Could not read manifest %s: %s", src_path, e)
+            return False
+        if not transfer_config:
+            return False
+        with self._lock:
+            if src_path in self.jobs:
+                return False
+            self.schedule_job(src_path, transfer_config)
+            return src_path in self.jobs
 
     def _load_manifest(self, src_path: str) -> ManifestConfig:
         """Instructions to transfer to VAST
@@ -88,7 +207,7 @@ class EventHandler(FileSystemEventHandler):
         return trigger_time
 
     def schedule_job(self, src_path: str, job_config: ManifestConfig) -> None:
-        """Schedule job to run
+        """Schedule job to run, unless its manifest is already scheduled
 
         Parameters
         ----------
@@ -97,34 +216,347 @@ class EventHandler(FileSystemEventHandler):
         config : dict
             configuration for the job
         """
-        if not job_config.schedule_time:
+        if self._is_duplicate(src_path, job_config):
+            return
+        self._stop_mirrors(job_config.name)
+        with self._lock:
+            # Startup ingestion and a live event may both load the manifest
+            if src_path in self.jobs:
+                logging.info("Manifest %s is already scheduled", src_path)
+                return
+            self._schedule_run(src_path, job_config)
+
+    def _schedule_run(self, src_path: str, job_config: ManifestConfig) -> None:
+        """Create the job of a manifest and add it to the scheduler"""
+        if not job_config.schedule_time and self.transfer_schedule.is_open():
             # logging.info("Scheduling job to run now %s", src_path)
             run = RunJob(src_path, job_config, self.config)
             job_id = self.scheduler.add_job(
-                run.run_job,
+                self._job_function(run),
                 misfire_grace_time=self.config.misfire_grace_time_s,
             )
-
+            run.job_id = job_id.id
+            self.runs[src_path] = run
         else:
-            trigger = self._get_trigger_time(job_config.schedule_time)
+            if job_config.schedule_time:
+                trigger = self._get_trigger_time(job_config.schedule_time)
+            else:
+                trigger = datetime.datetime.now()
+            # Hold the job until a transfer window is open
+            trigger = self.transfer_schedule.next_opening(trigger)
             # logging.info("Scheduling job to run at %s %s", trigger, src_path)
-            run = RunJob(src_path, job_config, self.config)
-            job_id = self.scheduler.add_job(
-                run.run_job,
+            if self.config.batch_scheduled_jobs:
+                run = RunJob(src_path, job_config, self.config)
+                job_id = self._schedule_in_batch(src_path, run, trigger)
+                # Members share the batch's scheduler job, so each gets its own
+                # id for the status API
+                run.job_id = uuid.uuid4().hex
+                self.runs[src_path] = run
+            else:
+                job_id = self._schedule_pending(src_path, job_config, trigger)
+        logging.info(
+            {
+                "Action": "Job Scheduled",
+                "Scheduled Time": job_config.schedule_time or "now",
+            }
+            | job_config.log_tags,
+            extra={"weblog": True},
+        )
+        self.jobs[src_path] = job_id
+
+    def _job_function(self, run: RunJob) -> Callable:
+        """Scheduler function running a job with the configured runner"""
+        if self.config.runner == "asyncio":
+            return run.run_job_async
+        return run.run_job
+
+    def _schedule_pending(
+        self, src_path: str, job_config: ManifestConfig, trigger: datetime.datetime
+    ) -> Job:
+        """Schedule a job for later, keeping a PendingJob instead of its
+        manifest until it fires
+
+        Parameters
+        ----------
+        src_path : str
+            manifest file path
+        job_config : ManifestConfig
+            validated manifest
+        trigger : datetime.datetime
+            time the job fires
+
+        Returns
+        -------
+        Job
+            scheduler job
+        """
+        pending = PendingJob.from_manifest(src_path, job_config, trigger)
+        job = self.scheduler.add_job(
+            self._fire_async if self.config.runner == "asyncio" else self._fire,
+            "date",
+            args=[src_path],
+            run_date=trigger,
+            misfire_grace_time=self.config.misfire_grace_time_s,
+        )
+        pending.job_id = job.id
+        self.pending[src_path] = pending
+        return job
+
+    def _activate(self, src_path: str) -> Optional[RunJob]:
+        """Reload the manifest of a pending job that fired and create its
+        RunJob
+
+        Returns
+        -------
+        Optional[RunJob]
+            None if the job was removed or its manifest can no longer be loaded
+        """
+        with self._lock:
+            pending = self.pending.pop(src_path, None)
+        if pending is None:
+            return None
+        if pending.changed():
+            logging.info("Manifest %s changed since it was scheduled", src_path)
+        try:
+            job_config = self._load_manifest(src_path)
+        except OSError as e:
+            logging.error("Could not reload manifest %s: %s", src_path, e)
+            job_config = None
+        if not job_config:
+            with self._lock:
+                self.jobs.pop(src_path, None)
+            return None
+        run = RunJob(src_path, job_config, self.config)
+        run.job_id = pending.job_id
+        settings = pending.settings or {}
+        if "bandwidth_mbps" in settings:
+            run.control.set_bandwidth(settings["bandwidth_mbps"])
+        if "concurrency" in settings:
+            run.control.set_concurrency(settings["concurrency"])
+        with self._lock:
+            self.runs[src_path] = run
+        return run
+
+    def _fire(self, src_path: str) -> None:
+        """Scheduler function of a pending job"""
+        run = self._activate(src_path)
+        if run is not None:
+            run.run_job()
+
+    async def _fire_async(self, src_path: str) -> None:
+        """Scheduler coroutine of a pending job for the asyncio runner"""
+        run = await asyncio.to_thread(self._activate, src_path)
+        if run is not None:
+            await run.run_job_async()
+
+    def _schedule_in_batch(
+        self, src_path: str, run: RunJob, trigger: datetime.datetime
+    ) -> Job:
+        """Add a job to the batch of its trigger time, scheduling a new batch if
+        there is none or it already started
+
+        Parameters
+        ----------
+        src_path : str
+            manifest file path
+        run : RunJob
+            the job
+        trigger : datetime.datetime
+            time the batch runs
+
+        Returns
+        -------
+        Job
+            scheduler job of the batch
+        """
+        self.batches = {
+            trigger_time: batch
+            for trigger_time, batch in self.batches.items()
+            if not batch.started
+        }
+        batch = self.batches.get(trigger)
+        if batch is None or not batch.add(src_path, run):
+            batch = BatchJob(self.config)
+            batch.add(src_path, run)
+            batch.job = self.scheduler.add_job(
+                batch.run,
                 "date",
                 run_date=trigger,
                 misfire_grace_time=self.config.misfire_grace_time_s,
             )
+            self.batches[trigger] = batch
         logging.info(
+            {"Action": "Job added to batch", "Batch size": len(batch.members)}
+            | run.config.log_tags
+        )
+        return batch.job
+
+    def _leave_batch(self, src_path: str) -> bool:
+        """Remove a job from a batch that has not started and still holds other
+        jobs
+
+        Returns
+        -------
+        bool
+            True if the job was removed and the batch keeps running
+        """
+        for batch in self.batches.values():
+            if src_path in batch.members and len(batch.members) > 1:
+                batch.discard(src_path)
+                return src_path not in batch.members
+        return False
+
+    def batch_of(self, src_path: str) -> Optional[BatchJob]:
+        """Batch holding a job, None if the job is not batched"""
+        with self._lock:
+            for batch in self.batches.values():
+                if src_path in batch.members:
+                    return batch
+        return None
+
+    def cancel_batched(self, src_path: str) -> bool:
+        """Remove a job from its batch if the batch has not started, removing
+        the batch once it is empty. The other members keep their schedule
+
+        Returns
+        -------
+        bool
+            True if the job belongs to a batch
+        """
+        batch = self.batch_of(src_path)
+        if batch is None:
+            return False
+        batch.discard(src_path)
+        if not batch.members:
+            try:
+                self.scheduler.remove_job(batch.job.id)
+            except apscheduler.jobstores.base.JobLookupError:
+                pass
+        return True
+
+    def _is_duplicate(self, src_path: str, job_config: ManifestConfig) -> bool:
+        """Warn about a manifest whose name was already archived
+
+        Parameters
+        ----------
+        src_path : str
+            manifest file path
+        job_config : ManifestConfig
+            configuration for the job
+
+        Returns
+        -------
+        bool
+            True if the manifest must not be scheduled
+        """
+        try:
+            entry = self.archive.lookup(job_config.name)
+        except sqlite3.Error as e:
+            logging.warning("Could not read manifest archive index: %s", e)
+            return False
+        if entry is None:
+            return False
+        logging.warning(
             {
-                "Action": "Job Scheduled",
-                "Scheduled Time": job_config.schedule_time or "now",
+                "Action": "Manifest name already submitted",
+                "Archived": entry.path,
+                "Archived_at": datetime.datetime.fromtimestamp(entry.archived).isoformat(
+                    timespec="seconds"
+                ),
+                "Identical": entry.sha256 == manifest_digest(src_path),
+                "Policy": self.config.duplicate_manifests,
             }
             | job_config.log_tags,
             extra={"weblog": True},
         )
+        return self.config.duplicate_manifests == "skip"
 
-        self.jobs[src_path] = job_id
+    def _remove_job(self, src_path: str) -> None:
+        """Remove a scheduled job, or cancel it if it is already running
+
+        Parameters
+        ----------
+        src_path : str
+            manifest file path of the job
+        """
+        logging.info("Deleting job %s", src_path)
+        job = self.jobs.pop(src_path)
+        run = self.runs.pop(src_path, None)
+        self.pending.pop(src_path, None)
+        if self._leave_batch(src_path):
+            logging.info(
+                {"Action": "Manifest deleted, removed from batch", "File": src_path},
+                extra={"weblog": True},
+            )
+            return
+        if run is not None and run.control.state != "pending":
+            self.finished.append(run)
+        try:
+            self.scheduler.remove_job(job.id)
+            logging.info(
+                {
+                    "Action": "Manifest deleted",
+                    "File": src_path,
+                },
+                extra={"weblog": True},
+            )
+        except apscheduler.jobstores.base.JobLookupError:
+            if run is not None and run.control.state == "running":
+                logging.info(
+                    {"Action": "Cancelling running job", "File": src_path},
+                    extra={"weblog": True},
+                )
+                run.control.cancel()
+            else:
+                logging.info(
+                    "No apscheduler job for %s, this probably means the job ran "
+                    "successfully and this deletion is part of the move to "
+                    "manifest_completed",
+                    src_path,
+                )
+
+    def _start_mirror(self, src_path: str) -> None:
+        """Start mirroring the session of a mirror file, when mirroring is
+        configured
+
+        Parameters
+        ----------
+        src_path : str
+            mirror file path
+        """
+        if self.config.mirror is None:
+            return
+        try:
+            with open(src_path, "r", encoding="utf-8") as f:
+                config = MirrorConfig(**yaml.safe_load(f))
+        except Exception as e:
+            logging.error("Could not load mirror file %s: %s", src_path, e)
+            return
+        mirror = SessionMirror(
+            config,
+            self.config.mirror,
+            self.transfer_schedule,
+            rsync_layout=PLATFORM == "linux" and self.config.copy_backend == "system",
+            io_pressure=self.config.io_pressure,
+        )
+        with self._lock:
+            previous = self.mirrors.pop(src_path, None)
+            self.mirrors[src_path] = mirror
+        if previous is not None:
+            previous.stop()
+        mirror.start()
+
+    def _stop_mirrors(self, name: str) -> None:
+        """Stop mirroring a session whose manifest arrived, so its job copies
+        the remaining files alone"""
+        with self._lock:
+            stopped = [
+                self.mirrors.pop(src_path)
+                for src_path, mirror in list(self.mirrors.items())
+                if mirror.config.name == name
+            ]
+        for mirror in stopped:
+            mirror.stop()
 
     def on_deleted(self, event: Union[FileDeletedEvent, DirDeletedEvent]) -> None:
         """Event handler for file deleted event
@@ -138,24 +570,14 @@ class EventHandler(FileSystemEventHandler):
         -------
         None
         """
-        if event.src_path in self.jobs:
-            logging.info("Deleting job %s", event.src_path)
-            try:
-                self.scheduler.remove_job(self.jobs[event.src_path].id)
-                logging.info(
-                    {
-                        "Action": "Manifest deleted",
-                        "File": event.src_path,
-                    },
-                    extra={"weblog": True},
-                )
-            except apscheduler.jobstores.base.JobLookupError:
-                logging.info(
-                    "No apscheduler job for %s, this probably means the job ran successfully and this deletion is part of the move to manifest_completed",
-                    event.src_path,
-                )
-            del self.jobs[event.src_path]
-        logging.info("Jobs in queue %s", self.scheduler.get_jobs())
+        with self._lock:
+            if event.src_path in self.jobs:
+                self._remove_job(event.src_path)
+            mirror = self.mirrors.pop(event.src_path, None)
+        if mirror is not None:
+            mirror.stop()
+        # A count rather than scheduler.get_jobs(), which copies every job
+        logging.info("Jobs in queue %s", len(self.jobs))
 
     def on_created(self, event: Union[FileCreatedEvent, DirCreatedEvent]) -> None:
         """Event handler for file modified event
@@ -173,17 +595,18 @@ class EventHandler(FileSystemEventHandler):
         _path = Path(str(event.src_path))
         if isinstance(event, DirCreatedEvent) | _path.is_dir():
             return
+        if self._is_mirror(_path.name):
+            time.sleep(10)  # Wait for file to be written
+            self._start_mirror(event.src_path)
+            return
         if "manifest" not in _path.name:
             return
-        # If scheduled manifest is being modified, remove original job
-        if event.src_path in self.jobs:
-            logging.info("Deleting job %s", event.src_path)
-            self.scheduler.remove_job(self.jobs[event.src_path].id)
-            del self.jobs[event.src_path]
+        # If scheduled manifest is being modified, remove or cancel original job
+        with self._lock:
+            if event.src_path in self.jobs:
+                self._remove_job(event.src_path)
         logging.info("Found event file %s", event.src_path)  # log schedule time
         time.sleep(10)  # Wait for file to be written
         transfer_config = self._load_manifest(event.src_path)
         if transfer_config:
             self.schedule_job(event.src_path, transfer_config)
-        print(self.scheduler.get_jobs())
-        pass
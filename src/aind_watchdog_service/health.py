@@ -0,0 +1,269 @@
+"""Health probes and circuit breakers for staging destinations and the
+transfer service"""
+
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import requests
+
+from aind_watchdog_service.models.watch_config import HealthConfig
+
+# Seconds a held job sleeps between two polls, so it notices cancel quickly
+HOLD_POLL_S = 1.0
+
+
+def probe_path(path: str, timeout_s: float) -> bool:
+    """Check a destination directory is reachable
+
+    The check runs on a daemon thread because a dead network share can block
+    a stat call for minutes.
+
+    Parameters
+    ----------
+    path : str
+        destination root
+    timeout_s : float
+        seconds to wait for the share to answer
+
+    Returns
+    -------
+    bool
+        True if the directory exists and answered in time
+    """
+    result = []
+    thread = threading.Thread(
+        target=lambda: result.append(os.path.isdir(path)),
+        name="health-probe",
+        daemon=True,
+    )
+    thread.start()
+    thread.join(timeout_s)
+    return bool(result and result[0])
+
+
+def probe_endpoint(url: str, timeout_s: float) -> bool:
+    """Check the transfer service answers HTTP requests
+
+    Parameters
+    ----------
+    url : str
+        transfer endpoint
+    timeout_s : float
+        request timeout
+
+    Returns
+    -------
+    bool
+        True for any response that is not a server error
+    """
+    try:
+        response = requests.head(url, timeout=timeout_s, allow_redirects=False)
+    except requests.RequestException:
+        return False
+    return response.status_code < 500
+
+
+class CircuitBreaker:
+    """Outage state of one target
+
+    The breaker opens when a job fails and a probe confirms the target is
+    down. While it is open, jobs needing the target wait and whichever of
+    them polls it probes the target at most once per probe interval. Once
+    a probe succeeds the waiting jobs are released one per replay interval,
+    so a recovered share or service is not hit by the whole backlog at once.
+    """
+
+    def __init__(
+        self,
+        target: str,
+        probe: Callable[[], bool],
+        probe_interval_s: float,
+        replay_interval_s: float,
+    ):
+        """Construct CircuitBreaker
+
+        Parameters
+        ----------
+        target : str
+            destination root or endpoint, for logs
+        probe : Callable[[], bool]
+            returns True while the target is healthy
+        probe_interval_s : float
+            minimum seconds between two probes of an open breaker
+        replay_interval_s : float
+            seconds between two waiting jobs released after recovery
+        """
+        self.target = target
+        self.probe = probe
+        self.probe_interval_s = probe_interval_s
+        self.replay_interval_s = replay_interval_s
+        self.open = False
+        self._probed = 0.0
+        self._next_release = 0.0
+        self._lock = threading.Lock()
+
+    def trip(self) -> bool:
+        """Probe the target after a failure and open the breaker if it is down
+
+        Returns
+        -------
+        bool
+            True if the target is down
+        """
+        healthy = self.probe()
+        with self._lock:
+            self._probed = time.monotonic()
+            if not healthy and not self.open:
+                self.open = True
+                logging.warning(
+                    {"Action": "Target unavailable, holding jobs", "Target": self.target},
+                    extra={"weblog": True},
+                )
+        return not healthy
+
+    def release_time(self) -> Optional[float]:
+        """Probe an open breaker when due and reserve a replay slot once the
+        target is back
+
+        Returns
+        -------
+        Optional[float]
+            None while the target is down, otherwise the monotonic time the
+            caller may use the target at
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self.open and now - self._probed >= self.probe_interval_s:
+                self._probed = now
+                if self.probe():
+                    self.open = False
+                    self._next_release = now
+                    logging.info(
+                        {
+                            "Action": "Target recovered, replaying jobs",
+                            "Target": self.target,
+                        },
+                        extra={"weblog": True},
+                    )
+            if self.open:
+                return None
+            release = max(self._next_release, now)
+            self._next_release = release + self.replay_interval_s
+            return release
+
+
+class Hold:
+    """Wait of one job for the open breakers of its targets and its replay
+    slot, polled like readiness.SourceWatcher"""
+
+    def __init__(self, breakers: List[CircuitBreaker]):
+        """Construct Hold
+
+        Parameters
+        ----------
+        breakers : List[CircuitBreaker]
+            open breakers the job needs
+        """
+        self.targets = [breaker.target for breaker in breakers]
+        self._pending = list(breakers)
+        self._release = 0.0
+        self._start = time.monotonic()
+
+    @property
+    def waited(self) -> float:
+        """Seconds since the hold started"""
+        return time.monotonic() - self._start
+
+    def poll(self) -> float:
+        """Probe the targets when due
+
+        Returns
+        -------
+        float
+            seconds to wait before polling again, 0 once the job may go
+        """
+        while self._pending:
+            release = self._pending[0].release_time()
+            if release is None:
+                return HOLD_POLL_S
+            self._release = max(self._release, release)
+            self._pending.pop(0)
+        return max(0.0, min(self._release - time.monotonic(), HOLD_POLL_S))
+
+
+class HealthMonitor:
+    """Circuit breakers of every destination root and endpoint used by jobs,
+    created on first use"""
+
+    def __init__(self, config: HealthConfig):
+        """Construct HealthMonitor
+
+        Parameters
+        ----------
+        config : HealthConfig
+            probe and replay settings
+        """
+        self.config = config
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, target: str) -> CircuitBreaker:
+        """Circuit breaker of a destination root or an http(s) endpoint"""
+        with self._lock:
+            if target not in self._breakers:
+                probe = probe_endpoint if target.startswith("http") else probe_path
+                self._breakers[target] = CircuitBreaker(
+                    target,
+                    lambda: probe(target, self.config.probe_timeout_s),
+                    self.config.probe_interval_s,
+                    self.config.replay_interval_s,
+                )
+            return self._breakers[target]
+
+    def hold(self, targets: List[str]) -> Optional[Hold]:
+        """Hold on the open breakers among targets
+
+        Returns
+        -------
+        Optional[Hold]
+            None if every target is available
+        """
+        blocked = [breaker for breaker in map(self.breaker, targets) if breaker.open]
+        return Hold(blocked) if blocked else None
+
+    def trip(self, targets: List[str]) -> bool:
+        """Probe targets after a failure
+
+        Returns
+        -------
+        bool
+            True if any target is down, so the job should wait and replay
+        """
+        return any([self.breaker(target).trip() for target in targets])
+
+
+_shared: Dict[str, HealthMonitor] = {}
+_shared_lock = threading.Lock()
+
+
+def shared_monitor(config: HealthConfig) -> HealthMonitor:
+    """Process-wide monitor, so every job sees the same outages
+
+    Parameters
+    ----------
+    config : HealthConfig
+        probe and replay settings
+
+    Returns
+    -------
+    HealthMonitor
+        the monitor of these settings
+    """
+    key = config.model_dump_json()
+    with _shared_lock:
+        if key not in _shared:
+            _shared[key] = HealthMonitor(config)
+        return _shared[key]
@@ -0,0 +1,227 @@
+"""Local SQLite history of finished jobs and throughput analytics"""
+
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from typing import Dict, List, Optional, Tuple
+
+HISTORY_NAME = "job_history.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    rig TEXT,
+    platform TEXT,
+    project_name TEXT,
+    destination TEXT,
+    state TEXT,
+    started REAL,
+    finished REAL,
+    wait_s REAL,
+    copy_s REAL,
+    trigger_s REAL,
+    backend TEXT,
+    runner TEXT,
+    copy_workers INTEGER,
+    bytes INTEGER,
+    files INTEGER,
+    mbps REAL,
+    response_status INTEGER,
+    response TEXT,
+    remote_job_id TEXT,
+    remote_state TEXT
+);
+CREATE TABLE IF NOT EXISTS modalities (
+    job_id INTEGER NOT NULL REFERENCES jobs (id),
+    modality TEXT NOT NULL,
+    bytes INTEGER,
+    files INTEGER
+);
+CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished);
+"""
+
+JOB_COLUMNS = (
+    "name",
+    "rig",
+    "platform",
+    "project_name",
+    "destination",
+    "state",
+    "started",
+    "finished",
+    "wait_s",
+    "copy_s",
+    "trigger_s",
+    "backend",
+    "runner",
+    "copy_workers",
+    "bytes",
+    "files",
+    "mbps",
+    "response_status",
+    "response",
+    "remote_job_id",
+    "remote_state",
+)
+
+# Columns added after the first release, created in older databases on open
+ADDED_COLUMNS = {"remote_job_id": "TEXT", "remote_state": "TEXT"}
+
+# SQL expression of each grouping key of aggregate
+GROUPS = {
+    "rig": "jobs.rig",
+    "platform": "jobs.platform",
+    "project": "jobs.project_name",
+    "destination": "jobs.destination",
+    "backend": "jobs.backend",
+    "modality": "modalities.modality",
+    "hour": "strftime('%Y-%m-%d %H:00', jobs.finished, 'unixepoch', 'localtime')",
+}
+
+_lock = threading.Lock()
+
+
+class JobHistory:
+    """Append-only store of job records
+
+    Each call opens its own connection, so jobs on different threads or event
+    loop executors can record concurrently; writes are serialized per process
+    and SQLite's busy timeout covers the stats command reading at the same
+    time.
+    """
+
+    def __init__(self, path: str):
+        """Construct JobHistory
+
+        Parameters
+        ----------
+        path : str
+            SQLite database file, created on first use
+        """
+        self.path = path
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the database and create its tables"""
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.row_factory = sqlite3.Row
+        connection.executescript(SCHEMA)
+        existing = {row["name"] for row in connection.execute("PRAGMA table_info(jobs)")}
+        for column, kind in ADDED_COLUMNS.items():
+            if column not in existing:
+                connection.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+        return connection
+
+    def record(self, job: dict, modalities: Dict[str, Tuple[int, int]]) -> int:
+        """Append a finished job
+
+        Parameters
+        ----------
+        job : dict
+            values of JOB_COLUMNS, missing keys are stored as NULL
+        modalities : Dict[str, Tuple[int, int]]
+            bytes and file count of each modality
+
+        Returns
+        -------
+        int
+            id of the new record
+        """
+        values = [job.get(column) for column in JOB_COLUMNS]
+        with _lock, closing(self._connect()) as connection, connection:
+            cursor = connection.execute(
+                f"INSERT INTO jobs ({', '.join(JOB_COLUMNS)})"
+                f" VALUES ({', '.join('?' * len(JOB_COLUMNS))})",
+                values,
+            )
+            connection.executemany(
+                "INSERT INTO modalities (job_id, modality, bytes, files)"
+                " VALUES (?, ?, ?, ?)",
+                [
+                    (cursor.lastrowid, modality, nbytes, files)
+                    for modality, (nbytes, files) in modalities.items()
+                ],
+            )
+            return cursor.lastrowid
+
+    def update_remote_state(self, record_id: int, remote_state: str) -> None:
+        """Set the transfer service state of a recorded job
+
+        Parameters
+        ----------
+        record_id : int
+            id returned by record
+        remote_state : str
+            latest state reported by aind-data-transfer-service
+        """
+        with _lock, closing(self._connect()) as connection, connection:
+            connection.execute(
+                "UPDATE jobs SET remote_state = ? WHERE id = ?", (remote_state, record_id)
+            )
+
+    def aggregate(self, by: str, since_s: Optional[float] = None) -> List[dict]:
+        """Job counts and throughput per group
+
+        Parameters
+        ----------
+        by : str
+            grouping key, one of GROUPS
+        since_s : Optional[float]
+            only jobs finished in the last since_s seconds, None for all jobs
+
+        Returns
+        -------
+        List[dict]
+            one row per group, slowest throughput first. Per modality, bytes
+            are the modality's and throughput uses the whole job's copy time
+        """
+        source = "jobs"
+        nbytes, files = "jobs.bytes", "jobs.files"
+        if by == "modality":
+            source = "jobs JOIN modalities ON modalities.job_id = jobs.id"
+            nbytes, files = "modalities.bytes", "modalities.files"
+        query = f"""
+            SELECT {GROUPS[by]} AS "group",
+                COUNT(*) AS jobs,
+                SUM(jobs.state != 'succeeded') AS failed,
+                ROUND(SUM({nbytes}) / 1e9, 3) AS gb,
+                SUM({files}) AS files,
+                ROUND(AVG(jobs.wait_s), 1) AS avg_wait_s,
+                ROUND(AVG(jobs.copy_s), 1) AS avg_copy_s,
+                ROUND(SUM({nbytes}) / NULLIF(SUM(jobs.copy_s), 0) / 1e6, 2) AS mbps
+            FROM {source}
+            WHERE jobs.finished >= ?
+            GROUP BY 1
+            ORDER BY mbps IS NULL, mbps
+        """
+        since = 0 if since_s is None else time.time() - since_s
+        with closing(self._connect()) as connection:
+            return [dict(row) for row in connection.execute(query, (since,))]
+
+
+def format_table(rows: List[dict]) -> str:
+    """Render aggregate rows as an aligned text table
+
+    Parameters
+    ----------
+    rows : List[dict]
+        rows with the same keys
+
+    Returns
+    -------
+    str
+        header and one line per row
+    """
+    if not rows:
+        return "No jobs recorded"
+    columns = list(rows[0])
+    cells = [columns] + [
+        ["" if row[column] is None else str(row[column]) for column in columns]
+        for row in rows
+    ]
+    widths = [max(len(line[index]) for line in cells) for index in range(len(columns))]
+    return "\n".join(
+        "  ".join(cell.ljust(width) for cell, width in zip(line, widths)).rstrip()
+        for line in cells
+    )
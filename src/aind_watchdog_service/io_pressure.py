@@ -0,0 +1,135 @@
+"""Local disk I/O pressure sampling so staging copies can back off during
+acquisition"""
+
+import logging
+import os
+import platform
+import threading
+import time
+from typing import Optional
+
+try:
+    import psutil
+except ImportError:  # pragma: no cover
+    psutil = None
+
+DISKSTATS = "/proc/diskstats"
+
+
+class DiskPressureMonitor:
+    """Sample how busy a disk is with writes.
+
+    Staging copies only read from the acquisition disk, so the share of
+    wall time the disk spends writing measures acquisition pressure
+    without counting our own reads. Linux reads /proc/diskstats for the
+    device holding ``path``; other platforms use psutil's system-wide
+    counters when psutil is installed.
+    """
+
+    def __init__(self, path: str, threshold_pct: float, sample_s: float = 1.0):
+        """Construct DiskPressureMonitor
+
+        Parameters
+        ----------
+        path : str
+            any path on the disk to monitor
+        threshold_pct : float
+            utilization above which copies should pause
+        sample_s : float
+            minimum interval between two samples, calls in between reuse the
+            last value
+        """
+        self.path = path
+        self.threshold_pct = threshold_pct
+        self.sample_s = sample_s
+        self._lock = threading.Lock()
+        self._device = self._find_device(path)
+        self._last_counter = self._read_write_ms()
+        self._last_time = time.monotonic()
+        self._utilization = 0.0
+        if self._last_counter is None:
+            logging.warning(
+                "Disk I/O counters unavailable for %s, I/O pressure backoff disabled",
+                path,
+            )
+
+    @staticmethod
+    def _find_device(path: str) -> Optional[str]:
+        """Name of the block device holding path in /proc/diskstats"""
+        if platform.system() != "Linux" or not os.path.exists(DISKSTATS):
+            return None
+        try:
+            dev = os.stat(path).st_dev
+        except OSError:
+            return None
+        with open(DISKSTATS, encoding="utf-8") as f:
+            for line in f:
+                fields = line.split()
+                if (int(fields[0]), int(fields[1])) == (os.major(dev), os.minor(dev)):
+                    return fields[2]
+        return None
+
+    def _read_write_ms(self) -> Optional[int]:
+        """Cumulative milliseconds the disk has spent writing"""
+        if self._device is not None:
+            with open(DISKSTATS, encoding="utf-8") as f:
+                for line in f:
+                    fields = line.split()
+                    if fields[2] == self._device:
+                        return int(fields[10])
+            return None
+        if psutil is not None:
+            counters = psutil.disk_io_counters()
+            if counters is not None:
+                return counters.write_time
+        return None
+
+    @property
+    def enabled(self) -> bool:
+        """True if counters can be read on this system"""
+        return self._last_counter is not None
+
+    def utilization(self) -> float:
+        """Percent of wall time the disk spent writing since the last sample
+
+        Returns
+        -------
+        float
+            write utilization between 0 and 100
+        """
+        with self._lock:
+            if not self.enabled:
+                return 0.0
+            now = time.monotonic()
+            elapsed = now - self._last_time
+            if elapsed < self.sample_s:
+                return self._utilization
+            counter = self._read_write_ms()
+            if counter is not None:
+                busy_ms = counter - self._last_counter
+                self._utilization = min(100.0, 100.0 * busy_ms / (elapsed * 1000))
+                self._last_counter = counter
+            self._last_time = now
+            return self._utilization
+
+    def is_busy(self) -> bool:
+        """Check if utilization is above the threshold"""
+        return self.utilization() > self.threshold_pct
+
+    def wait_for_idle(self, poll_s: float = 5.0) -> float:
+        """Block while the disk is busy
+
+        Parameters
+        ----------
+        poll_s : float
+            seconds between checks while paused
+
+        Returns
+        -------
+        float
+            seconds spent waiting
+        """
+        start = time.monotonic()
+        while self.is_busy():
+            time.sleep(max(poll_s, self.sample_s))
+        return time.monotonic() - start
@@ -0,0 +1,296 @@
+"""Cooperative cancellation and live control of running jobs"""
+
+import logging
+import os
+import platform
+import signal
+import subprocess
+import threading
+import time
+from typing import Optional, Set
+
+try:
+    import psutil
+except ImportError:  # pragma: no cover
+    psutil = None
+
+from aind_watchdog_service.models.watch_config import MAX_COPY_WORKERS
+
+
+def check_bandwidth(mbps: Optional[float]) -> None:
+    """Raise ValueError unless mbps is None or a positive number"""
+    if mbps is not None and (
+        isinstance(mbps, bool) or not isinstance(mbps, (int, float)) or mbps <= 0
+    ):
+        raise ValueError(
+            f"bandwidth_mbps must be null or a positive number, got {mbps!r}"
+        )
+
+
+def check_concurrency(concurrency: int) -> None:
+    """Raise ValueError unless concurrency is an integer of at least 1"""
+    if (
+        isinstance(concurrency, bool)
+        or not isinstance(concurrency, int)
+        or concurrency < 1
+    ):
+        raise ValueError(
+            f"concurrency must be an integer of at least 1, got {concurrency!r}"
+        )
+
+
+class JobCancelled(Exception):
+    """Raised inside a job once it has been cancelled"""
+
+
+class JobControl:
+    """Handle used to cancel, pause, resume and retune a job while it runs.
+
+    Copy loops call :meth:`checkpoint` between files and chunks, which
+    blocks while the job is paused and raises :class:`JobCancelled` once
+    it is cancelled. Child processes registered with the handle are
+    suspended, resumed or terminated along with the job.
+    """
+
+    def __init__(self, concurrency: int = 1):
+        """Construct JobControl
+
+        Parameters
+        ----------
+        concurrency : int
+            number of files copied at the same time
+        """
+        self.state = "pending"
+        self.bandwidth: Optional[float] = None
+        self._cancelled = threading.Event()
+        self._resumed = threading.Event()
+        self._resumed.set()
+        self._slots = threading.Condition()
+        self._concurrency = concurrency
+        self._active = 0
+        self._processes: Set[subprocess.Popen] = set()
+        self._processes_lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        """True once cancel has been requested"""
+        return self._cancelled.is_set()
+
+    @property
+    def paused(self) -> bool:
+        """True while the job is paused"""
+        return not self._resumed.is_set()
+
+    @property
+    def concurrency(self) -> int:
+        """Number of files copied at the same time"""
+        return self._concurrency
+
+    def cancel(self) -> None:
+        """Stop the job at its next checkpoint and terminate its child processes"""
+        self._cancelled.set()
+        self._resumed.set()
+        with self._slots:
+            self._slots.notify_all()
+        with self._processes_lock:
+            for proc in self._processes:
+                self._signal(proc, "terminate")
+
+    def pause(self) -> None:
+        """Hold the job at its next checkpoint and suspend its child processes"""
+        self._resumed.clear()
+        with self._processes_lock:
+            for proc in self._processes:
+                self._signal(proc, "suspend")
+
+    def resume(self) -> None:
+        """Release a paused job"""
+        with self._processes_lock:
+            for proc in self._processes:
+                self._signal(proc, "resume")
+        self._resumed.set()
+
+    def set_bandwidth(self, mbps: Optional[float]) -> None:
+        """Cap the job's copy bandwidth
+
+        Parameters
+        ----------
+        mbps : Optional[float]
+            megabytes per second, None removes the job's own cap
+
+        Raises
+        ------
+        ValueError
+            if mbps is not a positive number
+        """
+        check_bandwidth(mbps)
+        self.bandwidth = mbps * 1_000_000 if mbps else None
+
+    def set_concurrency(self, concurrency: int) -> None:
+        """Change how many files are copied at the same time
+
+        Parameters
+        ----------
+        concurrency : int
+            at least 1, clamped to MAX_COPY_WORKERS
+
+        Raises
+        ------
+        ValueError
+            if concurrency is not an integer of at least 1
+        """
+        check_concurrency(concurrency)
+        with self._slots:
+            self._concurrency = min(concurrency, MAX_COPY_WORKERS)
+            self._slots.notify_all()
+
+    def checkpoint(self) -> None:
+        """Block while paused, raise JobCancelled once cancelled"""
+        self._resumed.wait()
+        if self.cancelled:
+            raise JobCancelled()
+
+    def acquire_slot(self) -> None:
+        """Wait for a free copy slot, raise JobCancelled once cancelled"""
+        with self._slots:
+            while self._active >= self._concurrency and not self.cancelled:
+                self._slots.wait()
+            if self.cancelled:
+                raise JobCancelled()
+            self._active += 1
+
+    def try_acquire_slot(self) -> bool:
+        """Take a free copy slot without waiting, used by coroutines that must
+        not block the event loop
+
+        Returns
+        -------
+        bool
+            True if a slot was taken
+        """
+        with self._slots:
+            if self.cancelled:
+                raise JobCancelled()
+            if self._active >= self._concurrency:
+                return False
+            self._active += 1
+            return True
+
+    def release_slot(self) -> None:
+        """Return a copy slot"""
+        with self._slots:
+            self._active -= 1
+            self._slots.notify()
+
+    def register_process(self, proc: subprocess.Popen) -> None:
+        """Track a child process so it follows cancel and pause requests"""
+        with self._processes_lock:
+            self._processes.add(proc)
+            if self.cancelled:
+                self._signal(proc, "terminate")
+            elif self.paused:
+                self._signal(proc, "suspend")
+
+    def unregister_process(self, proc: subprocess.Popen) -> None:
+        """Stop tracking a finished child process"""
+        with self._processes_lock:
+            self._processes.discard(proc)
+
+    @staticmethod
+    def _signal(proc: subprocess.Popen, action: str) -> None:
+        """Terminate, suspend or resume a child process
+
+        Suspending needs SIGSTOP on POSIX or psutil on Windows. Without
+        them the process runs to completion and the job pauses at its next
+        checkpoint instead. Both subprocess.Popen and asyncio processes are
+        supported.
+        """
+        finished = proc.poll() if hasattr(proc, "poll") else proc.returncode
+        if finished is not None:
+            return
+        try:
+            if action == "terminate":
+                proc.terminate()
+            elif platform.system() != "Windows":
+                sig = signal.SIGSTOP if action == "suspend" else signal.SIGCONT
+                os.kill(proc.pid, sig)
+            elif psutil is not None:
+                if action == "suspend":
+                    psutil.Process(proc.pid).suspend()
+                else:
+                    psutil.Process(proc.pid).resume()
+        except Exception as e:
+            logging.warning("Could not %s process %s: %s", action, proc.pid, e)
+
+
+class JobProgress:
+    """Live byte and file counters of a job, read by the status API"""
+
+    def __init__(self):
+        """Construct JobProgress"""
+        self.bytes_total = 0
+        self.bytes_copied = 0
+        self.files_total = 0
+        self.files_copied = 0
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def start(self, bytes_total: int, files_total: int) -> None:
+        """Reset counters when the copy starts
+
+        Parameters
+        ----------
+        bytes_total : int
+            bytes the job expects to copy
+        files_total : int
+            files or directories the job expects to copy
+        """
+        with self._lock:
+            self.bytes_total = bytes_total
+            self.files_total = files_total
+            self.bytes_copied = 0
+            self.files_copied = 0
+            self.started = time.time()
+            self.finished = None
+
+    def add_bytes(self, nbytes: int) -> None:
+        """Count copied bytes"""
+        with self._lock:
+            self.bytes_copied += nbytes
+
+    def add_file(self) -> None:
+        """Count a copied file or directory"""
+        with self._lock:
+            self.files_copied += 1
+
+    def finish(self) -> None:
+        """Stop the clock"""
+        self.finished = time.time()
+
+    def snapshot(self) -> dict:
+        """Counters with derived throughput and ETA
+
+        Returns
+        -------
+        dict
+            bytes, files, throughput in MB/s and ETA in seconds
+        """
+        status = {
+            "bytes_total": self.bytes_total,
+            "bytes_copied": self.bytes_copied,
+            "files_total": self.files_total,
+            "files_copied": self.files_copied,
+            "throughput_mbps": None,
+            "eta_s": None,
+        }
+        if self.started is None:
+            return status
+        elapsed = (self.finished or time.time()) - self.started
+        if elapsed > 0 and self.bytes_copied:
+            rate = self.bytes_copied / elapsed
+            status["throughput_mbps"] = round(rate / 1_000_000, 2)
+            if self.finished is None:
+                remaining = max(0, self.bytes_total - self.bytes_copied)
+                status["eta_s"] = int(remaining / rate)
+        return status
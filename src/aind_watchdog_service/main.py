@@ -2,8 +2,10 @@
 
 import argparse
 import logging
+import multiprocessing
 import os
 import sys
+import threading
 import time
 import mpetk
 from pathlib import Path
@@ -13,8 +15,12 @@ from apscheduler.schedulers.background import BackgroundScheduler
 from pydantic import ValidationError
 from watchdog.observers import Observer
 
+from aind_watchdog_service.archive import shared_archive
+from aind_watchdog_service.async_runner import AsyncRunner
 from aind_watchdog_service.event_handler import EventHandler
+from aind_watchdog_service.history import GROUPS, JobHistory, format_table
 from aind_watchdog_service.models.watch_config import WatchConfig
+from aind_watchdog_service.status_api import StatusServer
 
 from aind_watchdog_service import __version__, integration_test
 
@@ -39,10 +45,16 @@ class WatchdogService:
         """
         self.watch_config = watch_config
         self.scheduler = None
+        self.async_runner = None
 
     def initiate_scheduler(self) -> None:
         """Starts APScheduler"""
         logging.info("Starting scheduler")
+        if self.watch_config.runner == "asyncio":
+            self.async_runner = AsyncRunner(self.watch_config.max_concurrent_jobs)
+            self.async_runner.start()
+            self.scheduler = self.async_runner.scheduler
+            return
         self.scheduler = BackgroundScheduler()
         self.scheduler.start()
 
@@ -57,7 +69,18 @@ class WatchdogService:
             # raise FileNotFoundError(f"Directory {watch_directory} does not exist")
         if not Path(self.watch_config.manifest_complete).exists():
             Path(self.watch_config.manifest_complete).mkdir(parents=True, exist_ok=True)
+        # Rotating a flat archive left by older versions can take a while
+        threading.Thread(
+            target=shared_archive(self.watch_config.manifest_complete).maintain,
+            args=(self.watch_config.archive_compact_months,),
+            name="archive-maintenance",
+            daemon=True,
+        ).start()
         event_handler = EventHandler(self.scheduler, self.watch_config)
+        status_server = None
+        if self.watch_config.status_api_port is not None:
+            status_server = StatusServer(event_handler, self.watch_config.status_api_port)
+            status_server.start()
         observer.schedule(event_handler, watch_directory)
         observer.start()
         try:
@@ -66,7 +89,12 @@ class WatchdogService:
         except (KeyboardInterrupt, SyntaxError, SystemExit):
             logging.info("Exiting program")
             observer.stop()
-            self.scheduler.shutdown()
+            if status_server is not None:
+                status_server.stop()
+            if self.async_runner is not None:
+                self.async_runner.stop()
+            else:
+                self.scheduler.shutdown()
         observer.join()
 
     def start_service(self) -> None:
@@ -120,9 +148,39 @@ def parse_args(args_list: list[str]) -> argparse.Namespace:
 
     parser.add_argument("--test", action="store_true")
 
+    subparsers = parser.add_subparsers(dest="command")
+    stats = subparsers.add_parser(
+        "stats", help="Summarize the job history database and exit"
+    )
+    stats.add_argument("database", type=str, help="Job history SQLite file")
+    stats.add_argument(
+        "--by",
+        choices=sorted(GROUPS),
+        default="destination",
+        help="Group jobs by this key",
+    )
+    stats.add_argument(
+        "--days", type=float, help="Only include jobs finished in the last days"
+    )
+
     return parser.parse_args(args_list)
 
 
+def print_stats(args: argparse.Namespace) -> None:
+    """Print job counts and throughput from the job history database
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        parsed stats subcommand arguments
+    """
+    if not Path(args.database).is_file():
+        logging.error("Job history database %s does not exist", args.database)
+        sys.exit(1)
+    since_s = args.days * 86400 if args.days is not None else None
+    print(format_table(JobHistory(args.database).aggregate(args.by, since_s)))
+
+
 def read_config(config_path: str) -> WatchConfig:
     """read yaml configuration file
 
@@ -191,10 +249,14 @@ def main(args):
 
 
 if __name__ == "__main__":
+    # CPU worker processes re-enter the frozen executable on Windows
+    multiprocessing.freeze_support()
 
     args = parse_args(sys.argv[1:])
 
     if args.test:
         integration_test.run_test()
+    elif args.command == "stats":
+        print_stats(args)
     else:
         main(args)
@@ -0,0 +1,213 @@
+"""Stage the files of a session while it is still being acquired"""
+
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from aind_watchdog_service import copy_engine, patterns
+from aind_watchdog_service.io_pressure import DiskPressureMonitor
+from aind_watchdog_service.job_control import JobCancelled
+from aind_watchdog_service.models.manifest_config import MirrorConfig
+from aind_watchdog_service.models.watch_config import IOPressureConfig, MirrorSettings
+from aind_watchdog_service.throttle import TransferSchedule
+
+# Name pattern of mirror files in the poll directory
+MIRROR_PATTERN = "*mirror*.*"
+
+# (size, mtime_ns) of a source file
+Signature = Tuple[int, int]
+
+
+def staged_files(
+    root: Path, sources: Dict[str, List[str]], rsync_layout: bool
+) -> Iterator[Tuple[str, str, Path]]:
+    """Every file of a session's sources with the directory a mirror stages it in
+
+    Parameters
+    ----------
+    root : Path
+        session directory in the destination
+    sources : Dict[str, List[str]]
+        files and directories of each modality, patterns expanded
+    rsync_layout : bool
+        True if listed directories are staged under their own name
+
+    Yields
+    ------
+    Tuple[str, str, Path]
+        the listed entry, the file and its staging directory
+    """
+    for modality, entries in sources.items():
+        for entry in entries:
+            base = root / modality
+            if rsync_layout and os.path.isdir(entry):
+                base = base / Path(entry).name
+            for file, relative in copy_engine.list_files([entry]):
+                yield entry, file, (base / relative).parent
+
+
+class SessionMirror:
+    """Copy the finished files of an active session to its destination
+
+    Every poll_s the session's sources are scanned; a file that kept the
+    same size and modification time for stable_s is copied with its
+    modification time, to the path the job of the session's manifest stages
+    it at. Files changed since they were copied are copied again. The job
+    then skips every file already staged identically and copies the tail.
+    Copies charge the bucket of the open transfer window and pause while the
+    acquisition disk is busy, like the copies of jobs.
+    """
+
+    def __init__(
+        self,
+        config: MirrorConfig,
+        settings: MirrorSettings,
+        schedule: TransferSchedule,
+        rsync_layout: bool,
+        io_pressure: Optional[IOPressureConfig] = None,
+    ):
+        """Construct SessionMirror
+
+        Parameters
+        ----------
+        config : MirrorConfig
+            session name, destination and modality sources
+        settings : MirrorSettings
+            poll interval and stable window
+        schedule : TransferSchedule
+            transfer windows, mirroring only copies while one is open
+        rsync_layout : bool
+            True if jobs copy listed directories with rsync, which stages the
+            directory itself instead of its contents
+        io_pressure : Optional[IOPressureConfig]
+            pause copies while the acquisition disk is busy writing
+        """
+        self.config = config
+        self.settings = settings
+        self.schedule = schedule
+        self.rsync_layout = rsync_layout
+        self.files_copied = 0
+        self.bytes_copied = 0
+        self._seen: Dict[str, Tuple[Signature, float]] = {}
+        self._copied: Dict[str, Signature] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.io_pressure = io_pressure
+        self.io_monitor = None
+        if io_pressure is not None:
+            self.io_monitor = DiskPressureMonitor(
+                io_pressure.path, io_pressure.threshold_pct, io_pressure.sample_s
+            )
+
+    def start(self) -> None:
+        """Mirror in a daemon thread"""
+        logging.info(
+            {"Action": "Mirroring session", "name": self.config.name},
+            extra={"weblog": True},
+        )
+        self._thread = threading.Thread(
+            target=self._run, name=f"mirror-{self.config.name}", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop mirroring, abandoning the file being copied after its current
+        chunk so the job of the session never writes it at the same time"""
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        logging.info(
+            {
+                "Action": "Stopped mirroring session",
+                "name": self.config.name,
+                "Files": self.files_copied,
+                "Bytes": self.bytes_copied,
+            },
+            extra={"weblog": True},
+        )
+
+    def _run(self) -> None:
+        """Scan until stopped"""
+        while not self._stop.is_set():
+            if self.schedule.is_open():
+                self.scan()
+            self._stop.wait(self.settings.poll_s)
+
+    def files(self) -> Iterator[Tuple[str, Path]]:
+        """Every source file with the directory it is staged in"""
+        root = Path(self.config.destination) / self.config.name
+        sources = patterns.expand_modalities(self.config.modalities)
+        for _, file, dest_dir in staged_files(root, sources, self.rsync_layout):
+            yield file, dest_dir
+
+    def scan(self) -> int:
+        """Copy the files that became stable since the last scan
+
+        Returns
+        -------
+        int
+            number of files copied
+        """
+        now = time.monotonic()
+        copied = 0
+        for file, dest_dir in self.files():
+            if self._stop.is_set():
+                break
+            try:
+                stat = os.stat(file)
+            except OSError:
+                continue
+            signature = (stat.st_size, stat.st_mtime_ns)
+            seen = self._seen.get(file)
+            if seen is None or seen[0] != signature:
+                self._seen[file] = (signature, now)
+                if self.settings.stable_s:
+                    continue
+            elif now - seen[1] < self.settings.stable_s:
+                continue
+            if self._copied.get(file) != signature and self._copy(file, dest_dir):
+                self._copied[file] = signature
+                copied += 1
+        return copied
+
+    def _checkpoint(self) -> None:
+        """Abort the copy in progress once the mirror is stopped, and wait
+        while the acquisition disk is busy"""
+        while (
+            self.io_monitor is not None
+            and not self._stop.is_set()
+            and self.io_monitor.is_busy()
+        ):
+            self._stop.wait(self.io_pressure.poll_s)
+        if self._stop.is_set():
+            raise JobCancelled()
+
+    def _copy(self, file: str, dest_dir: Path) -> bool:
+        """Copy one stable file, logging failures so the next scan retries"""
+        try:
+            dest_dir.mkdir(parents=True, exist_ok=True)
+            nbytes = copy_engine.copy_file(
+                file,
+                str(dest_dir),
+                bucket=self.schedule.shared_bucket(),
+                checkpoint=self._checkpoint,
+                skip_identical=True,
+            )
+        except JobCancelled:
+            return False
+        except OSError as e:
+            logging.warning(
+                {
+                    "Error": "Could not mirror file",
+                    "File": file,
+                    "Exception": str(e),
+                    "name": self.config.name,
+                }
+            )
+            return False
+        self.files_copied += 1
+        self.bytes_copied += nbytes
+        return True
@@ -31,6 +31,48 @@ Modality = Annotated[
 ]
 
 
+class PackingConfig(BaseModel):
+    """Pack small files into tar containers instead of copying them one by one"""
+
+    model_config = ConfigDict(extra="forbid")
+    threshold_kb: int = Field(
+        default=1024,
+        description="Files smaller than this are packed",
+        title="Packing threshold (KB)",
+        gt=0,
+    )
+    max_container_mb: int = Field(
+        default=4096,
+        description="Size at which a new container is started",
+        title="Maximum container size (MB)",
+        gt=0,
+    )
+
+
+class CompressionConfig(BaseModel):
+    """Compress a modality's files with zstd while staging them"""
+
+    model_config = ConfigDict(extra="forbid")
+    codec: Literal["zstd"] = Field(default="zstd", description="Codec", title="Codec")
+    level: int = Field(
+        default=3, ge=1, le=22, description="zstd compression level", title="Level"
+    )
+    threads: int = Field(
+        default=0,
+        ge=-1,
+        description="Compression threads per file. 0 compresses on the copy thread,"
+        + " -1 uses every core",
+        title="Threads",
+    )
+    min_ratio: float = Field(
+        default=1.1,
+        gt=0,
+        description="Files whose first megabyte compresses less than this ratio are"
+        + " copied uncompressed",
+        title="Minimum compression ratio",
+    )
+
+
 class ManifestConfig(BaseModel):
     """Job configs for data transfer to VAST"""
 
@@ -80,11 +122,30 @@ class ManifestConfig(BaseModel):
         title="Destination directory",
         examples=[r"\\allen\aind\scratch\test"],
     )
+    extra_destinations: List[str] = Field(
+        default=[],
+        description="Additional directories receiving a copy of the data. Sources are"
+        + " read once and written to every destination; only the primary destination"
+        + " is submitted to aind-data-transfer-service",
+        title="Extra destination directories",
+    )
     modalities: Dict[Modality, List[str]] = Field(
         default={},
         description="list of ModalityFile objects containing modality names and associated files or directories",  # noqa
         title="modality files",
     )
+    packing: Optional[PackingConfig] = Field(
+        default=None,
+        description="Stream small modality files into uncompressed tar containers with"
+        + " an index. Large files are copied as usual",
+        title="Small file packing",
+    )
+    compression: Dict[Modality, CompressionConfig] = Field(
+        default={},
+        description="Compression policy for modalities whose files are staged as"
+        + " <name>.zst. Requires the zstandard package",
+        title="Compression per modality",
+    )
     schemas: List[str] = Field(
         default=[],
         description="Where schema files to be uploaded are saved",
@@ -105,6 +166,11 @@ class ManifestConfig(BaseModel):
             "modalities": list(self.modalities.keys()),
         }
 
+    @property
+    def destinations(self) -> List[str]:
+        """Primary destination followed by the extra destinations"""
+        return [self.destination] + self.extra_destinations
+
     @field_validator("schedule_time", mode="before")
     @classmethod
     def normalized_scheduled_time(cls, value) -> Optional[time]:
@@ -165,6 +231,12 @@ class ManifestConfig(BaseModel):
         """Converts path string to posix"""
         return cls._path_to_posix(value)
 
+    @field_validator("extra_destinations", mode="after")
+    @classmethod
+    def validate_extra_destination_paths(cls, value: List[str]) -> List[str]:
+        """Converts path strings to posix"""
+        return [cls._path_to_posix(path) for path in value]
+
     @field_validator("schemas", mode="after")
     @classmethod
     def validate_schema_paths(cls, value: List[str]) -> List[str]:
@@ -188,3 +260,41 @@ class ManifestConfig(BaseModel):
     @field_serializer("s3_bucket")
     def serialize_enum(self, s3_bucket: BucketType):
         return s3_bucket.value
+
+
+class MirrorConfig(BaseModel):
+    """Source directories of a session still being acquired, staged in the
+    background before its manifest arrives"""
+
+    model_config = ConfigDict(extra="ignore")
+    name: str = Field(
+        ...,
+        description="Name of the session, the name of the manifest that follows",
+        title="Unique name",
+    )
+    destination: str = Field(
+        ...,
+        description="Remote directory on VAST where to copy the data to",
+        title="Destination directory",
+    )
+    modalities: Dict[Modality, List[str]] = Field(
+        default={},
+        description="Directories, files or patterns acquisition writes to for each"
+        + " modality",
+        title="Modality sources",
+    )
+
+    @field_validator("destination", mode="after")
+    @classmethod
+    def validate_destination_path(cls, value: str) -> str:
+        """Converts path string to posix"""
+        return ManifestConfig._path_to_posix(value)
+
+    @field_validator("modalities", mode="after")
+    @classmethod
+    def validate_modality_paths(cls, value: Dict[Any, List[str]]) -> Dict[Any, List[str]]:
+        """Converts modality path strings to posix"""
+        return {
+            modality: [ManifestConfig._path_to_posix(path) for path in paths]
+            for modality, paths in value.items()
+        }
@@ -1,8 +1,270 @@
 """ Configuration for watchdog service"""
 
-from typing import Optional, Union
+from datetime import datetime, time
+from typing import List, Literal, Optional, Union
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
+
+MAX_COPY_WORKERS = 16
+
+
+class TransferWindow(BaseModel):
+    """Time of day during which staging copies are allowed to run"""
+
+    start: time = Field(..., description="Local time the window opens", title="Start")
+    end: time = Field(
+        ...,
+        description="Local time the window closes. If end is earlier than start the"
+        + " window wraps past midnight",
+        title="End",
+    )
+    max_bandwidth_mbps: Optional[float] = Field(
+        default=None,
+        gt=0,
+        description="Copy bandwidth cap in megabytes per second while the window is"
+        + " open. If None, copies run at full speed",
+        title="Bandwidth cap",
+    )
+
+    @field_validator("start", "end", mode="before")
+    @classmethod
+    def normalize_window_time(cls, value) -> time:
+        """Normalize window edges"""
+        if isinstance(value, datetime):
+            return value.time()
+        elif isinstance(value, str):
+            return datetime.strptime(value, "%H:%M:%S").time()
+        return value
+
+    def contains(self, moment: time) -> bool:
+        """Check if a time of day falls inside the window
+
+        Parameters
+        ----------
+        moment : time
+            time of day to check
+
+        Returns
+        -------
+        bool
+            True if the window is open at moment
+        """
+        if self.start <= self.end:
+            return self.start <= moment < self.end
+        return moment >= self.start or moment < self.end
+
+
+class IOPressureConfig(BaseModel):
+    """Pause staging copies while the acquisition disk is busy writing"""
+
+    path: str = Field(
+        ...,
+        description="Any path on the acquisition disk to monitor",
+        title="Monitored path",
+        examples=["D:/"],
+    )
+    threshold_pct: float = Field(
+        default=50.0,
+        gt=0,
+        le=100,
+        description="Write utilization of the disk above which copies pause",
+        title="Utilization threshold",
+    )
+    sample_s: float = Field(
+        default=1.0,
+        gt=0,
+        description="Minimum interval between two utilization samples",
+        title="Sample interval",
+    )
+    poll_s: float = Field(
+        default=5.0,
+        gt=0,
+        description="Seconds between checks while copies are paused",
+        title="Poll interval",
+    )
+
+
+class SourceReadinessConfig(BaseModel):
+    """Wait for acquisition files to stop changing before copying them"""
+
+    stable_s: float = Field(
+        default=30.0,
+        gt=0,
+        description="Seconds the size and modification time of every source file must"
+        + " stay unchanged",
+        title="Stable window",
+    )
+    poll_s: float = Field(
+        default=5.0,
+        gt=0,
+        description="Seconds between two scans of the sources",
+        title="Poll interval",
+    )
+    timeout_s: Optional[float] = Field(
+        default=3600.0,
+        gt=0,
+        description="Fail the job if sources are still changing after this long. If"
+        + " None, wait indefinitely",
+        title="Timeout",
+    )
+
+
+class MirrorSettings(BaseModel):
+    """Stage the files of sessions still being acquired as they become stable"""
+
+    poll_s: float = Field(
+        default=30.0,
+        gt=0,
+        description="Seconds between two scans of a mirrored session",
+        title="Poll interval",
+    )
+    stable_s: float = Field(
+        default=60.0,
+        ge=0,
+        description="Seconds a file must keep the same size and modification time"
+        + " before it is mirrored",
+        title="Stable window",
+    )
+
+
+class HealthConfig(BaseModel):
+    """Hold jobs while a destination or the transfer service is down and replay
+    them once it recovers"""
+
+    probe_interval_s: float = Field(
+        default=30.0,
+        gt=0,
+        description="Seconds between two probes of a target that is down",
+        title="Probe interval",
+    )
+    probe_timeout_s: float = Field(
+        default=10.0,
+        gt=0,
+        description="Seconds a destination or the transfer service has to answer a"
+        + " probe",
+        title="Probe timeout",
+    )
+    replay_interval_s: float = Field(
+        default=30.0,
+        ge=0,
+        description="Seconds between two held jobs released once their target"
+        + " recovers",
+        title="Replay interval",
+    )
+    max_replays: int = Field(
+        default=5,
+        ge=0,
+        description="Times a job is held and replayed before it fails",
+        title="Replays per job",
+    )
+
+
+class TransferTrackingConfig(BaseModel):
+    """Follow jobs submitted to aind-data-transfer-service until they finish"""
+
+    status_path: str = Field(
+        default="/api/v1/get_job_status_list",
+        description="Path of the job status endpoint on the transfer service host",
+        title="Status endpoint path",
+    )
+    min_interval_s: float = Field(
+        default=60.0,
+        gt=0,
+        description="Seconds between two polls after a job changed state",
+        title="Minimum poll interval",
+    )
+    max_interval_s: float = Field(
+        default=900.0,
+        gt=0,
+        description="Polls back off up to this interval while no job changes state",
+        title="Maximum poll interval",
+    )
+    batch_size: int = Field(
+        default=50,
+        ge=1,
+        description="Jobs whose status is asked for in one request",
+        title="Batch size",
+    )
+    timeout_s: float = Field(
+        default=10.0,
+        gt=0,
+        description="Timeout of one status request",
+        title="Request timeout",
+    )
+    max_age_h: float = Field(
+        default=72.0,
+        gt=0,
+        description="Stop following a job that has not finished after this many hours",
+        title="Tracking limit (hours)",
+    )
+
+
+class RobocopyProfile(BaseModel):
+    """Options of the robocopy runs of the system copy backend on Windows"""
+
+    threads: Optional[int] = Field(
+        default=None,
+        ge=1,
+        le=128,
+        description="Copy with this many robocopy threads (/MT:n). If None, robocopy"
+        + " copies one file at a time",
+        title="Threads",
+    )
+    restartable: Optional[bool] = Field(
+        default=None,
+        description="Copy in restartable mode (/Z), so an interrupted large file"
+        + " resumes where it stopped. If None, only directories are copied in"
+        + " restartable mode",
+        title="Restartable mode",
+    )
+    unbuffered: bool = Field(
+        default=True,
+        description="Copy with unbuffered I/O (/J), faster for large files and"
+        + " keeping acquisition data in the page cache",
+        title="Unbuffered I/O",
+    )
+    retries: int = Field(
+        default=5,
+        ge=0,
+        description="Retries of a failed file (/R:n)",
+        title="Retries",
+    )
+    wait_s: Optional[int] = Field(
+        default=None,
+        ge=0,
+        description="Seconds between two retries (/W:n). If None, robocopy's default",
+        title="Wait between retries",
+    )
+
+    def options(self, directory: bool = False, report: bool = False) -> List[str]:
+        """robocopy options of the profile
+
+        Parameters
+        ----------
+        directory : bool
+            options of a directory copy
+        report : bool
+            add /NP and /BYTES so the output of a run copying several files
+            can be parsed file by file
+
+        Returns
+        -------
+        List[str]
+            options
+        """
+        options = []
+        if self.threads:
+            options.append(f"/mt:{self.threads}")
+        if self.restartable or (self.restartable is None and directory):
+            options.append("/z")
+        if self.unbuffered:
+            options.append("/j")
+        options.append(f"/r:{self.retries}")
+        if self.wait_s is not None:
+            options.append(f"/w:{self.wait_s}")
+        if report:
+            options += ["/np", "/bytes"]
+        return options
 
 
 class WatchConfig(BaseModel, extra="ignore"):
@@ -22,3 +284,178 @@ class WatchConfig(BaseModel, extra="ignore"):
         + " If None, allow the job to run no matter how late it is",
         title="Scheduler grace time",
     )
+    copy_backend: Literal["system", "python"] = Field(
+        default="system",
+        description="Copy files with rsync/robocopy ('system') or with the in-process"
+        + " chunked copier ('python'). Only the python backend can throttle and pause"
+        + " in the middle of a file",
+        title="Copy backend",
+    )
+    group_copies: bool = Field(
+        default=False,
+        description="With the system backend, copy the files of a source directory"
+        + " going to the same destination with one rsync --files-from or robocopy run"
+        + " per copy worker instead of one run per file",
+        title="Group copies",
+    )
+    same_device_staging: Literal["copy", "reflink", "hardlink"] = Field(
+        default="copy",
+        description="When a destination is on the same device as a source, stage"
+        + " files as copy-on-write reflinks ('reflink'), as reflinks or else hard"
+        + " links ('hardlink'), or always copy them ('copy'). Files that cannot be"
+        + " linked are copied. Hard links share the source file, so later changes"
+        + " to one show in the other",
+        title="Same device staging",
+    )
+    robocopy: RobocopyProfile = Field(
+        default=RobocopyProfile(),
+        description="Threads, restartable or unbuffered mode and retries of robocopy",
+        title="Robocopy profile",
+    )
+    copy_workers: int = Field(
+        default=1,
+        ge=1,
+        le=MAX_COPY_WORKERS,
+        description="Number of files a job copies at the same time. Can be changed"
+        + " while a job runs",
+        title="Copy workers",
+    )
+    runner: Literal["thread", "asyncio"] = Field(
+        default="thread",
+        description="Run jobs on BackgroundScheduler threads ('thread') or as"
+        + " coroutines on an asyncio event loop ('asyncio'), where jobs waiting on"
+        + " copy tools or a free job slot hold no thread",
+        title="Job runner",
+    )
+    max_concurrent_jobs: int = Field(
+        default=10,
+        ge=1,
+        description="Number of jobs the asyncio runner runs at the same time",
+        title="Concurrent jobs",
+    )
+    batch_scheduled_jobs: bool = Field(
+        default=False,
+        description="Run jobs that share a trigger time as one batch: their files are"
+        + " copied through one pool of copy_workers, interleaving large and small"
+        + " files, and the batch is submitted to aind-data-transfer-service in one"
+        + " request",
+        title="Batch scheduled jobs",
+    )
+    copy_memory_mb: int = Field(
+        default=256,
+        ge=1,
+        description="Memory shared by every in-process copy for read buffers. Copies"
+        + " wait for a free buffer once it is used up",
+        title="Copy memory ceiling (MB)",
+    )
+    direct_io: bool = Field(
+        default=False,
+        description="Read sources with O_DIRECT in the in-process copier so staging"
+        + " does not evict acquisition data from the page cache, like robocopy /j."
+        + " Falls back to dropping pages after reading where O_DIRECT is unsupported",
+        title="Unbuffered reads",
+    )
+    cpu_workers: int = Field(
+        default=0,
+        ge=0,
+        description="Worker processes running CPU-heavy staging stages (compression"
+        + " and packing) outside the service process. 0 runs them on the copy"
+        + " threads",
+        title="CPU worker processes",
+    )
+    cpu_worker_max_tasks: int = Field(
+        default=100,
+        ge=1,
+        description="Tasks a CPU worker process runs before it is replaced",
+        title="Tasks per CPU worker",
+    )
+    audit_copies: bool = Field(
+        default=False,
+        description="After copying, compare the size and modification time of every"
+        + " staged file with its source and copy missing or different files again,"
+        + " instead of trusting robocopy and rsync exit codes",
+        title="Post-copy audit",
+    )
+    history_db: Optional[str] = Field(
+        default=None,
+        description="SQLite file every finished job is recorded in, for the stats"
+        + " command. If None, job_history.sqlite in the manifest complete directory",
+        title="Job history database",
+    )
+    duplicate_manifests: Literal["warn", "skip"] = Field(
+        default="warn",
+        description="What to do with a manifest whose name was already archived in"
+        + " the manifest complete directory: log a warning and schedule it ('warn')"
+        + " or log a warning and leave it unscheduled ('skip')",
+        title="Duplicate manifests",
+    )
+    archive_compact_months: Optional[int] = Field(
+        default=12,
+        ge=1,
+        description="Archived manifests are kept in monthly directories; months older"
+        + " than this are compacted into one zip file each. If None, months are never"
+        + " compacted",
+        title="Archive compaction (months)",
+    )
+    transfer_windows: List[TransferWindow] = Field(
+        default=[],
+        description="Times of day when staging copies may run. Jobs wait for the next"
+        + " open window and in-flight copies pause when a window closes. If empty,"
+        + " copies may run at any time",
+        title="Transfer windows",
+    )
+    io_pressure: Optional[IOPressureConfig] = Field(
+        default=None,
+        description="Back off staging copies while the acquisition disk is under heavy"
+        + " write load. If None, copies ignore local disk load",
+        title="I/O pressure backoff",
+    )
+    source_readiness: Optional[SourceReadinessConfig] = Field(
+        default=None,
+        description="Before copying, wait until every source file has kept the same"
+        + " size and modification time for a while. If None, copy immediately",
+        title="Source readiness",
+    )
+    startup_workers: int = Field(
+        default=4,
+        ge=1,
+        description="Threads loading and scheduling the manifests found in the"
+        + " manifest directory at startup, while new manifests are already handled",
+        title="Startup ingestion workers",
+    )
+    startup_order: Literal["oldest", "smallest"] = Field(
+        default="oldest",
+        description="Order manifests found at startup are scheduled in: oldest"
+        + " modification time first or smallest file first",
+        title="Startup ingestion order",
+    )
+    mirror: Optional[MirrorSettings] = Field(
+        default=None,
+        description="Watch *mirror* files in the poll directory listing the source"
+        + " directories of a session being acquired, and copy their files to the"
+        + " destination as they stop changing. When the manifest arrives only the"
+        + " remaining files are copied. If None, mirror files are ignored",
+        title="Live mirror",
+    )
+    health: Optional[HealthConfig] = Field(
+        default=None,
+        description="When a copy or the transfer service request fails and a probe"
+        + " finds the destination or endpoint down, hold the job until it recovers"
+        + " and replay it. If None, failed jobs fail immediately",
+        title="Health probes",
+    )
+    transfer_tracking: Optional[TransferTrackingConfig] = Field(
+        default=None,
+        description="Poll aind-data-transfer-service for the state of submitted jobs"
+        + " and record whether their upload and processing succeeded. If None, a"
+        + " job ends when the service accepts it",
+        title="Transfer tracking",
+    )
+    status_api_port: Optional[int] = Field(
+        default=None,
+        ge=0,
+        le=65535,
+        description="Serve the job queue status and control API on this localhost"
+        + " port. If None, the API is disabled",
+        title="Status API port",
+    )
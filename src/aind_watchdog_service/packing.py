@@ -0,0 +1,296 @@
+"""Pack small files into uncompressed tar containers before staging"""
+
+import json
+import os
+import tarfile
+from functools import partial
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from aind_watchdog_service.copy_engine import CHUNK_SIZE, TeeWriter, list_files
+from aind_watchdog_service.throttle import TokenBucket
+
+INDEX_NAME = "{modality}_pack_index.json"
+PACK_NAME = "{modality}_pack_{number:03d}.tar"
+
+# Containers are written in segments of about this size, the unit of work of
+# a CPU worker task
+SEGMENT_BYTES = 256 * 1024 * 1024
+
+
+def plan_packing(
+    sources: List[str], threshold_bytes: int
+) -> Tuple[List[Tuple[str, str]], List[Tuple[str, str]]]:
+    """Split the sources of a modality into files to pack and files to copy
+
+    Directories are walked so their small files can be packed. Their
+    contents keep robocopy /e semantics: paths are relative to the listed
+    directory.
+
+    Parameters
+    ----------
+    sources : List[str]
+        files and directories listed for the modality
+    threshold_bytes : int
+        files strictly smaller than this are packed
+
+    Returns
+    -------
+    Tuple[List[Tuple[str, str]], List[Tuple[str, str]]]
+        small files with their name inside the pack, and large files with
+        the subdirectory of the destination they are copied to
+    """
+    small: List[Tuple[str, str]] = []
+    large: List[Tuple[str, str]] = []
+    for path, relative in list_files(sources):
+        if os.path.getsize(path) < threshold_bytes:
+            small.append((path, relative))
+        else:
+            large.append((path, Path(relative).parent.as_posix()))
+    return small, large
+
+
+def _padded(size: int) -> int:
+    """Size of a member's data rounded up to whole tar blocks"""
+    return -(-size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+
+
+def _split(files: List[Tuple[str, str]], max_bytes: int) -> List[List[Tuple[str, str]]]:
+    """Group files in order, starting a new group once one holds max_bytes of
+    tar members"""
+    groups: List[List[Tuple[str, str]]] = []
+    group: List[Tuple[str, str]] = []
+    group_bytes = 0
+    for path, name in files:
+        group.append((path, name))
+        group_bytes += _padded(os.path.getsize(path)) + tarfile.BLOCKSIZE
+        if group_bytes >= max_bytes:
+            groups.append(group)
+            group, group_bytes = [], 0
+    if group:
+        groups.append(group)
+    return groups
+
+
+def _header(path: str, name: str) -> Tuple[bytes, int, int]:
+    """PAX header of a file packed under name, with its size and mtime"""
+    stat = os.stat(path)
+    tarinfo = tarfile.TarInfo(name)
+    tarinfo.size = stat.st_size
+    tarinfo.mtime = int(stat.st_mtime)
+    tarinfo.mode = stat.st_mode & 0o7777
+    header = tarinfo.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape")
+    return header, tarinfo.size, tarinfo.mtime
+
+
+def _write_data(
+    path: str,
+    size: int,
+    writer: TeeWriter,
+    bucket: Optional[TokenBucket],
+    checkpoint: Optional[Callable[[], None]],
+    progress: Optional[Callable[[int], None]],
+) -> None:
+    """Write the data of a member, exactly the size its header announced"""
+    remaining = size
+    with open(path, "rb") as f:
+        while remaining:
+            if checkpoint is not None:
+                checkpoint()
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                raise OSError(f"{path} shrank while it was packed")
+            if bucket is not None:
+                bucket.consume(len(chunk))
+            writer.write(chunk)
+            if progress is not None:
+                progress(len(chunk))
+            remaining -= len(chunk)
+    writer.write(tarfile.NUL * (_padded(size) - size))
+
+
+def write_members(
+    segment: List[Tuple[str, str]],
+    partials: Dict[str, Path],
+    offset: int,
+    bucket: Optional[TokenBucket] = None,
+    checkpoint: Optional[Callable[[], None]] = None,
+    progress: Optional[Callable[[int], None]] = None,
+) -> Tuple[List[dict], int, Dict[str, Optional[OSError]]]:
+    """Write a segment of a container: the tar members of some of its files
+
+    Also runs as a CPU worker task, so the job can pause, cancel and charge
+    its bandwidth between the segments of a container.
+
+    Parameters
+    ----------
+    segment : List[Tuple[str, str]]
+        source files and their names inside the pack
+    partials : Dict[str, Path]
+        partial container of each destination directory still written
+    offset : int
+        size of the container before this segment, 0 starts the container
+    bucket : Optional[TokenBucket]
+        token bucket throttling the copy
+    checkpoint : Optional[Callable[[], None]]
+        called between chunks, may block to pause the copy
+    progress : Optional[Callable[[int], None]]
+        called with the size of every chunk read
+
+    Returns
+    -------
+    Tuple[List[dict], int, Dict[str, Optional[OSError]]]
+        index entries of the members, bytes written and the error of each
+        destination
+    """
+    writer = TeeWriter(partials, append=offset > 0)
+    members = []
+    try:
+        for path, name in segment:
+            if not writer:
+                break
+            header, size, mtime = _header(path, name)
+            writer.write(header)
+            members.append(
+                {
+                    "name": name,
+                    "offset": offset + writer.tell(),
+                    "size": size,
+                    "mtime": mtime,
+                }
+            )
+            _write_data(path, size, writer, bucket, checkpoint, progress)
+    finally:
+        writer.close()
+    return members, writer.tell(), writer.errors
+
+
+SegmentWriter = Callable[
+    [List[Tuple[str, str]], Dict[str, Path], int],
+    Tuple[List[dict], int, Dict[str, Optional[OSError]]],
+]
+
+
+def write_packs(
+    small: List[Tuple[str, str]],
+    dest_dirs: List[str],
+    modality: str,
+    max_pack_bytes: int,
+    bucket: Optional[TokenBucket] = None,
+    checkpoint: Optional[Callable[[], None]] = None,
+    progress: Optional[Callable[[int], None]] = None,
+    segment_writer: Optional[SegmentWriter] = None,
+    segment_bytes: int = SEGMENT_BYTES,
+) -> Tuple[dict, Dict[str, Optional[OSError]]]:
+    """Stream small files into uncompressed tar containers and write an index
+
+    Every container is written as one sequential stream to each destination
+    and renamed into place once complete. The index maps each packed file to
+    its container and the byte offset of its data, so single files can be
+    read back without unpacking.
+
+    Parameters
+    ----------
+    small : List[Tuple[str, str]]
+        source files and their names inside the pack
+    dest_dirs : List[str]
+        modality directories receiving the containers, primary first
+    modality : str
+        modality abbreviation used to name containers
+    max_pack_bytes : int
+        start a new container once this size is reached
+    bucket : Optional[TokenBucket]
+        token bucket throttling the copy
+    checkpoint : Optional[Callable[[], None]]
+        called between chunks, may block to pause the copy
+    progress : Optional[Callable[[int], None]]
+        called with the size of every chunk read
+    segment_writer : Optional[SegmentWriter]
+        writes each segment instead of write_members with the copy arguments
+        above, e.g. in a CPU worker process
+    segment_bytes : int
+        size of the segments containers are written in
+
+    Returns
+    -------
+    Tuple[dict, Dict[str, Optional[OSError]]]
+        the index and the error of each destination, None if it succeeded
+    """
+    if segment_writer is None:
+        segment_writer = partial(
+            write_members, bucket=bucket, checkpoint=checkpoint, progress=progress
+        )
+    index = {"modality": modality, "format": "tar", "packs": [], "members": []}
+    errors: Dict[str, Optional[OSError]] = {dest_dir: None for dest_dir in dest_dirs}
+    for number, batch in enumerate(
+        _split(sorted(small, key=lambda e: e[1]), max_pack_bytes)
+    ):
+        pack_name = PACK_NAME.format(modality=modality, number=number)
+        _write_pack(
+            batch, dest_dirs, pack_name, index, errors, segment_writer, segment_bytes
+        )
+    for dest_dir in dest_dirs:
+        if errors[dest_dir] is not None:
+            continue
+        try:
+            with open(Path(dest_dir) / INDEX_NAME.format(modality=modality), "w") as f:
+                json.dump(index, f, indent=2)
+        except OSError as e:
+            errors[dest_dir] = e
+    return index, errors
+
+
+def _write_pack(
+    batch: List[Tuple[str, str]],
+    dest_dirs: List[str],
+    pack_name: str,
+    index: dict,
+    errors: Dict[str, Optional[OSError]],
+    segment_writer: SegmentWriter,
+    segment_bytes: int,
+) -> None:
+    """Write one container segment by segment to every destination that has
+    not failed yet, then end the archive and rename it into place"""
+    partials = {
+        dest_dir: Path(dest_dir) / (pack_name + ".partial")
+        for dest_dir in dest_dirs
+        if errors[dest_dir] is None
+    }
+    offset = 0
+    members = []
+    for segment in _split(batch, segment_bytes):
+        segment_members, written, segment_errors = segment_writer(
+            segment, partials, offset
+        )
+        offset += written
+        members.extend(member | {"pack": pack_name} for member in segment_members)
+        _drop_failed(partials, segment_errors, errors)
+    # End of archive: two zero blocks, padded to a whole record like tarfile
+    end = tarfile.NUL * (
+        2 * tarfile.BLOCKSIZE + -(offset + 2 * tarfile.BLOCKSIZE) % tarfile.RECORDSIZE
+    )
+    writer = TeeWriter(partials, append=True)
+    writer.write(end)
+    writer.close()
+    _drop_failed(partials, writer.errors, errors)
+    for dest_dir, path in partials.items():
+        try:
+            os.replace(path, Path(dest_dir) / pack_name)
+        except OSError as e:
+            errors[dest_dir] = e
+    index["packs"].append(
+        {"name": pack_name, "files": len(batch), "bytes": offset + len(end)}
+    )
+    index["members"].extend(members)
+
+
+def _drop_failed(
+    partials: Dict[str, Path],
+    new_errors: Dict[str, Optional[OSError]],
+    errors: Dict[str, Optional[OSError]],
+) -> None:
+    """Stop writing to destinations that failed and record their errors"""
+    for dest_dir, error in new_errors.items():
+        if error is not None:
+            errors[dest_dir] = error
+            partials.pop(dest_dir, None)
@@ -0,0 +1,119 @@
+"""Expand glob patterns of manifest modality entries at copy time"""
+
+import fnmatch
+import os
+import posixpath
+import re
+from typing import Dict, Iterator, List
+
+MAGIC = re.compile(r"[*?[]")
+
+
+def has_magic(path: str) -> bool:
+    """True if a path or path component contains a wildcard"""
+    return MAGIC.search(path) is not None
+
+
+def is_pattern(entry: str) -> bool:
+    """True if a modality entry is a pattern rather than a path. An existing
+    path is literal even if its name has brackets, like run[1].tiff"""
+    return has_magic(entry) and not os.path.exists(entry)
+
+
+def _entries(directory: str) -> List[os.DirEntry]:
+    """Entries of a directory, hidden ones excluded like glob does, empty if
+    it cannot be read"""
+    try:
+        with os.scandir(directory) as entries:
+            return [entry for entry in entries if not entry.name.startswith(".")]
+    except OSError:
+        return []
+
+
+def _all_files(directory: str) -> Iterator[str]:
+    """Every file under a directory"""
+    for entry in _entries(directory):
+        if entry.is_dir(follow_symlinks=False):
+            yield from _all_files(entry.path)
+        else:
+            yield entry.path
+
+
+def _match_recursive(directory: str, parts: List[str]) -> Iterator[str]:
+    """Paths matching a pattern starting with **, at any depth"""
+    if len(parts) == 1:
+        yield from _all_files(directory)
+        return
+    yield from _match(directory, parts[1:])
+    for entry in _entries(directory):
+        if entry.is_dir(follow_symlinks=False):
+            yield from _match_recursive(entry.path, parts)
+
+
+def _match(directory: str, parts: List[str]) -> Iterator[str]:
+    """Paths under directory matching the remaining pattern parts"""
+    part, rest = parts[0], parts[1:]
+    if part == "**":
+        yield from _match_recursive(directory, parts)
+    elif has_magic(part):
+        for entry in _entries(directory):
+            if entry.name != part and not fnmatch.fnmatch(entry.name, part):
+                continue
+            if not rest:
+                yield entry.path
+            elif entry.is_dir():
+                yield from _match(entry.path, rest)
+    elif not rest:
+        path = posixpath.join(directory, part)
+        if os.path.exists(path):
+            yield path
+    else:
+        yield from _match(posixpath.join(directory, part), rest)
+
+
+def expand(pattern: str) -> List[str]:
+    """Files and directories matching a pattern, found with os.scandir
+
+    `*`, `?` and `[...]` match within one path component and `**` matches
+    any number of directories. Only the directories along the pattern are
+    scanned, and matches are sorted. A component naming an existing file or
+    directory matches it literally too.
+
+    Parameters
+    ----------
+    pattern : str
+        posix path pattern, e.g. D:/data/1374103167/**/*.tiff
+
+    Returns
+    -------
+    List[str]
+        matching paths, the pattern itself if it is not a pattern
+    """
+    if not is_pattern(pattern):
+        return [pattern]
+    parts = pattern.split("/")
+    index = next(i for i, part in enumerate(parts) if has_magic(part))
+    base = "/".join(parts[:index]) or ("/" if pattern.startswith("/") else ".")
+    if index == 1 and parts[0].endswith(":"):
+        # Drive root, D:/*.tiff
+        base += "/"
+    return sorted(set(_match(base, parts[index:])))
+
+
+def expand_modalities(modalities: Dict[str, List[str]]) -> Dict[str, List[str]]:
+    """Modality entries with their patterns replaced by the matching paths
+
+    Parameters
+    ----------
+    modalities : Dict[str, List[str]]
+        manifest modality entries
+
+    Returns
+    -------
+    Dict[str, List[str]]
+        paths per modality, in manifest order
+    """
+    return {
+        modality: [path for entry in entries for path in expand(entry)]
+        for modality, entries in modalities.items()
+    }
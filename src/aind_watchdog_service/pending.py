@@ -0,0 +1,146 @@
+"""Compact record of a scheduled job whose manifest is loaded when it fires"""
+
+import datetime
+import os
+from typing import Optional
+
+from aind_watchdog_service.models.manifest_config import ManifestConfig
+
+
+def estimate_bytes(config: ManifestConfig) -> int:
+    """Size of the files listed in a manifest, without walking directories
+
+    Parameters
+    ----------
+    config : ManifestConfig
+        manifest of the job
+
+    Returns
+    -------
+    int
+        bytes of the listed files that exist; directories count as 0
+    """
+    total = 0
+    for sources in config.modalities.values():
+        for source in sources:
+            try:
+                stat = os.stat(source)
+            except OSError:
+                continue
+            if not os.path.isdir(source):
+                total += stat.st_size
+    return total
+
+
+class PendingJob:
+    """Scheduled job that has not fired yet
+
+    Only what identifies the manifest and the schedule is kept, so thousands
+    of deferred manifests cost little memory; the manifest is parsed and
+    validated again when the job fires.
+    """
+
+    __slots__ = (
+        "src_path",
+        "name",
+        "mtime_ns",
+        "size",
+        "trigger",
+        "estimated_bytes",
+        "job_id",
+        "settings",
+    )
+
+    def __init__(
+        self,
+        src_path: str,
+        name: str,
+        mtime_ns: int,
+        size: int,
+        trigger: datetime.datetime,
+        estimated_bytes: int,
+    ):
+        """Construct PendingJob
+
+        Parameters
+        ----------
+        src_path : str
+            manifest file path
+        name : str
+            dataset name, for logs and the status API
+        mtime_ns : int
+            modification time of the manifest when it was scheduled
+        size : int
+            size of the manifest when it was scheduled
+        trigger : datetime.datetime
+            time the job fires
+        estimated_bytes : int
+            size of the listed source files
+        """
+        self.src_path = src_path
+        self.name = name
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.trigger = trigger
+        self.estimated_bytes = estimated_bytes
+        self.job_id: Optional[str] = None
+        # Bandwidth and concurrency set through the status API before firing
+        self.settings: Optional[dict] = None
+
+    @classmethod
+    def from_manifest(
+        cls, src_path: str, config: ManifestConfig, trigger: datetime.datetime
+    ) -> "PendingJob":
+        """Record a manifest scheduled for a later time
+
+        Parameters
+        ----------
+        src_path : str
+            manifest file path
+        config : ManifestConfig
+            validated manifest
+        trigger : datetime.datetime
+            time the job fires
+
+        Returns
+        -------
+        PendingJob
+            the record
+        """
+        try:
+            stat = os.stat(src_path)
+            mtime_ns, size = stat.st_mtime_ns, stat.st_size
+        except OSError:
+            mtime_ns, size = 0, 0
+        return cls(src_path, config.name, mtime_ns, size, trigger, estimate_bytes(config))
+
+    def changed(self) -> bool:
+        """True if the manifest file was modified since it was scheduled"""
+        try:
+            stat = os.stat(self.src_path)
+        except OSError:
+            return True
+        return (stat.st_mtime_ns, stat.st_size) != (self.mtime_ns, self.size)
+
+    def status(self) -> dict:
+        """Status API description of the job
+
+        Returns
+        -------
+        dict
+            identifiers, schedule and estimated size
+        """
+        settings = self.settings or {}
+        return {
+            "id": self.job_id,
+            "manifest": self.src_path,
+            "name": self.name,
+            "state": "pending",
+            "next_run_time": self.trigger.isoformat(),
+            "waiting_for": [],
+            "remote_job_id": None,
+            "remote_state": None,
+            "concurrency": settings.get("concurrency"),
+            "bandwidth_mbps": settings.get("bandwidth_mbps"),
+            "estimated_bytes": self.estimated_bytes,
+        }
@@ -0,0 +1,134 @@
+"""Wait for acquisition files to stop changing before staging them"""
+
+import os
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+Signature = Dict[str, Optional[Tuple[int, int]]]
+
+
+def _scan_directory(path: str, signature: Signature) -> None:
+    """Record size and mtime of every file under a directory, one scandir
+    pass per directory"""
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                _scan_directory(entry.path, signature)
+            else:
+                stat = entry.stat()
+                signature[entry.path] = (stat.st_size, stat.st_mtime_ns)
+
+
+def source_signature(sources: List[str]) -> Signature:
+    """Size and modification time of every file listed or under a listed
+    directory
+
+    Parameters
+    ----------
+    sources : List[str]
+        files and directories
+
+    Returns
+    -------
+    Signature
+        (size, mtime_ns) per file, None for sources that do not exist yet
+    """
+    signature: Signature = {}
+    for source in sources:
+        try:
+            if os.path.isdir(source):
+                _scan_directory(source, signature)
+            else:
+                stat = os.stat(source)
+                signature[source] = (stat.st_size, stat.st_mtime_ns)
+        except FileNotFoundError:
+            signature[source] = None
+    return signature
+
+
+class SourceWatcher:
+    """Decide when a set of sources has been stable for a window
+
+    Sources are stable once every file exists and no size or mtime changed
+    between scans for stable_s seconds. Files whose newest mtime is already
+    older than the window are ready on the first scan, so finished sessions
+    start copying without waiting.
+    """
+
+    def __init__(
+        self,
+        sources: List[str],
+        stable_s: float,
+        timeout_s: Optional[float] = None,
+    ):
+        """Construct SourceWatcher
+
+        Parameters
+        ----------
+        sources : List[str]
+            files and directories to watch
+        stable_s : float
+            seconds the sources must stay unchanged
+        timeout_s : Optional[float]
+            give up after this long, None waits indefinitely
+        """
+        self.sources = sources
+        self.stable_s = stable_s
+        self.timeout_s = timeout_s
+        self.started = time.monotonic()
+        self._signature: Optional[Signature] = None
+        self._stable_since = self.started
+
+    @property
+    def waited(self) -> float:
+        """Seconds since the watcher started"""
+        return time.monotonic() - self.started
+
+    def poll(self) -> Optional[bool]:
+        """Scan the sources once
+
+        Returns
+        -------
+        Optional[bool]
+            True once stable, False after the timeout, None to keep waiting
+        """
+        now = time.monotonic()
+        signature = source_signature(self.sources)
+        complete = None not in signature.values()
+        if self._signature is None and complete:
+            newest = max((mtime for _, mtime in signature.values()), default=0)
+            if time.time() - newest / 1e9 >= self.stable_s:
+                return True
+        if signature != self._signature or not complete:
+            self._signature = signature
+            self._stable_since = now
+        elif now - self._stable_since >= self.stable_s:
+            return True
+        if self.timeout_s is not None and now - self.started >= self.timeout_s:
+            return False
+        return None
+
+    def wait(
+        self, poll_s: float, checkpoint: Optional[Callable[[], None]] = None
+    ) -> bool:
+        """Block until the sources are stable or the timeout expires
+
+        Parameters
+        ----------
+        poll_s : float
+            seconds between scans
+        checkpoint : Optional[Callable[[], None]]
+            called between scans, may raise to abandon the wait
+
+        Returns
+        -------
+        bool
+            True if the sources are stable
+        """
+        while True:
+            ready = self.poll()
+            if ready is not None:
+                return ready
+            if checkpoint is not None:
+                checkpoint()
+            time.sleep(poll_s)
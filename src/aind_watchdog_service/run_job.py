@@ -1,12 +1,19 @@
 """ Module to run jobs on file modification"""
 
+import asyncio
 import json
 import logging
 import os
 import platform
+import socket
+import sqlite3
 import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from pathlib import Path, PurePosixPath
-from typing import Optional
+from functools import partial
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional, Set, Tuple
 import time
 
 import requests
@@ -16,9 +23,39 @@ from aind_data_transfer_models.core import (
     SubmitJobRequest,
 )
 
+from aind_watchdog_service import archive as manifest_archive
+from aind_watchdog_service import (
+    audit,
+    buffer_pool,
+    compression,
+    copy_engine,
+    copy_tools,
+    health,
+    cpu_pool,
+    history,
+    mirror,
+    packing,
+    patterns,
+    readiness,
+    tracker,
+)
 from aind_watchdog_service.alert_bot import AlertBot
-from aind_watchdog_service.models.manifest_config import ManifestConfig
+from aind_watchdog_service.io_pressure import DiskPressureMonitor
+from aind_watchdog_service.job_control import (
+    MAX_COPY_WORKERS,
+    JobCancelled,
+    JobControl,
+    JobProgress,
+)
+from aind_watchdog_service.models.manifest_config import (
+    CompressionConfig,
+    ManifestConfig,
+)
 from aind_watchdog_service.models.watch_config import WatchConfig
+from aind_watchdog_service.throttle import TokenBucket, TransferSchedule
+
+# Interval at which coroutines retry for a free copy slot
+SLOT_POLL_S = 0.1
 
 if platform.system() == "Windows":
     PLATFORM = "windows"
@@ -26,6 +63,28 @@ else:
     PLATFORM = "linux"
 
 
+def submit_upload_jobs(
+    endpoint: str, upload_jobs: List[BasicUploadJobConfigs]
+) -> requests.Response:
+    """Submit upload jobs to aind-data-transfer-service in one request
+
+    Parameters
+    ----------
+    endpoint : str
+        submit_jobs URL of the transfer service
+    upload_jobs : List[BasicUploadJobConfigs]
+        upload jobs to submit together
+
+    Returns
+    -------
+    requests.Response
+        response of the transfer service
+    """
+    submit_request = SubmitJobRequest(upload_jobs=upload_jobs)
+    post_request_content = json.loads(submit_request.model_dump_json(round_trip=True))
+    return requests.post(url=endpoint, json=post_request_content, timeout=5)
+
+
 class RunJob:
     """Run job class to stage files on VAST or run a custom script
     and trigger aind-data-transfer-service
@@ -41,6 +100,195 @@ class RunJob:
         self.src_path = src_path
         self.config = config
         self.watch_config = watch_config
+        self.schedule = TransferSchedule(watch_config.transfer_windows)
+        # The job's own cap, charging the process-wide bucket of the open window
+        self.bucket = TokenBucket()
+        self.bucket.parent = self.schedule.shared_bucket()
+        self.buffers = buffer_pool.shared_pool(
+            copy_engine.CHUNK_SIZE,
+            watch_config.copy_memory_mb * 1024 * 1024,
+            watch_config.direct_io,
+        )
+        self.control = JobControl(watch_config.copy_workers)
+        self.progress = JobProgress()
+        self.compression = compression.CompressionStats()
+        self.robocopy = copy_tools.RobocopyStats()
+        self.health = (
+            health.shared_monitor(watch_config.health) if watch_config.health else None
+        )
+        self.waiting_for: List[str] = []
+        # Modality entries with their patterns expanded, set when sources are read
+        self.sources: Optional[Dict[str, List[str]]] = None
+        self.cpu_pool = cpu_pool.shared_cpu_pool(
+            watch_config.cpu_workers, watch_config.cpu_worker_max_tasks
+        )
+        self.cpu_seconds: Dict[int, float] = {}
+        self._compressed: Dict[str, CompressionConfig] = {}
+        self.destination_errors: Dict[str, List[str]] = {}
+        self._errors_lock = threading.Lock()
+        self.job_id: Optional[str] = None
+        self.phases: Dict[str, float] = {}
+        self.transfer_response: Optional[Tuple[int, str]] = None
+        # Identifier and latest state of the job in aind-data-transfer-service
+        self.remote_job_id: Optional[str] = None
+        self.remote_state: Optional[str] = None
+        self.history_id: Optional[int] = None
+        self.io_monitor = None
+        if watch_config.io_pressure is not None:
+            self.io_monitor = DiskPressureMonitor(
+                watch_config.io_pressure.path,
+                watch_config.io_pressure.threshold_pct,
+                watch_config.io_pressure.sample_s,
+            )
+
+    def _checkpoint(self) -> None:
+        """Honour cancel and pause requests, pause while no transfer window is open
+        or the acquisition disk is busy, and apply the current bandwidth cap"""
+        self.control.checkpoint()
+        if not self.schedule.is_open():
+            logging.info(
+                {
+                    "Action": "Transfer window closed, pausing copy",
+                    "Resumes": str(self.schedule.next_opening()),
+                }
+                | self.config.log_tags
+            )
+            waited = self.schedule.wait_until_open()
+            logging.info(
+                {"Action": "Transfer window open, resuming copy", "Paused_s": int(waited)}
+                | self.config.log_tags
+            )
+        if self.io_monitor is not None and self.io_monitor.is_busy():
+            logging.info(
+                {
+                    "Action": "Acquisition disk busy, pausing copy",
+                    "Utilization_pct": int(self.io_monitor.utilization()),
+                }
+                | self.config.log_tags
+            )
+            waited = self.io_monitor.wait_for_idle(self.watch_config.io_pressure.poll_s)
+            logging.info(
+                {
+                    "Action": "Acquisition disk idle, resuming copy",
+                    "Paused_s": int(waited),
+                }
+                | self.config.log_tags
+            )
+        self.bucket.set_rate(self.control.bandwidth)
+        self.bucket.parent = self.schedule.shared_bucket()
+
+    def copy_file(self, src: str, dest: str) -> bool:
+        """Copy a file or directory with the configured backend
+
+        Parameters
+        ----------
+        src : str
+            source file or directory
+        dest : str
+            destination directory
+
+        Returns
+        -------
+        bool
+            True if copy was successful, False otherwise
+        """
+        self._checkpoint()
+        if self._link_copy(src, dest):
+            return True
+        if self.watch_config.copy_backend == "python":
+            # The python backend reports progress chunk by chunk
+            transfer = self.execute_python_copy(src, dest)
+        elif PLATFORM == "windows":
+            transfer = self.execute_windows_command(src, dest)
+            self._count_copied(src, transfer)
+        else:
+            transfer = self.execute_linux_command(src, dest)
+            self._count_copied(src, transfer)
+        if transfer:
+            self.progress.add_file()
+        return transfer
+
+    def _link_copy(self, src: str, dest: str) -> bool:
+        """Stage a source with reflinks, or hard links if allowed, when the
+        destination is on the same device
+
+        Parameters
+        ----------
+        src : str
+            source file or directory
+        dest : str
+            destination directory
+
+        Returns
+        -------
+        bool
+            True if the source was staged, False if it must be copied
+        """
+        mode = self.watch_config.same_device_staging
+        if mode == "copy":
+            return False
+        if self._uses_rsync(src, [dest]):
+            # Keep the layout of rsync, which copies the directory itself
+            dest = os.path.join(dest, os.path.basename(src))
+        try:
+            nbytes = copy_engine.link_path(src, dest, hardlink=mode == "hardlink")
+        except OSError:
+            return False
+        if nbytes is None:
+            return False
+        self.progress.add_bytes(nbytes)
+        self.progress.add_file()
+        return True
+
+    def _link_sources(self, sources: List[str], dest: str) -> List[str]:
+        """Stage the sources that can be linked, returning the others"""
+        return [src for src in sources if not self._link_copy(src, dest)]
+
+    def _count_copied(self, src: str, transfer: bool) -> None:
+        """Add a file copied by an external tool to the job progress"""
+        if transfer:
+            self.progress.add_bytes(self._path_size(src))
+
+    @staticmethod
+    def _path_size(path: str) -> int:
+        """Size of a file or directory for progress reporting, 0 if unreadable"""
+        try:
+            return copy_engine.path_size(path)
+        except OSError:
+            return 0
+
+    def expand_sources(self) -> Dict[str, List[str]]:
+        """Expand the glob patterns of the modality entries
+
+        Patterns are expanded again on each call, so files written while the
+        job waited for its sources are included.
+
+        Returns
+        -------
+        Dict[str, List[str]]
+            files and directories of each modality
+        """
+        self.sources = patterns.expand_modalities(self.config.modalities)
+        for modality, entries in self.config.modalities.items():
+            if not any(patterns.is_pattern(entry) for entry in entries):
+                continue
+            paths = self.sources[modality]
+            logging.info(
+                {
+                    "Action": "Expanded modality patterns",
+                    "Modality": modality,
+                    "Files": len(paths),
+                    "Bytes": sum(self._path_size(path) for path in paths),
+                }
+                | self.config.log_tags
+            )
+        return self.sources
+
+    def modality_sources(self) -> Dict[str, List[str]]:
+        """Files and directories of each modality, expanded once"""
+        if self.sources is None:
+            return self.expand_sources()
+        return self.sources
 
     def copy_to_vast(self) -> bool:
         """Determine platform and copy files to VAST
@@ -50,38 +298,808 @@ class RunJob:
         bool
             status of the copy operation
         """
+        plan = self._plan_copy()
+        if plan is None:
+            return False
+        transfers, packs = plan
+        if not self._copy_files(transfers):
+            return False
+        if self.watch_config.audit_copies and not self.audit_copies(transfers):
+            return False
+        return self._finish_copy(packs)
+
+    def _plan_copy(self) -> Optional[Tuple[list, list]]:
+        """Create destination directories, check sources and start the progress
+
+        Returns
+        -------
+        Optional[Tuple[list, list]]
+            sources with their destination directories, and small files to
+            pack per modality. None if a source is missing
+        """
         parent_directory = self.config.name
-        destination = self.config.destination
-        modalities = self.config.modalities
+        destinations = self.config.destinations
+        modalities = self.expand_sources()
+        transfers = []
+        packs = []
         for modality in modalities.keys():
-            destination_directory = Path(destination) / parent_directory / modality
-            if not destination_directory.is_dir():
-                destination_directory.mkdir(parents=True)
+            destination_directories = [
+                Path(destination) / parent_directory / modality
+                for destination in destinations
+            ]
+            self._make_directories(destination_directories)
+            if self.config.modalities[modality] and not modalities[modality]:
+                logging.error("No files match %s", self.config.modalities[modality])
+                return None
             for file in modalities[modality]:
-                if Path(file).exists():
-                    if PLATFORM == "windows":
-                        transfer = self.execute_windows_command(
-                            file, destination_directory
-                        )
-                    else:
-                        transfer = self.execute_linux_command(file, destination_directory)
-                    if not transfer:
-                        logging.error("Error copying files %s", file)
-                        return False
-                else:
+                if not Path(file).exists():
                     logging.error("File not found %s", file)
-                    return False
+                    return None
+            direct, small = self._plan_modality(
+                modalities[modality], destination_directories
+            )
+            self._plan_compression(modality, [src for src, _ in direct])
+            transfers.extend(direct)
+            if small:
+                packs.append((modality, small, destination_directories))
+        sources = [src for src, _ in transfers]
+        sources += [src for _, small, _ in packs for src, _ in small]
+        sources += self.config.schemas
+        self.progress.start(sum(self._path_size(src) for src in sources), len(sources))
+        return transfers, packs
+
+    def _finish_copy(self, packs: list) -> bool:
+        """Pack small files, copy schemas and log the copy summary
+
+        Parameters
+        ----------
+        packs : list
+            modality, small files and destination directories to pack
+
+        Returns
+        -------
+        bool
+            True if packing and schemas succeeded on the primary destination
+        """
+        for modality, small, destination_directories in packs:
+            if not self.pack_files(modality, small, destination_directories):
+                return False
+        if self.watch_config.mirror is not None:
+            self._remove_mirrored({src for _, small, _ in packs for src, _ in small})
+        if not self._copy_schemas(
+            [
+                os.path.join(destination, self.config.name)
+                for destination in self.config.destinations
+            ]
+        ):
+            return False
+        self._log_copy_summary()
+        return True
+
+    def _remove_mirrored(self, packed: Set[str]) -> None:
+        """Remove files a live mirror staged in the primary destination that
+        the job replaced with packs or compressed copies
+
+        Parameters
+        ----------
+        packed : Set[str]
+            source files written to packs
+        """
+        rsync_layout = PLATFORM == "linux" and self.watch_config.copy_backend == "system"
+        sources = self.modality_sources()
+        modalities = {
+            modality: sources[modality]
+            for modality in sources
+            if modality in self.config.compression or self.config.packing is not None
+        }
+        root = Path(self.config.destination) / self.config.name
+        removed = 0
+        for entry, file, dest_dir in mirror.staged_files(root, modalities, rsync_layout):
+            staged = dest_dir / os.path.basename(file)
+            if file not in packed and not (
+                entry in self._compressed
+                and (
+                    staged.with_name(staged.name + ".zst").exists()
+                    or (rsync_layout and os.path.isdir(entry))
+                )
+            ):
+                continue
+            try:
+                staged.unlink()
+                removed += 1
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logging.warning(
+                    {"Error": "Could not remove mirrored file", "File": str(staged)}
+                    | {"Exception": str(e)}
+                    | self.config.log_tags
+                )
+        if removed:
+            logging.info(
+                {"Action": "Removed mirrored files replaced by the job", "Files": removed}
+                | self.config.log_tags
+            )
+
+    def _log_copy_summary(self) -> None:
+        """Log compression and robocopy results and failures of secondary
+        destinations"""
+        if self.robocopy.runs:
+            logging.info(
+                {"Action": "Robocopy summary"}
+                | self.robocopy.snapshot()
+                | self.config.log_tags,
+                extra={"weblog": True},
+            )
+        if self._compressed:
+            logging.info(
+                {"Action": "Compressed files"}
+                | self.compression.snapshot()
+                | self.config.log_tags
+            )
+        if self.cpu_seconds:
+            logging.info(
+                {
+                    "Action": "CPU worker time",
+                    "Workers_cpu_s": {
+                        str(pid): round(seconds, 2)
+                        for pid, seconds in self.cpu_seconds.items()
+                    },
+                }
+                | self.config.log_tags
+            )
+        for destination, files in self.destination_errors.items():
+            logging.error(
+                {
+                    "Error": "Could not copy to secondary destination",
+                    "Destination": destination,
+                    "Files": files,
+                }
+                | self.config.log_tags
+            )
+
+    def _copy_schemas(self, destination_directories: List[str]) -> bool:
+        """Copy schema files to the session directory of every destination
+
+        Parameters
+        ----------
+        destination_directories : List[str]
+            session directory in each destination, primary first
+
+        Returns
+        -------
+        bool
+            True if every schema was copied to the primary destination
+        """
         for schema in self.config.schemas:
-            destination_directory = os.path.join(destination, parent_directory)
-            if PLATFORM == "windows":
-                transfer = self.execute_windows_command(schema, destination_directory)
-            else:
-                transfer = self.execute_linux_command(schema, destination_directory)
+            transfer = self._copy_to_destinations(schema, destination_directories)
             if not transfer:
+                self.control.checkpoint()
                 logging.error("Error copying schema %s", schema)
                 return False
         return True
 
+    def _plan_modality(
+        self, files: List[str], destination_directories: List[Path]
+    ) -> Tuple[List[Tuple[str, List[Path]]], List[Tuple[str, str]]]:
+        """Split the files of a modality into direct copies and files to pack
+
+        Parameters
+        ----------
+        files : List[str]
+            files and directories listed for the modality
+        destination_directories : List[Path]
+            modality directory in each destination, primary first
+
+        Returns
+        -------
+        Tuple[List[Tuple[str, List[Path]]], List[Tuple[str, str]]]
+            sources copied directly with their destination directories, and
+            small files with their name inside the pack
+        """
+        if self.config.packing is None:
+            return [(file, destination_directories) for file in files], []
+        small, large = packing.plan_packing(
+            files, self.config.packing.threshold_kb * 1024
+        )
+        transfers = []
+        for src, subdirectory in large:
+            directories = [
+                directory / subdirectory for directory in destination_directories
+            ]
+            self._make_directories(directories)
+            transfers.append((src, directories))
+        return transfers, small
+
+    def _plan_compression(self, modality: str, sources: List[str]) -> None:
+        """Mark the sources of a modality with a compression policy
+
+        Parameters
+        ----------
+        modality : str
+            modality abbreviation
+        sources : List[str]
+            files and directories copied directly for the modality
+        """
+        policy = self.config.compression.get(modality)
+        if policy is None:
+            return
+        if not compression.available():
+            logging.warning(
+                {
+                    "Action": "zstandard is not installed, copying uncompressed",
+                    "Modality": modality,
+                }
+                | self.config.log_tags
+            )
+            return
+        for src in sources:
+            self._compressed[src] = policy
+
+    @staticmethod
+    def _make_directories(directories: List[Path]) -> None:
+        """Create destination directories, primary destination first
+
+        Parameters
+        ----------
+        directories : List[Path]
+            directories to create. Only a failure on the first one is raised,
+            secondary destinations fail file by file in fan_out_copy
+        """
+        for index, directory in enumerate(directories):
+            if directory.is_dir():
+                continue
+            try:
+                directory.mkdir(parents=True)
+            except OSError:
+                if index == 0:
+                    raise
+
+    def _copy_files(self, transfers: List[Tuple[str, List[str]]]) -> bool:
+        """Copy files concurrently, limited by the job's live concurrency setting
+
+        Parameters
+        ----------
+        transfers : List[Tuple[str, List[str]]]
+            source and destination directories, primary destination first
+
+        Returns
+        -------
+        bool
+            True if every copy to the primary destination was successful,
+            False otherwise
+        """
+        success = True
+        work = self._group_transfers(transfers)
+        with ThreadPoolExecutor(
+            max_workers=min(len(work), MAX_COPY_WORKERS) or 1,
+            thread_name_prefix="copy",
+        ) as pool:
+            futures = {
+                pool.submit(self._copy_in_slot, sources, dests): sources
+                for sources, dests in work
+            }
+            for future in as_completed(futures):
+                if future.cancelled() or future.result():
+                    continue
+                logging.error("Error copying files %s", futures[future])
+                success = False
+                for pending in futures:
+                    pending.cancel()
+        # A cancelled job fails its copies when its processes are terminated
+        self.control.checkpoint()
+        return success
+
+    def audit_copies(self, transfers: List[Tuple[str, List[str]]]) -> bool:
+        """Compare staged files with their sources and copy the missing or
+        different ones again, so a partial robocopy or rsync success cannot
+        submit an incomplete dataset
+
+        Parameters
+        ----------
+        transfers : List[Tuple[str, List[str]]]
+            source and destination directories, primary destination first
+
+        Returns
+        -------
+        bool
+            True if every file on the primary destination matches its source
+        """
+        expected, owners = self._audit_plan(transfers)
+        mismatches = audit.audit(expected)
+        if not mismatches:
+            return True
+        logging.warning(
+            {
+                "Action": "Staged files differ from their sources, copying them again",
+                "Files": {mismatch.staged: mismatch.problem for mismatch in mismatches},
+            }
+            | self.config.log_tags,
+            extra={"weblog": True},
+        )
+        for mismatch in mismatches:
+            self._recopy(mismatch, owners[mismatch.staged][0])
+        remaining = audit.audit(
+            [
+                (mismatch.source, mismatch.staged, mismatch.source in self._compressed)
+                for mismatch in mismatches
+            ]
+        )
+        return self._record_audit(remaining, owners)
+
+    def _audit_plan(
+        self, transfers: List[Tuple[str, List[str]]]
+    ) -> Tuple[List[Tuple[str, str, bool]], Dict[str, Tuple[str, int]]]:
+        """Files each transfer should have staged
+
+        Returns
+        -------
+        Tuple[List[Tuple[str, str, bool]], Dict[str, Tuple[str, int]]]
+            source file, staged path and whether it may be compressed, and the
+            transfer source and destination index of every staged path
+        """
+        expected = []
+        owners = {}
+        for src, dests in transfers:
+            # rsync copies a directory given without a trailing slash into a
+            # subdirectory of the same name
+            prefix = Path(src).name if self._uses_rsync(src, dests) else ""
+            compressed = src in self._compressed
+            files = copy_engine.list_files([src])
+            for index, dest in enumerate(dests):
+                if index > 0 and src in self.destination_errors.get(
+                    self.config.destinations[index], []
+                ):
+                    # Already reported as failed on this secondary destination
+                    continue
+                for file, relative in files:
+                    staged = os.path.join(str(dest), prefix, relative)
+                    expected.append((file, staged, compressed))
+                    owners[staged] = (src, index)
+        return expected, owners
+
+    def _uses_rsync(self, src: str, dests: List[str]) -> bool:
+        """True if a directory is copied by rsync rather than robocopy or the
+        in-process copier"""
+        return (
+            PLATFORM == "linux"
+            and self.watch_config.copy_backend == "system"
+            and len(dests) == 1
+            and src not in self._compressed
+            and os.path.isdir(src)
+            and not src.endswith(("/", os.sep))
+        )
+
+    def _recopy(self, mismatch: audit.Mismatch, src: str) -> None:
+        """Copy a single file found by the audit again"""
+        if src in self._compressed:
+            self._compressed[mismatch.source] = self._compressed[src]
+        directory = os.path.dirname(mismatch.staged)
+        try:
+            os.makedirs(directory, exist_ok=True)
+        except OSError:
+            # The second audit reports the file as still missing
+            return
+        self._copy_to_destinations(mismatch.source, [directory])
+
+    def _record_audit(
+        self, remaining: List[audit.Mismatch], owners: Dict[str, Tuple[str, int]]
+    ) -> bool:
+        """Log files still wrong after copying them again and record the ones of
+        secondary destinations
+
+        Returns
+        -------
+        bool
+            True if every file on the primary destination now matches
+        """
+        success = True
+        for mismatch in remaining:
+            logging.error(
+                {
+                    "Error": "Staged file does not match its source",
+                    "File": mismatch.source,
+                    "Destination": mismatch.staged,
+                    "Problem": mismatch.problem,
+                }
+                | self.config.log_tags
+            )
+            index = owners[mismatch.staged][1]
+            if index == 0:
+                success = False
+                continue
+            with self._errors_lock:
+                root = self.config.destinations[index]
+                self.destination_errors.setdefault(root, []).append(mismatch.source)
+        return success
+
+    def _group_transfers(
+        self, transfers: List[Tuple[str, List[str]]]
+    ) -> List[Tuple[List[str], List[str]]]:
+        """Group files that rsync or robocopy copy from the same directory to the
+        same destination, so each group costs one process launch instead of
+        one per file
+
+        Parameters
+        ----------
+        transfers : List[Tuple[str, List[str]]]
+            source and destination directories, primary destination first
+
+        Returns
+        -------
+        List[Tuple[List[str], List[str]]]
+            sources copied together and their destination directories
+        """
+        work = []
+        groups: Dict[Tuple[str, str], Tuple[List[str], List[str]]] = {}
+        for src, dests in transfers:
+            if (
+                not self.watch_config.group_copies
+                or self.watch_config.copy_backend != "system"
+                or len(dests) > 1
+                or src in self._compressed
+                or not os.path.isfile(src)
+            ):
+                work.append(([src], dests))
+                continue
+            key = (os.path.dirname(src), str(dests[0]))
+            groups.setdefault(key, ([], dests))[0].append(src)
+        # Split each directory over the copy workers so grouping keeps them busy
+        parts = self.watch_config.copy_workers
+        for files, dests in groups.values():
+            for part in range(min(parts, len(files))):
+                work.extend(
+                    (chunk, dests) for chunk in copy_tools.chunk_files(files[part::parts])
+                )
+        return work
+
+    def _copy_in_slot(self, sources: List[str], dests: List[str]) -> bool:
+        """Copy once a copy slot is free"""
+        self.control.acquire_slot()
+        try:
+            with self.bucket.use():
+                if len(sources) > 1:
+                    return self.copy_group(sources, str(dests[0]))
+                return self._copy_to_destinations(sources[0], dests)
+        finally:
+            self.control.release_slot()
+
+    def copy_group(self, sources: List[str], dest: str) -> bool:
+        """Copy files of one directory with a single rsync or robocopy run
+
+        Parameters
+        ----------
+        sources : List[str]
+            files in the same directory
+        dest : str
+            destination directory
+
+        Returns
+        -------
+        bool
+            True if every file was copied
+        """
+        self._checkpoint()
+        sources = self._link_sources(sources, dest)
+        if not sources:
+            return True
+        with self._group_command(sources, dest) as (cmd, failed_files):
+            run = self.run_subprocess(cmd)
+        return self._record_group(sources, dest, run, failed_files(run))
+
+    @contextmanager
+    def _group_command(
+        self, sources: List[str], dest: str
+    ) -> Iterator[Tuple[List[str], Callable[[subprocess.CompletedProcess], Set[str]]]]:
+        """Command copying files of one directory, and the function finding the
+        files it failed to copy in its output"""
+        parent = os.path.dirname(sources[0])
+        names = [os.path.basename(src) for src in sources]
+        if PLATFORM == "windows":
+            options = self.watch_config.robocopy.options(report=True)
+            cmd = ["robocopy", parent, dest, *names, *options]
+            yield cmd, partial(copy_tools.robocopy_failed_files, names=names)
+            return
+        with copy_tools.files_from(names) as list_file:
+            cmd = [
+                "rsync",
+                *self._rsync_options(),
+                f"--files-from={list_file}",
+                "--from0",
+                os.path.join(parent, ""),
+                dest,
+            ]
+            yield cmd, partial(copy_tools.rsync_failed_files, names=names)
+
+    def _record_group(
+        self,
+        sources: List[str],
+        dest: str,
+        run: subprocess.CompletedProcess,
+        failed: Set[str],
+    ) -> bool:
+        """Count the copied files of a group and log the failed ones
+
+        Returns
+        -------
+        bool
+            True if no file failed
+        """
+        if PLATFORM == "windows":
+            self._count_robocopy(run)
+        for src in sources:
+            if os.path.basename(src) not in failed:
+                self._count_copied(src, True)
+                self.progress.add_file()
+                continue
+            logging.error(
+                {
+                    "Error": "Could not copy file",
+                    "File": src,
+                    "Destination": dest,
+                    "Return Code": run.returncode,
+                }
+                | self.config.log_tags
+            )
+        return not failed
+
+    def _copy_to_destinations(self, src: str, dests: List[str]) -> bool:
+        """Copy to the primary destination, fanning out when there are more
+
+        Parameters
+        ----------
+        src : str
+            source file or directory
+        dests : List[str]
+            destination directories, primary destination first
+
+        Returns
+        -------
+        bool
+            True if the copy to the primary destination was successful
+        """
+        if len(dests) == 1 and src not in self._compressed:
+            return self.copy_file(src, dests[0])
+        return self.fan_out_copy(src, dests)
+
+    def fan_out_copy(self, src: str, dests: List[str]) -> bool:
+        """Copy a file or directory to several destinations, reading the source
+        once with the in-process copier. Failures of secondary destinations are
+        recorded in destination_errors and do not fail the job
+
+        Parameters
+        ----------
+        src : str
+            source file or directory
+        dests : List[str]
+            destination directories, primary destination first
+
+        Returns
+        -------
+        bool
+            True if the copy to the primary destination was successful
+        """
+        self._checkpoint()
+        tee = self._tee_function(src)
+        try:
+            _, errors = tee(
+                src,
+                dests,
+                bucket=self.bucket,
+                checkpoint=self._checkpoint,
+                progress=self.progress.add_bytes,
+                pool=self.buffers,
+            )
+        except OSError as e:
+            errors = {dest: e for dest in dests}
+        if self._record_errors(src, dests, errors):
+            self.progress.add_file()
+            return True
+        return False
+
+    def _tee_function(self, src: str) -> Callable:
+        """In-process copier for a source, compressing it when its modality has
+        a compression policy"""
+        is_dir = Path(src).is_dir()
+        policy = self._compressed.get(src)
+        if policy is None:
+            # Skip files staged earlier, e.g. by a live mirror, like rsync -t
+            # and robocopy do
+            return partial(
+                copy_engine.tee_tree if is_dir else copy_engine.tee_file,
+                skip_identical=True,
+            )
+        if self.cpu_pool is not None:
+            return partial(self._compress_in_worker, policy=policy)
+        return partial(
+            (
+                compression.tee_compressed_tree
+                if is_dir
+                else compression.tee_compressed_file
+            ),
+            level=policy.level,
+            threads=policy.threads,
+            min_ratio=policy.min_ratio,
+            stats=self.compression,
+        )
+
+    def _compress_in_worker(
+        self, src: str, dests: List[str], policy: CompressionConfig, **_
+    ) -> Tuple[int, Dict[str, Optional[OSError]]]:
+        """Compress a source in CPU worker processes, one task per file. The
+        worker reads and writes the file itself; progress and bandwidth are
+        accounted once it returns, and pauses take effect between files
+
+        Parameters
+        ----------
+        src : str
+            source file or directory
+        dests : List[str]
+            destination directories, primary destination first
+        policy : CompressionConfig
+            compression settings of the modality
+
+        Returns
+        -------
+        Tuple[int, Dict[str, Optional[OSError]]]
+            bytes read and the error of each destination
+        """
+        copier = partial(self._compress_file_in_worker, policy=policy)
+        if Path(src).is_dir():
+            return copy_engine.tee_tree(src, dests, copier=copier)
+        return copier(src, dests)
+
+    def _compress_file_in_worker(
+        self, src: str, dests: List[str], policy: CompressionConfig
+    ) -> Tuple[int, Dict[str, Optional[OSError]]]:
+        """Compress one file in a CPU worker process once the job may go on"""
+        self._checkpoint()
+        copied, errors, counters = self._run_cpu(
+            compression.compress_task,
+            src,
+            [str(dest) for dest in dests],
+            policy.level,
+            policy.threads,
+            policy.min_ratio,
+        )
+        self.compression.merge(counters)
+        # Files skipped by the probe were written uncompressed
+        written = copied - counters["bytes_in"] + counters["bytes_out"]
+        self._account_worker_copy(copied, written)
+        return copied, {dest: errors[str(dest)] for dest in dests}
+
+    def _account_worker_copy(self, bytes_read: int, bytes_written: int) -> None:
+        """Add work done by a CPU worker to the job progress and charge its
+        output to the bandwidth bucket"""
+        self.progress.add_bytes(bytes_read)
+        self.bucket.consume(bytes_written)
+
+    def _run_cpu(self, func: Callable, *args, **kwargs):
+        """Run a CPU-bound function in the CPU worker pool, or inline without one
+
+        Returns
+        -------
+        Any
+            the function's return value
+        """
+        if self.cpu_pool is None:
+            return func(*args, **kwargs)
+        result = self.cpu_pool.run(func, *args, **kwargs)
+        with self._errors_lock:
+            self.cpu_seconds[result.pid] = (
+                self.cpu_seconds.get(result.pid, 0.0) + result.cpu_s
+            )
+        return result.value
+
+    def pack_files(
+        self, modality: str, small: List[Tuple[str, str]], dests: List[Path]
+    ) -> bool:
+        """Stream the small files of a modality into tar containers written to
+        every destination, alongside an index of the packed files
+
+        Parameters
+        ----------
+        modality : str
+            modality abbreviation used to name the containers
+        small : List[Tuple[str, str]]
+            source files and their names inside the pack
+        dests : List[Path]
+            modality directory in each destination, primary first
+
+        Returns
+        -------
+        bool
+            True if the containers and index were written to the primary
+            destination
+        """
+        self._checkpoint()
+        dest_dirs = [str(dest) for dest in dests]
+        max_pack_bytes = self.config.packing.max_container_mb * 1024 * 1024
+        try:
+            if self.cpu_pool is None:
+                index, errors = packing.write_packs(
+                    small,
+                    dest_dirs,
+                    modality,
+                    max_pack_bytes,
+                    self.bucket,
+                    self._checkpoint,
+                    progress=self.progress.add_bytes,
+                )
+            else:
+                index, errors = packing.write_packs(
+                    small,
+                    dest_dirs,
+                    modality,
+                    max_pack_bytes,
+                    segment_writer=self._pack_in_worker,
+                )
+        except OSError as e:
+            index, errors = None, {dest: e for dest in dest_dirs}
+        if not self._record_errors(f"{modality} packs", dest_dirs, errors):
+            return False
+        logging.info(
+            {
+                "Action": "Packed small files",
+                "Modality": modality,
+                "Files": len(small),
+                "Packs": [pack["name"] for pack in index["packs"]],
+            }
+            | self.config.log_tags
+        )
+        for _ in small:
+            self.progress.add_file()
+        return True
+
+    def _pack_in_worker(
+        self, segment: List[Tuple[str, str]], partials: Dict[str, Path], offset: int
+    ) -> Tuple[List[dict], int, Dict[str, Optional[OSError]]]:
+        """Write a segment of a pack in a CPU worker process once the job may
+        go on, then account its progress and bandwidth"""
+        self._checkpoint()
+        members, written, errors = self._run_cpu(
+            packing.write_members, segment, partials, offset
+        )
+        self._account_worker_copy(sum(member["size"] for member in members), written)
+        return members, written, errors
+
+    def _record_errors(
+        self, src: str, dests: List[str], errors: Dict[str, Optional[OSError]]
+    ) -> bool:
+        """Log copy errors and record the ones of secondary destinations
+
+        Parameters
+        ----------
+        src : str
+            what was copied
+        dests : List[str]
+            destination directories, primary destination first
+        errors : Dict[str, Optional[OSError]]
+            error of each destination, None if it succeeded
+
+        Returns
+        -------
+        bool
+            True if the copy to the primary destination was successful
+        """
+        for index, dest in enumerate(dests):
+            if errors[dest] is None:
+                continue
+            logging.error(
+                {
+                    "Error": "Could not copy file",
+                    "File": src,
+                    "Destination": str(dest),
+                    "Exception": str(errors[dest]),
+                }
+                | self.config.log_tags
+            )
+            if index > 0:
+                with self._errors_lock:
+                    root = self.config.destinations[index]
+                    self.destination_errors.setdefault(root, []).append(src)
+        return errors[dests[0]] is None
+
     def run_subprocess(self, cmd: list) -> subprocess.CompletedProcess:
         """subprocess run command
 
@@ -96,10 +1114,17 @@ class RunJob:
             subprocess completed process
         """
         logging.debug("Executing command: %s", cmd)
-        subproc = subprocess.run(
-            cmd, check=False, stderr=subprocess.PIPE, stdout=subprocess.PIPE
-        )
-        return subproc
+        # Popen rather than run so the job's control handle can pause or
+        # terminate the child process
+        with subprocess.Popen(
+            cmd, stderr=subprocess.PIPE, stdout=subprocess.PIPE
+        ) as proc:
+            self.control.register_process(proc)
+            try:
+                stdout, stderr = proc.communicate()
+            finally:
+                self.control.unregister_process(proc)
+        return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
 
     def execute_windows_command(self, src: str, dest: str) -> bool:
         """copy files using windows robocopy command
@@ -116,26 +1141,37 @@ class RunJob:
         bool
             True if copy was successful, False otherwise
         """
-        # Robocopy used over xcopy for better performance
-        # /j: unbuffered I/O (to speed up copy)
-        # /e: copy subdirectories (includes empty subdirs), /r:5: retry 5 times
         if not Path(src).exists():
             return False
+        run = self.run_subprocess(self._robocopy_command(src, dest))
+        return self._robocopy_succeeded(run, src, dest)
+
+    def _robocopy_command(self, src: str, dest: str) -> List[str]:
+        """robocopy command copying a file or the contents of a directory"""
+        # Robocopy used over xcopy for better performance
+        # /e: copy subdirectories (includes empty subdirs)
+        robocopy = self.watch_config.robocopy
         if Path(src).is_dir():
-            run = self.run_subprocess(
-                ["robocopy", src, dest, "/z", "/e", "/j", "/r:5"],
-            )
-        else:
-            run = self.run_subprocess(
-                [
-                    "robocopy",
-                    str(Path(src).parent),
-                    dest,
-                    Path(src).name,
-                    "/j",
-                    "/r:5",
-                ]
-            )
+            return ["robocopy", src, dest, "/e", *robocopy.options(directory=True)]
+        return [
+            "robocopy",
+            str(Path(src).parent),
+            dest,
+            Path(src).name,
+            *robocopy.options(),
+        ]
+
+    def _count_robocopy(self, run: subprocess.CompletedProcess) -> None:
+        """Add the job summary of a robocopy run to the job's statistics"""
+        summary = copy_tools.parse_robocopy_summary(run.stdout)
+        if summary is not None:
+            self.robocopy.add(summary)
+
+    def _robocopy_succeeded(
+        self, run: subprocess.CompletedProcess, src: str, dest: str
+    ) -> bool:
+        """Check and log the result of a robocopy command"""
+        self._count_robocopy(run)
         # Robocopy return code documenttion:
         # https://learn.microsoft.com/en-us/troubleshoot/windows-server/backup-and-storage/return-codes-used-robocopy-utility # noqa
         if run.returncode > 7:
@@ -166,14 +1202,34 @@ class RunJob:
         bool
             True if copy was successful, False otherwise
         """
-        # Rsync used over cp for better performance
-        # -r: recursive, -t: preserve modification times
         if not Path(src).exists():
             return False
+        run = self.run_subprocess(self._rsync_command(src, dest))
+        return self._rsync_succeeded(run, src, dest)
+
+    def _rsync_command(self, src: str, dest: str) -> List[str]:
+        """rsync command copying a file or directory"""
+        # Rsync used over cp for better performance
+        # -r: recursive
         if Path(src).is_dir():
-            run = self.run_subprocess(["rsync", "-r", "-t", src, dest])
-        else:
-            run = self.run_subprocess(["rsync", "-t", src, dest])
+            return ["rsync", "-r", *self._rsync_options(), src, dest]
+        return ["rsync", *self._rsync_options(), src, dest]
+
+    def _rsync_options(self) -> List[str]:
+        """rsync options shared by every copy"""
+        # -t: preserve modification times
+        # --bwlimit: KiB/s share of the window's and the job's caps, split
+        # between the copies running
+        options = ["-t"]
+        rate = self.bucket.share(self.control.concurrency)
+        if rate:
+            options.append(f"--bwlimit={max(1, int(rate / 1024))}")
+        return options
+
+    def _rsync_succeeded(
+        self, run: subprocess.CompletedProcess, src: str, dest: str
+    ) -> bool:
+        """Check and log the result of an rsync command"""
         if run.returncode != 0:
             logging.error(
                 {
@@ -187,8 +1243,60 @@ class RunJob:
             return False
         return True
 
-    def trigger_transfer_service(self) -> bool:
-        """Triggers aind-data-transfer-service"""
+    def execute_python_copy(self, src: str, dest: str) -> bool:
+        """copy files with the in-process chunked copier, which honours
+        transfer window pauses and bandwidth caps in the middle of a file
+
+        Parameters
+        ----------
+        src : str
+            source file or directory
+        dest : str
+            destination directory
+
+        Returns
+        -------
+        bool
+            True if copy was successful, False otherwise
+        """
+        if not Path(src).exists():
+            return False
+        try:
+            if Path(src).is_dir():
+                copy_engine.copy_tree(
+                    src,
+                    dest,
+                    self.bucket,
+                    self._checkpoint,
+                    progress=self.progress.add_bytes,
+                    pool=self.buffers,
+                    skip_identical=True,
+                )
+            else:
+                copy_engine.copy_file(
+                    src,
+                    dest,
+                    self.bucket,
+                    self._checkpoint,
+                    progress=self.progress.add_bytes,
+                    pool=self.buffers,
+                    skip_identical=True,
+                )
+        except OSError as e:
+            logging.error(
+                {
+                    "Error": "Could not copy file",
+                    "File": src,
+                    "Destination": dest,
+                    "Exception": str(e),
+                }
+                | self.config.log_tags
+            )
+            return False
+        return True
+
+    def upload_job_config(self) -> BasicUploadJobConfigs:
+        """Upload job of the primary destination for aind-data-transfer-service"""
         modality_configs = []
         for modality in self.config.modalities.keys():
             m = ModalityConfigs(
@@ -199,7 +1307,7 @@ class RunJob:
             )
             modality_configs.append(m)
 
-        upload_job_configs = BasicUploadJobConfigs(
+        return BasicUploadJobConfigs(
             s3_bucket=self.config.s3_bucket,
             platform=self.config.platform,
             subject_id=str(self.config.subject_id),
@@ -211,21 +1319,85 @@ class RunJob:
             input_data_mount=self.config.mount,
             force_cloud_sync=self.config.force_cloud_sync,
         )
+
+    def trigger_transfer_service(self) -> bool:
+        """Triggers aind-data-transfer-service"""
         logging.info("Submitting job to aind-data-transfer-service")
-        submit_request = SubmitJobRequest(upload_jobs=[upload_job_configs])
-        post_request_content = json.loads(submit_request.model_dump_json(round_trip=True))
-        submit_job_response = requests.post(
-            url=self.config.transfer_endpoint, json=post_request_content, timeout=5
+        try:
+            submit_job_response = submit_upload_jobs(
+                self.config.transfer_endpoint, [self.upload_job_config()]
+            )
+        except requests.RequestException as e:
+            self.transfer_response = (None, str(e)[:1000])
+            return False
+        self.transfer_response = (
+            submit_job_response.status_code,
+            submit_job_response.text[:1000],
         )
 
         if submit_job_response.status_code == 200:
+            job_ids = tracker.submitted_job_ids(submit_job_response.text)
+            self.track_submission(job_ids[0] if len(job_ids) == 1 else None)
             return True
         else:
             return False
 
+    def track_submission(self, job_id: Optional[str]) -> None:
+        """Follow the job in aind-data-transfer-service when transfer tracking
+        is configured
+
+        Parameters
+        ----------
+        job_id : Optional[str]
+            identifier returned by the service, None if it gave none
+        """
+        settings = self.watch_config.transfer_tracking
+        if settings is None:
+            return
+        if job_id is None:
+            logging.warning(
+                {"Error": "Transfer service returned no job id, not tracking"}
+                | self.config.log_tags
+            )
+            return
+        self.remote_job_id = job_id
+        self.remote_state = "submitted"
+        tracker.shared_tracker(settings).track(
+            job_id,
+            tracker.status_url(self.config.transfer_endpoint, settings.status_path),
+            self._remote_state_changed,
+        )
+
+    def _remote_state_changed(self, state: str) -> None:
+        """Record a new transfer service state of the job"""
+        self.remote_state = state
+        logging.log(
+            logging.ERROR if state in ("failed", "untracked") else logging.INFO,
+            {
+                "Action": "Transfer service job state",
+                "State": state,
+                "Remote_job_id": self.remote_job_id,
+            }
+            | self.config.log_tags,
+            extra={"weblog": True},
+        )
+        if self.history_id is None:
+            return
+        try:
+            history.JobHistory(self._history_path()).update_remote_state(
+                self.history_id, state
+            )
+        except (sqlite3.Error, OSError) as e:
+            logging.warning(
+                {"Error": "Could not update job history", "Exception": str(e)}
+                | self.config.log_tags
+            )
+
     def move_manifest_to_archive(self) -> None:
-        """Move manifest file to archive"""
-        archive = self.watch_config.manifest_complete
+        """Move manifest file to this month's archive directory and index it"""
+        index = manifest_archive.shared_archive(self.watch_config.manifest_complete)
+        sha256 = manifest_archive.manifest_digest(self.src_path)
+        archive = index.current_directory(self.watch_config.archive_compact_months)
         if PLATFORM == "windows":
             copy_file = self.execute_windows_command(self.src_path, archive)
             if not copy_file:
@@ -234,6 +1406,17 @@ class RunJob:
             os.remove(self.src_path)
         else:
             self.run_subprocess(["mv", self.src_path, archive])
+        try:
+            index.add(
+                self.config.name,
+                os.path.join(archive, os.path.basename(self.src_path)),
+                sha256,
+            )
+        except sqlite3.Error as e:
+            logging.warning(
+                {"Error": "Could not index archived manifest", "Exception": str(e)}
+                | self.config.log_tags
+            )
 
     def run_job(self) -> None:
         """Triggers the vast transfer service
@@ -243,32 +1426,297 @@ class RunJob:
         event : FileCreatedEvent
             modified event file
         """
-        start_time = time.time()
+        if self.control.cancelled:
+            return
+        self.control.state = "running"
+        try:
+            self.control.state = self._run_job()
+        except JobCancelled:
+            self.control.state = "cancelled"
+            logging.info(
+                {"Action": "Job cancelled"} | self.config.log_tags,
+                extra={"weblog": True},
+            )
+            return
+        except Exception as e:
+            self._fail_unexpectedly(e)
+            return
+        finally:
+            self.progress.finish()
+            self.record_history()
+        if self.control.state == "succeeded":
+            self.move_manifest_to_archive()
+
+    def _fail_unexpectedly(self, error: Exception) -> None:
+        """Record a job that raised as failed, so neither the history nor the
+        status API shows it running"""
+        self.control.state = "failed"
+        logging.error(
+            {"Error": "Job failed unexpectedly", "Exception": repr(error)}
+            | self.config.log_tags,
+            extra={"weblog": True},
+        )
+
+    def _run_job(self) -> str:
+        """Copy data and trigger aind-data-transfer-service
+
+        Returns
+        -------
+        str
+            final job state, succeeded or failed
+        """
+        start_time = self._log_job_start()
+        if not self.wait_for_sources():
+            return "failed"
+        copy_start_time = time.time()
+        copied = self._replay_on_outage([self.config.destination], self.copy_to_vast)
+        if not self._log_copy_result(copied, copy_start_time):
+            return "failed"
+        after_copy_time = time.time()
+        self.control.checkpoint()
+        triggered = self._replay_on_outage(
+            [self.config.transfer_endpoint], self.trigger_transfer_service
+        )
+        return self._log_trigger_result(triggered, start_time, after_copy_time)
+
+    def _replay_on_outage(
+        self, targets: List[str], phase: Callable[[], bool], replays: int = 0
+    ) -> bool:
+        """Run a phase of the job, holding and replaying it while a probe finds
+        one of its targets down
+
+        Parameters
+        ----------
+        targets : List[str]
+            destination roots or endpoint the phase needs
+        phase : Callable[[], bool]
+            the phase, returning True on success
+        replays : int
+            replays of the phase already made
+
+        Returns
+        -------
+        bool
+            result of the last run of the phase
+        """
+        while True:
+            self.wait_for_targets(targets)
+            try:
+                if phase():
+                    return True
+            except OSError as e:
+                # An unreachable share fails before any copy, e.g. in mkdir
+                self._log_phase_error(targets, e)
+            if not self._hold_for_replay(targets, replays):
+                return False
+            replays += 1
+
+    def _log_phase_error(self, targets: List[str], error: OSError) -> None:
+        """Log a phase that raised instead of reporting failure"""
+        logging.error(
+            {"Error": "Job phase failed", "Targets": targets, "Exception": repr(error)}
+            | self.config.log_tags
+        )
+
+    def _hold_for_replay(self, targets: List[str], replays: int) -> bool:
+        """Probe the targets of a failed phase and decide whether to replay it"""
+        if self.health is None or replays >= self.watch_config.health.max_replays:
+            return False
+        if not self.health.trip(targets):
+            return False
+        logging.warning(
+            {
+                "Action": "Job held until its target recovers",
+                "Targets": targets,
+                "Replay": replays + 1,
+            }
+            | self.config.log_tags,
+            extra={"weblog": True},
+        )
+        return True
+
+    def wait_for_targets(self, targets: List[str]) -> None:
+        """Block while a target is down, then until the job's replay slot"""
+        hold = self.health.hold(targets) if self.health else None
+        if hold is None:
+            return
+        self.waiting_for = hold.targets
+        try:
+            while True:
+                self.control.checkpoint()
+                delay = hold.poll()
+                if not delay:
+                    break
+                time.sleep(delay)
+        finally:
+            self.waiting_for = []
+        self._log_hold(hold)
+
+    def _log_hold(self, hold: health.Hold) -> None:
+        """Add the time a job was held to its outage phase"""
+        self.phases["outage_s"] = self.phases.get("outage_s", 0.0) + hold.waited
+        logging.info(
+            {"Action": "Replaying held job", "Held_s": int(hold.waited)}
+            | self.config.log_tags
+        )
+
+    def record_history(self) -> None:
+        """Append the job's outcome, volumes, phase durations and throughput to
+        the local job history. Failures are logged and never fail the job"""
+        copy_s = self.phases.get("copy_s")
+        status, response = self.transfer_response or (None, None)
+        job = {
+            "name": self.config.name,
+            "rig": socket.gethostname(),
+            "platform": str(self.config.platform),
+            "project_name": self.config.project_name,
+            "destination": self.config.destination,
+            "state": self.control.state,
+            "started": self.progress.started,
+            "finished": self.progress.finished,
+            "backend": self.watch_config.copy_backend,
+            "runner": self.watch_config.runner,
+            "copy_workers": self.control.concurrency,
+            "bytes": self.progress.bytes_copied,
+            "files": self.progress.files_copied,
+            "mbps": (self.progress.bytes_copied / copy_s / 1_000_000 if copy_s else None),
+            "response_status": status,
+            "response": response,
+            "remote_job_id": self.remote_job_id,
+            "remote_state": self.remote_state,
+        } | self.phases
+        try:
+            self.history_id = history.JobHistory(self._history_path()).record(
+                job, self._modality_totals()
+            )
+        except (sqlite3.Error, OSError) as e:
+            logging.warning(
+                {"Error": "Could not record job history", "Exception": str(e)}
+                | self.config.log_tags
+            )
+
+    def _history_path(self) -> str:
+        """Job history database of the service"""
+        return self.watch_config.history_db or os.path.join(
+            self.watch_config.manifest_complete, history.HISTORY_NAME
+        )
+
+    def _modality_totals(self) -> Dict[str, Tuple[int, int]]:
+        """Bytes and number of files listed for each modality"""
+        totals = {}
+        for modality, sources in self.modality_sources().items():
+            nbytes = files = 0
+            for file, _ in copy_engine.list_files(sources):
+                try:
+                    nbytes += os.path.getsize(file)
+                except OSError:
+                    continue
+                files += 1
+            totals[modality] = (nbytes, files)
+        return totals
+
+    def wait_for_sources(self) -> bool:
+        """Wait until every source file has stopped changing, when source
+        readiness is configured
+
+        Returns
+        -------
+        bool
+            True once the sources are stable, False if they were still
+            changing at the timeout
+        """
+        watcher = self._source_watcher()
+        if watcher is None:
+            return True
+        ready = watcher.wait(
+            self.watch_config.source_readiness.poll_s, self.control.checkpoint
+        )
+        return self._log_sources_ready(watcher, ready)
+
+    async def wait_for_sources_async(self) -> bool:
+        """Coroutine version of wait_for_sources, sleeping on the event loop and
+        scanning the sources in a worker thread"""
+        watcher = await asyncio.to_thread(self._source_watcher)
+        if watcher is None:
+            return True
+        while True:
+            ready = await asyncio.to_thread(watcher.poll)
+            if ready is not None:
+                return self._log_sources_ready(watcher, ready)
+            if self.control.cancelled:
+                raise JobCancelled()
+            await asyncio.sleep(self.watch_config.source_readiness.poll_s)
+
+    def _source_watcher(self) -> Optional[readiness.SourceWatcher]:
+        """Watcher over every modality source and schema, None if source
+        readiness is not configured"""
+        settings = self.watch_config.source_readiness
+        if settings is None:
+            return None
+        sources = [path for paths in self.expand_sources().values() for path in paths]
+        return readiness.SourceWatcher(
+            sources + self.config.schemas, settings.stable_s, settings.timeout_s
+        )
+
+    def _log_sources_ready(self, watcher: readiness.SourceWatcher, ready: bool) -> bool:
+        """Log the time spent waiting for sources, apart from the copy time"""
+        self.phases["wait_s"] = watcher.waited
+        if not ready:
+            logging.error(
+                {
+                    "Error": "Source files still changing, giving up",
+                    "Waited_s": int(watcher.waited),
+                }
+                | self.config.log_tags
+            )
+            return False
+        logging.info(
+            {"Action": "Source files stable", "Waited_s": int(watcher.waited)}
+            | self.config.log_tags
+        )
+        return True
+
+    def _log_job_start(self) -> float:
+        """Log the start of a job and return its start time"""
         logging.info(
             {"Action": "Running job"} | self.config.log_tags,
             extra={"weblog": True},
         )
+        return time.time()
 
-        transfer = self.copy_to_vast()
+    def _log_copy_result(self, transfer: bool, start_time: float) -> bool:
+        """Log the outcome of the copy phase and pass it through"""
+        self.phases["copy_s"] = time.time() - start_time
         if not transfer:
             logging.error({"Error": "Could not copy to VAST"} | self.config.log_tags)
-            return
-        after_copy_time = time.time()
+            return False
         logging.info(
             {
                 "Action": "Data copied to VAST",
-                "Duration_s": int(after_copy_time - start_time),
+                "Duration_s": int(time.time() - start_time),
             }
             | self.config.log_tags
         )
+        return True
+
+    def _log_trigger_result(
+        self, triggered: bool, start_time: float, after_copy_time: float
+    ) -> str:
+        """Log the outcome of the transfer service request
 
-        if not self.trigger_transfer_service():
+        Returns
+        -------
+        str
+            final job state, succeeded or failed
+        """
+        end_time = time.time()
+        self.phases["trigger_s"] = end_time - after_copy_time
+        if not triggered:
             logging.error(
                 {"Error": "Could not trigger aind-data-transfer-service"}
                 | self.config.log_tags
             )
-            return
-        end_time = time.time()
+            return "failed"
         logging.info(
             {
                 "Action": "AIND Data Transfer Service notified",
@@ -282,4 +1730,251 @@ class RunJob:
             | self.config.log_tags,
             extra={"weblog": True},
         )
-        self.move_manifest_to_archive()
+        return "succeeded"
+
+    async def run_job_async(self) -> None:
+        """Coroutine version of run_job used by the asyncio runner
+
+        Subprocess copies are awaited on the event loop, so a job waiting on
+        rsync or robocopy holds no thread. Blocking work (the in-process
+        copier, checkpoints, filesystem setup and the HTTP submission) runs
+        in the loop's default executor.
+        """
+        if self.control.cancelled:
+            return
+        self.control.state = "running"
+        try:
+            self.control.state = await self._run_job_async()
+        except JobCancelled:
+            self.control.state = "cancelled"
+            logging.info(
+                {"Action": "Job cancelled"} | self.config.log_tags,
+                extra={"weblog": True},
+            )
+            return
+        except Exception as e:
+            self._fail_unexpectedly(e)
+            return
+        finally:
+            self.progress.finish()
+            await asyncio.to_thread(self.record_history)
+        if self.control.state == "succeeded":
+            await asyncio.to_thread(self.move_manifest_to_archive)
+
+    async def _run_job_async(self) -> str:
+        """Copy data and trigger aind-data-transfer-service without blocking
+        the event loop
+
+        Returns
+        -------
+        str
+            final job state, succeeded or failed
+        """
+        start_time = self._log_job_start()
+        if not await self.wait_for_sources_async():
+            return "failed"
+        copy_start_time = time.time()
+        copied = await self._replay_on_outage_async(
+            [self.config.destination], self.copy_to_vast_async
+        )
+        if not self._log_copy_result(copied, copy_start_time):
+            return "failed"
+        after_copy_time = time.time()
+        await asyncio.to_thread(self.control.checkpoint)
+        triggered = await self._replay_on_outage_async(
+            [self.config.transfer_endpoint],
+            partial(asyncio.to_thread, self.trigger_transfer_service),
+        )
+        return self._log_trigger_result(triggered, start_time, after_copy_time)
+
+    async def _replay_on_outage_async(
+        self, targets: List[str], phase: Callable[[], Awaitable[bool]]
+    ) -> bool:
+        """Coroutine version of _replay_on_outage"""
+        replays = 0
+        while True:
+            await self.wait_for_targets_async(targets)
+            try:
+                if await phase():
+                    return True
+            except OSError as e:
+                self._log_phase_error(targets, e)
+            if not await asyncio.to_thread(self._hold_for_replay, targets, replays):
+                return False
+            replays += 1
+
+    async def wait_for_targets_async(self, targets: List[str]) -> None:
+        """Coroutine version of wait_for_targets, sleeping on the event loop"""
+        hold = self.health.hold(targets) if self.health else None
+        if hold is None:
+            return
+        self.waiting_for = hold.targets
+        try:
+            while True:
+                if self.control.cancelled:
+                    raise JobCancelled()
+                delay = await asyncio.to_thread(hold.poll)
+                if not delay:
+                    break
+                await asyncio.sleep(delay)
+        finally:
+            self.waiting_for = []
+        self._log_hold(hold)
+
+    async def copy_to_vast_async(self) -> bool:
+        """Coroutine version of copy_to_vast
+
+        Returns
+        -------
+        bool
+            status of the copy operation
+        """
+        plan = await asyncio.to_thread(self._plan_copy)
+        if plan is None:
+            return False
+        transfers, packs = plan
+        if not await self._copy_files_async(transfers):
+            return False
+        if self.watch_config.audit_copies and not await asyncio.to_thread(
+            self.audit_copies, transfers
+        ):
+            return False
+        return await asyncio.to_thread(self._finish_copy, packs)
+
+    async def _copy_files_async(self, transfers: List[Tuple[str, List[str]]]) -> bool:
+        """Copy files concurrently as tasks, limited by the job's copy slots
+
+        Parameters
+        ----------
+        transfers : List[Tuple[str, List[str]]]
+            source and destination directories, primary destination first
+
+        Returns
+        -------
+        bool
+            True if every copy to the primary destination was successful
+        """
+        tasks = {
+            asyncio.ensure_future(self._copy_in_slot_async(sources, dests)): sources
+            for sources, dests in self._group_transfers(transfers)
+        }
+        pending = set(tasks)
+        success = True
+        try:
+            while pending and success:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if not task.result():
+                        logging.error("Error copying files %s", tasks[task])
+                        success = False
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.to_thread(self.control.checkpoint)
+        return success
+
+    async def _copy_in_slot_async(self, sources: List[str], dests: List[str]) -> bool:
+        """Copy once a copy slot is free, awaiting external copy tools"""
+        while not self.control.try_acquire_slot():
+            await asyncio.sleep(SLOT_POLL_S)
+        src = sources[0]
+        try:
+            with self.bucket.use():
+                if len(sources) > 1:
+                    await asyncio.to_thread(self._checkpoint)
+                    return await self.copy_group_async(sources, str(dests[0]))
+                if (
+                    self.watch_config.copy_backend == "python"
+                    or len(dests) > 1
+                    or src in self._compressed
+                ):
+                    return await asyncio.to_thread(self._copy_to_destinations, src, dests)
+                await asyncio.to_thread(self._checkpoint)
+                return await self.copy_file_async(src, str(dests[0]))
+        finally:
+            self.control.release_slot()
+
+    async def copy_file_async(self, src: str, dest: str) -> bool:
+        """Copy a file or directory with rsync or robocopy as an asyncio
+        subprocess
+
+        Parameters
+        ----------
+        src : str
+            source file or directory
+        dest : str
+            destination directory
+
+        Returns
+        -------
+        bool
+            True if copy was successful, False otherwise
+        """
+        if not Path(src).exists():
+            return False
+        if await asyncio.to_thread(self._link_copy, src, dest):
+            return True
+        if PLATFORM == "windows":
+            run = await self.run_subprocess_async(self._robocopy_command(src, dest))
+            transfer = self._robocopy_succeeded(run, src, dest)
+        else:
+            run = await self.run_subprocess_async(self._rsync_command(src, dest))
+            transfer = self._rsync_succeeded(run, src, dest)
+        self._count_copied(src, transfer)
+        if transfer:
+            self.progress.add_file()
+        return transfer
+
+    async def copy_group_async(self, sources: List[str], dest: str) -> bool:
+        """Copy files of one directory with a single rsync or robocopy asyncio
+        subprocess
+
+        Parameters
+        ----------
+        sources : List[str]
+            files in the same directory
+        dest : str
+            destination directory
+
+        Returns
+        -------
+        bool
+            True if every file was copied
+        """
+        sources = await asyncio.to_thread(self._link_sources, sources, dest)
+        if not sources:
+            return True
+        with self._group_command(sources, dest) as (cmd, failed_files):
+            run = await self.run_subprocess_async(cmd)
+        return self._record_group(sources, dest, run, failed_files(run))
+
+    async def run_subprocess_async(self, cmd: list) -> subprocess.CompletedProcess:
+        """Run a command as an asyncio subprocess
+
+        Parameters
+        ----------
+        cmd : list
+            command to execute
+
+        Returns
+        -------
+        subprocess.CompletedProcess
+            subprocess completed process
+        """
+        logging.debug("Executing command: %s", cmd)
+        proc = await asyncio.create_subprocess_exec(
+            *cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        self.control.register_process(proc)
+        try:
+            stdout, stderr = await proc.communicate()
+        except asyncio.CancelledError:
+            proc.kill()
+            await proc.wait()
+            raise
+        finally:
+            self.control.unregister_process(proc)
+        return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
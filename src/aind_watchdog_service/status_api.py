@@ -0,0 +1,329 @@
+"""Local HTTP/JSON API to inspect and control the job queue"""
+
+import datetime
+import json
+import logging
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional, Tuple, Union
+
+from apscheduler.jobstores.base import JobLookupError
+
+from aind_watchdog_service.event_handler import EventHandler
+from aind_watchdog_service.job_control import check_bandwidth, check_concurrency
+from aind_watchdog_service.pending import PendingJob
+from aind_watchdog_service.run_job import RunJob
+
+JOB_ACTION = re.compile(r"^/jobs/(?P<job_id>[^/]+)/(?P<action>[a-z]+)$")
+
+
+class StatusServer:
+    """Serve job status on localhost from a daemon thread.
+
+    Requests only read counters that the copy threads already maintain,
+    so polling never touches the copy path.
+
+    Endpoints
+    ---------
+    GET  /jobs                       scheduled, running and finished jobs
+    POST /jobs/<job_id>/cancel       cancel a scheduled or running job
+    POST /jobs/<job_id>/pause        pause a running job
+    POST /jobs/<job_id>/resume       resume a paused job
+    POST /jobs/<job_id>/settings     {"bandwidth_mbps": float, "concurrency": int}
+    POST /jobs/<job_id>/priority     {"run_at": "now" | ISO datetime}
+    """
+
+    def __init__(self, event_handler: EventHandler, port: int, host: str = "127.0.0.1"):
+        """Construct StatusServer
+
+        Parameters
+        ----------
+        event_handler : EventHandler
+            handler owning the job registry
+        port : int
+            port to listen on, 0 picks a free port
+        host : str
+            interface to bind, localhost by default
+        """
+        self.event_handler = event_handler
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        """Port the server is bound to"""
+        return self.httpd.server_address[1]
+
+    def start(self) -> None:
+        """Serve requests in a daemon thread"""
+        logging.info("Starting status API on port %s", self.port)
+        self._thread = threading.Thread(
+            target=self.httpd.serve_forever, name="status-api", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop serving requests"""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _runs(self) -> List[Union[PendingJob, RunJob]]:
+        """Every job the event handler knows about"""
+        return (
+            list(self.event_handler.pending.values())
+            + list(self.event_handler.runs.values())
+            + list(self.event_handler.finished)
+        )
+
+    def _find(self, job_id: str) -> Optional[Union[PendingJob, RunJob]]:
+        """Look up a job by its scheduler id"""
+        for run in self._runs():
+            if run.job_id == job_id:
+                return run
+        return None
+
+    def job_status(self, run: Union[PendingJob, RunJob]) -> dict:
+        """JSON-serializable status of a job
+
+        Parameters
+        ----------
+        run : Union[PendingJob, RunJob]
+            job to describe
+
+        Returns
+        -------
+        dict
+            identifiers, state, schedule and live progress
+        """
+        job = self.event_handler.jobs.get(run.src_path)
+        next_run = getattr(job, "next_run_time", None) if run.job_id else None
+        if isinstance(run, PendingJob):
+            return run.status() | (
+                {"next_run_time": next_run.isoformat()} if next_run else {}
+            )
+        return (
+            {
+                "id": run.job_id,
+                "manifest": run.src_path,
+                "name": run.config.name,
+                "state": "paused" if run.control.paused else run.control.state,
+                "next_run_time": next_run.isoformat() if next_run else None,
+                "waiting_for": run.waiting_for,
+                "remote_job_id": run.remote_job_id,
+                "remote_state": run.remote_state,
+                "concurrency": run.control.concurrency,
+                "bandwidth_mbps": (
+                    run.control.bandwidth / 1_000_000 if run.control.bandwidth else None
+                ),
+            }
+            | run.progress.snapshot()
+            | run.compression.snapshot()
+            | run.robocopy.snapshot()
+        )
+
+    def list_jobs(self) -> dict:
+        """Status of every scheduled, running and finished job"""
+        return {"jobs": [self.job_status(run) for run in self._runs()]}
+
+    def post(self, job_id: str, action: str, payload: bytes) -> Tuple[int, dict]:
+        """Apply a control action requested with a JSON body
+
+        Parameters
+        ----------
+        job_id : str
+            scheduler id of the job
+        action : str
+            cancel, pause, resume, settings or priority
+        payload : bytes
+            request body, a JSON object or empty
+
+        Returns
+        -------
+        Tuple[int, dict]
+            HTTP status code and response body
+        """
+        try:
+            body = json.loads(payload or b"{}")
+            if not isinstance(body, dict):
+                raise ValueError("Request body must be a JSON object")
+            return self.act(job_id, action, body)
+        except (ValueError, TypeError) as e:
+            return 400, {"error": str(e)}
+        except JobLookupError:
+            # The job started or finished since it was found
+            return 409, {"error": "Job is no longer scheduled"}
+
+    def act(self, job_id: str, action: str, body: dict) -> Tuple[int, dict]:
+        """Apply a control action to a job
+
+        Parameters
+        ----------
+        job_id : str
+            scheduler id of the job
+        action : str
+            cancel, pause, resume, settings or priority
+        body : dict
+            action parameters
+
+        Returns
+        -------
+        Tuple[int, dict]
+            HTTP status code and response body
+        """
+        run = self._find(job_id)
+        if run is None:
+            return 404, {"error": f"Unknown job {job_id}"}
+        if isinstance(run, PendingJob):
+            return self._act_pending(run, action, body)
+        if action == "cancel":
+            self._cancel(run)
+        elif action == "pause":
+            run.control.pause()
+        elif action == "resume":
+            run.control.resume()
+        elif action == "settings":
+            self._apply_settings(run, body)
+        elif action == "priority":
+            if run.control.state != "pending":
+                return 409, {"error": "Only scheduled jobs can be reprioritized"}
+            if self.event_handler.batch_of(run.src_path) is not None:
+                return 409, {"error": "Batched jobs run at the time of their batch"}
+            self._reprioritize(job_id, body.get("run_at", "now"))
+        else:
+            return 404, {"error": f"Unknown action {action}"}
+        logging.info({"Action": f"Status API {action}", "Job": job_id} | body)
+        return 200, self.job_status(run)
+
+    def _cancel(self, run: RunJob) -> None:
+        """Cancel a job, removing it from the scheduler or its batch if it has
+        not started"""
+        if run.control.state == "pending":
+            if not self.event_handler.cancel_batched(run.src_path):
+                self.event_handler.scheduler.remove_job(run.job_id)
+            run.control.state = "cancelled"
+        run.control.cancel()
+
+    def _act_pending(self, run: PendingJob, action: str, body: dict) -> Tuple[int, dict]:
+        """Apply a control action to a job whose manifest is not loaded yet
+
+        Settings are kept on the record and applied when the job fires.
+        """
+        if action == "cancel":
+            self.event_handler.scheduler.remove_job(run.job_id)
+            self.event_handler.pending.pop(run.src_path, None)
+            status = run.status() | {"state": "cancelled"}
+        elif action == "settings":
+            run.settings = dict(run.settings or {}) | self._settings(body)
+            status = self.job_status(run)
+        elif action == "priority":
+            self._reprioritize(run.job_id, body.get("run_at", "now"))
+            status = self.job_status(run)
+        elif action in ("pause", "resume"):
+            return 409, {"error": "Only running jobs can be paused or resumed"}
+        else:
+            return 404, {"error": f"Unknown action {action}"}
+        logging.info({"Action": f"Status API {action}", "Job": run.job_id} | body)
+        return 200, status
+
+    @staticmethod
+    def _settings(body: dict) -> dict:
+        """Validated settings of a request, so no value is applied unless
+        every value is valid
+
+        Parameters
+        ----------
+        body : dict
+            optional bandwidth_mbps and concurrency values
+
+        Returns
+        -------
+        dict
+            the settings given
+
+        Raises
+        ------
+        ValueError
+            if bandwidth_mbps is not null or a positive number, or concurrency
+            is not an integer of at least 1
+        """
+        settings = {}
+        if "bandwidth_mbps" in body:
+            check_bandwidth(body["bandwidth_mbps"])
+            settings["bandwidth_mbps"] = body["bandwidth_mbps"]
+        if "concurrency" in body:
+            check_concurrency(body["concurrency"])
+            settings["concurrency"] = body["concurrency"]
+        return settings
+
+    def _apply_settings(self, run: RunJob, body: dict) -> None:
+        """Change bandwidth cap and concurrency of a job
+
+        Parameters
+        ----------
+        run : RunJob
+            job to retune
+        body : dict
+            optional bandwidth_mbps and concurrency values
+        """
+        settings = self._settings(body)
+        if "bandwidth_mbps" in settings:
+            run.control.set_bandwidth(settings["bandwidth_mbps"])
+        if "concurrency" in settings:
+            run.control.set_concurrency(settings["concurrency"])
+
+    def _reprioritize(self, job_id: str, run_at: str) -> None:
+        """Move a scheduled job to a new run time
+
+        Parameters
+        ----------
+        job_id : str
+            scheduler id of the job
+        run_at : str
+            "now" or an ISO formatted datetime
+        """
+        if run_at == "now":
+            next_run_time = datetime.datetime.now()
+        else:
+            next_run_time = datetime.datetime.fromisoformat(run_at)
+        self.event_handler.scheduler.modify_job(job_id, next_run_time=next_run_time)
+
+    def _handler_class(self) -> type:
+        """Request handler bound to this server"""
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            """Route status API requests"""
+
+            def _reply(self, code: int, body: dict) -> None:
+                """Send a JSON response"""
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self) -> None:
+                """List jobs"""
+                if self.path.rstrip("/") == "/jobs":
+                    self._reply(200, server.list_jobs())
+                else:
+                    self._reply(404, {"error": f"Unknown path {self.path}"})
+
+            def do_POST(self) -> None:
+                """Control a job"""
+                match = JOB_ACTION.match(self.path)
+                if match is None:
+                    self._reply(404, {"error": f"Unknown path {self.path}"})
+                    return
+                length = int(self.headers.get("Content-Length") or 0)
+                payload = self.rfile.read(length)
+                self._reply(*server.post(match["job_id"], match["action"], payload))
+
+            def log_message(self, format: str, *args) -> None:
+                """Keep request logs out of the service log"""
+                logging.debug(format, *args)
+
+        return Handler
@@ -0,0 +1,267 @@
+"""Transfer windows and bandwidth shaping for staging copies"""
+
+import datetime
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from aind_watchdog_service.models.watch_config import TransferWindow
+
+MEGABYTE = 1_000_000
+
+
+class TokenBucket:
+    """Thread-safe token bucket that limits throughput in bytes per second.
+
+    Tokens are shared by every thread consuming from the same bucket, so
+    the cap applies to the sum of all concurrent copies. Requests larger
+    than the bucket capacity are allowed and paid back by sleeping. A bucket
+    with a parent also charges the parent, so a job's own cap applies on top
+    of the process-wide cap of the open transfer window.
+    """
+
+    def __init__(self, rate: Optional[float] = None, burst_s: float = 1.0):
+        """Construct TokenBucket
+
+        Parameters
+        ----------
+        rate : Optional[float]
+            bytes per second, None disables throttling
+        burst_s : float
+            number of seconds worth of tokens the bucket can hold
+        """
+        self._lock = threading.Lock()
+        self._rate = rate
+        self._burst_s = burst_s
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._users = 0
+        self.parent: Optional["TokenBucket"] = None
+
+    @property
+    def rate(self) -> Optional[float]:
+        """Current rate in bytes per second"""
+        return self._rate
+
+    @property
+    def capacity(self) -> float:
+        """Maximum number of tokens the bucket can hold"""
+        return (self._rate or 0.0) * self._burst_s
+
+    def _refill(self) -> None:
+        """Add tokens accumulated since the last refill, caller holds the lock"""
+        now = time.monotonic()
+        if self._rate:
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._last) * self._rate
+            )
+        self._last = now
+
+    def set_rate(self, rate: Optional[float]) -> None:
+        """Change the rate, e.g. when a transfer window with another cap opens
+
+        Parameters
+        ----------
+        rate : Optional[float]
+            bytes per second, None disables throttling
+        """
+        with self._lock:
+            if rate == self._rate:
+                return
+            self._refill()
+            self._rate = rate
+            self._tokens = min(self._tokens, self.capacity)
+
+    def _chain(self) -> List["TokenBucket"]:
+        """This bucket and its parents"""
+        buckets = [self]
+        while buckets[-1].parent is not None:
+            buckets.append(buckets[-1].parent)
+        return buckets
+
+    @contextmanager
+    def use(self) -> Iterator[None]:
+        """Count a copy drawing from this bucket and its parents while it runs,
+        so shares of the rate can be given to copies throttled outside the
+        bucket"""
+        buckets = self._chain()
+        for bucket in buckets:
+            with bucket._lock:
+                bucket._users += 1
+        try:
+            yield
+        finally:
+            for bucket in buckets:
+                with bucket._lock:
+                    bucket._users -= 1
+
+    def share(self, workers: int = 1) -> Optional[float]:
+        """Rate one copy may use when the rate of this bucket and its parents is
+        split evenly between the copies using them
+
+        Parameters
+        ----------
+        workers : int
+            fewest copies to split each rate between, so copies started
+            before the others registered do not take a whole rate
+
+        Returns
+        -------
+        Optional[float]
+            bytes per second, None if unthrottled
+        """
+        shares = []
+        for bucket in self._chain():
+            with bucket._lock:
+                if bucket._rate:
+                    shares.append(bucket._rate / max(bucket._users, workers))
+        return min(shares) if shares else None
+
+    def consume(self, amount: int) -> float:
+        """Take tokens from the bucket, sleeping if the bucket runs dry
+
+        Parameters
+        ----------
+        amount : int
+            number of bytes about to be transferred
+
+        Returns
+        -------
+        float
+            seconds spent sleeping
+        """
+        with self._lock:
+            delay = 0.0
+            if self._rate:
+                self._refill()
+                self._tokens -= amount
+                delay = -self._tokens / self._rate if self._tokens < 0 else 0.0
+        if delay:
+            time.sleep(delay)
+        if self.parent is not None:
+            delay += self.parent.consume(amount)
+        return delay
+
+
+class TransferSchedule:
+    """Resolve which transfer window is open and when the next one opens"""
+
+    def __init__(self, windows: List[TransferWindow]):
+        """Construct TransferSchedule
+
+        Parameters
+        ----------
+        windows : List[TransferWindow]
+            configured transfer windows, an empty list means always open
+        """
+        self.windows = windows
+
+    def active_window(
+        self, now: Optional[datetime.datetime] = None
+    ) -> Optional[TransferWindow]:
+        """Window open at now, None if no window is open
+
+        Parameters
+        ----------
+        now : Optional[datetime.datetime]
+            moment to check, defaults to the current time
+
+        Returns
+        -------
+        Optional[TransferWindow]
+            first configured window containing now
+        """
+        now = now or datetime.datetime.now()
+        for window in self.windows:
+            if window.contains(now.time()):
+                return window
+        return None
+
+    def is_open(self, now: Optional[datetime.datetime] = None) -> bool:
+        """Check if copies may run at now"""
+        return not self.windows or self.active_window(now) is not None
+
+    def bandwidth(self, now: Optional[datetime.datetime] = None) -> Optional[float]:
+        """Bandwidth cap in bytes per second at now, None if unthrottled"""
+        window = self.active_window(now)
+        if window is None or window.max_bandwidth_mbps is None:
+            return None
+        return window.max_bandwidth_mbps * MEGABYTE
+
+    def shared_bucket(
+        self, now: Optional[datetime.datetime] = None
+    ) -> Optional[TokenBucket]:
+        """Process-wide bucket of the window open at now, None if unthrottled"""
+        window = self.active_window(now)
+        if window is None or window.max_bandwidth_mbps is None:
+            return None
+        return shared_bucket(window)
+
+    def next_opening(self, now: Optional[datetime.datetime] = None) -> datetime.datetime:
+        """Earliest moment at or after now when copies may run
+
+        Parameters
+        ----------
+        now : Optional[datetime.datetime]
+            moment to start from, defaults to the current time
+
+        Returns
+        -------
+        datetime.datetime
+            now if a window is open, otherwise the start of the next window
+        """
+        now = now or datetime.datetime.now()
+        if self.is_open(now):
+            return now
+        openings = []
+        for window in self.windows:
+            opening = datetime.datetime.combine(now.date(), window.start)
+            if opening <= now:
+                opening += datetime.timedelta(days=1)
+            openings.append(opening)
+        return min(openings)
+
+    def wait_until_open(self, poll_s: float = 60.0) -> float:
+        """Block until a transfer window is open
+
+        Parameters
+        ----------
+        poll_s : float
+            longest single sleep, keeps the wait responsive to config edits
+
+        Returns
+        -------
+        float
+            seconds spent waiting
+        """
+        start = time.monotonic()
+        while not self.is_open():
+            remaining = (self.next_opening() - datetime.datetime.now()).total_seconds()
+            time.sleep(max(0.0, min(remaining, poll_s)))
+        return time.monotonic() - start
+
+
+_shared: Dict[str, TokenBucket] = {}
+_shared_lock = threading.Lock()
+
+
+def shared_bucket(window: TransferWindow) -> TokenBucket:
+    """Process-wide bucket of a transfer window, so its cap holds across every
+    concurrent job
+
+    Parameters
+    ----------
+    window : TransferWindow
+        window with a bandwidth cap
+
+    Returns
+    -------
+    TokenBucket
+        the bucket of this window
+    """
+    key = window.model_dump_json()
+    with _shared_lock:
+        if key not in _shared:
+            _shared[key] = TokenBucket(window.max_bandwidth_mbps * MEGABYTE)
+        return _shared[key]
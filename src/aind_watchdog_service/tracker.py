@@ -0,0 +1,239 @@
+"""Follow jobs submitted to aind-data-transfer-service until their upload and
+processing finish"""
+
+import json
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional
+from urllib.parse import urlsplit
+
+import requests
+
+from aind_watchdog_service.models.watch_config import TransferTrackingConfig
+
+# Transfer service job states that end tracking, and the state recorded for them
+FINAL_STATES = {"success": "succeeded", "failed": "failed", "upstream_failed": "failed"}
+
+
+def submitted_job_ids(text: str) -> List[Optional[str]]:
+    """Identifiers of the jobs accepted by a submit_jobs request
+
+    Parameters
+    ----------
+    text : str
+        body of the submit_jobs response
+
+    Returns
+    -------
+    List[Optional[str]]
+        one identifier per submitted upload job, in submission order. Empty
+        if the response does not list them
+    """
+    try:
+        data = json.loads(text).get("data") or {}
+        responses = data.get("responses") or []
+    except (ValueError, AttributeError):
+        return []
+    return [
+        response.get("job_id") or response.get("dag_run_id")
+        for response in responses
+        if isinstance(response, dict)
+    ]
+
+
+def status_url(endpoint: str, path: str) -> str:
+    """Status endpoint on the host of a submit_jobs endpoint"""
+    parts = urlsplit(endpoint)
+    return f"{parts.scheme}://{parts.netloc}{path}"
+
+
+class Tracked(NamedTuple):
+    """Submitted job waiting for a final state"""
+
+    url: str
+    on_state: Callable[[str], None]
+    submitted: float
+
+
+class TransferTracker:
+    """Poll the state of every outstanding submitted job
+
+    Jobs are asked for in batches, one request per batch_size jobs of a
+    status endpoint, over one pooled requests.Session. The interval between
+    polls is reset to min_interval_s whenever a job changes state and doubles
+    up to max_interval_s while nothing changes. The polling thread exits once
+    no job is outstanding and is started again by the next submission.
+    """
+
+    def __init__(self, config: TransferTrackingConfig):
+        """Construct TransferTracker
+
+        Parameters
+        ----------
+        config : TransferTrackingConfig
+            status endpoint, poll intervals and batch size
+        """
+        self.config = config
+        self.session = requests.Session()
+        self.interval = config.min_interval_s
+        self._jobs: Dict[str, Tracked] = {}
+        self._states: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def outstanding(self) -> int:
+        """Number of jobs still followed"""
+        with self._lock:
+            return len(self._jobs)
+
+    def track(self, job_id: str, url: str, on_state: Callable[[str], None]) -> None:
+        """Follow a submitted job
+
+        Parameters
+        ----------
+        job_id : str
+            transfer service job identifier
+        url : str
+            status endpoint of the service the job was submitted to
+        on_state : Callable[[str], None]
+            called with each new state of the job
+        """
+        with self._lock:
+            self._jobs[job_id] = Tracked(url, on_state, time.monotonic())
+            self.interval = self.config.min_interval_s
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="transfer-tracker", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self) -> None:
+        """Poll until no job is outstanding"""
+        while True:
+            time.sleep(self.interval)
+            changed = self.poll()
+            with self._lock:
+                if not self._jobs:
+                    self._thread = None
+                    return
+                if changed:
+                    self.interval = self.config.min_interval_s
+                else:
+                    self.interval = min(self.interval * 2, self.config.max_interval_s)
+
+    def poll(self) -> bool:
+        """Ask every status endpoint for its outstanding jobs once
+
+        Returns
+        -------
+        bool
+            True if any job changed state
+        """
+        with self._lock:
+            jobs = dict(self._jobs)
+        by_url: Dict[str, List[str]] = {}
+        for job_id, tracked in jobs.items():
+            by_url.setdefault(tracked.url, []).append(job_id)
+        changed = False
+        size = self.config.batch_size
+        for url, job_ids in by_url.items():
+            while job_ids:
+                batch, job_ids = job_ids[:size], job_ids[size:]
+                for job_id, state in self._fetch(url, batch).items():
+                    if job_id in jobs:
+                        changed |= self._update(job_id, jobs[job_id], state)
+        self._expire(jobs)
+        return changed
+
+    def _fetch(self, url: str, job_ids: List[str]) -> Dict[str, str]:
+        """States of a batch of jobs, empty if the service cannot be reached"""
+        try:
+            response = self.session.get(
+                url, params={"job_id": job_ids}, timeout=self.config.timeout_s
+            )
+            response.raise_for_status()
+            statuses = response.json()["data"]["job_status_list"]
+        except (requests.RequestException, ValueError, KeyError, TypeError) as e:
+            logging.warning(
+                {
+                    "Error": "Could not poll transfer service",
+                    "Url": url,
+                    "Exception": str(e),
+                }
+            )
+            return {}
+        return {
+            status.get("job_id"): status.get("job_state")
+            for status in statuses
+            if isinstance(status, dict) and status.get("job_state")
+        }
+
+    def _update(self, job_id: str, tracked: Tracked, state: str) -> bool:
+        """Report a polled state if it is new and stop following final ones"""
+        state = FINAL_STATES.get(state, state)
+        if self._states.get(job_id) == state:
+            return False
+        self._states[job_id] = state
+        if state in FINAL_STATES.values():
+            with self._lock:
+                self._jobs.pop(job_id, None)
+            self._states.pop(job_id)
+        self._report(job_id, tracked, state)
+        return True
+
+    @staticmethod
+    def _report(job_id: str, tracked: Tracked, state: str) -> None:
+        """Call the state callback of a job, logging its errors so they do not
+        stop the polling thread"""
+        try:
+            tracked.on_state(state)
+        except Exception as e:
+            logging.error(
+                {
+                    "Error": "Could not record transfer service state",
+                    "Job": job_id,
+                    "State": state,
+                    "Exception": repr(e),
+                }
+            )
+
+    def _expire(self, jobs: Dict[str, Tracked]) -> None:
+        """Stop following jobs older than max_age_h"""
+        limit = time.monotonic() - self.config.max_age_h * 3600
+        for job_id, tracked in jobs.items():
+            if tracked.submitted >= limit:
+                continue
+            with self._lock:
+                if self._jobs.pop(job_id, None) is None:
+                    continue
+            self._states.pop(job_id, None)
+            logging.warning(
+                {"Error": "Transfer service job did not finish", "Job": job_id}
+            )
+            self._report(job_id, tracked, "untracked")
+
+
+_shared: Dict[str, TransferTracker] = {}
+_shared_lock = threading.Lock()
+
+
+def shared_tracker(config: TransferTrackingConfig) -> TransferTracker:
+    """Process-wide tracker, so every job is polled in the same batches
+
+    Parameters
+    ----------
+    config : TransferTrackingConfig
+        status endpoint, poll intervals and batch size
+
+    Returns
+    -------
+    TransferTracker
+        the tracker of these settings
+    """
+    key = config.model_dump_json()
+    with _shared_lock:
+        if key not in _shared:
+            _shared[key] = TransferTracker(config)
+        return _shared[key]
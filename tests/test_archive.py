@@ -0,0 +1,138 @@
+"""Test the indexed manifest archive"""
+
+import datetime
+import os
+import tempfile
+import time
+import unittest
+import zipfile
+from pathlib import Path
+from unittest.mock import patch
+
+from aind_watchdog_service.archive import INDEX_NAME, ManifestArchive, manifest_digest
+
+
+class TestManifestArchive(unittest.TestCase):
+    """Test ManifestArchive"""
+
+    def setUp(self) -> None:
+        """Create an empty archive directory"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.directory = Path(self.tmp.name)
+        self.archive = ManifestArchive(self.tmp.name)
+
+    def tearDown(self) -> None:
+        """Remove the archive"""
+        self.tmp.cleanup()
+
+    def _manifest(self, directory: Path, file_name: str, name: str) -> Path:
+        """Write a manifest file"""
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / file_name
+        path.write_text(f"name: {name}\n")
+        return path
+
+    def test_add_and_lookup(self):
+        """Test the latest entry of a name is found, also after reopening"""
+        self.assertIsNone(self.archive.lookup("session_1"))
+        month = Path(self.archive.current_directory(keep_months=12))
+        self.assertEqual(month.name, datetime.datetime.now().strftime("%Y-%m"))
+        first = self._manifest(month, "manifest_a.yml", "session_1")
+        self.archive.add("session_1", str(first), manifest_digest(str(first)))
+        second = self._manifest(month, "manifest_b.yml", "session_1")
+        self.archive.add("session_1", str(second), None)
+        reopened = ManifestArchive(self.tmp.name)
+        entry = reopened.lookup("session_1")
+        self.assertEqual(self.directory / entry.path, second)
+        self.assertIsNone(entry.sha256)
+        self.assertTrue((self.directory / INDEX_NAME).is_file())
+
+    def test_rotate(self):
+        """Test manifests of a flat archive are moved by month and indexed"""
+        old = self._manifest(self.directory, "manifest_old.yml", "old_session")
+        stamp = time.mktime((2023, 5, 10, 12, 0, 0, 0, 0, -1))
+        os.utime(old, (stamp, stamp))
+        self._manifest(self.directory, "manifest_bad.yml", "[")
+        self.assertEqual(self.archive.rotate(), 2)
+        self.assertTrue((self.directory / "2023-05" / "manifest_old.yml").is_file())
+        entry = self.archive.lookup("old_session")
+        self.assertEqual(entry.path, os.path.join("2023-05", "manifest_old.yml"))
+        self.assertEqual(entry.archived, stamp)
+        self.assertEqual(self.archive.rotate(), 0)
+
+    def test_compact(self):
+        """Test old months are zipped and index paths follow them"""
+        for month in ("2024-01", "2024-02", "2024-03"):
+            path = self._manifest(self.directory / month, "manifest.yml", month)
+            self.archive.add(month, str(path), None)
+        now = datetime.datetime(2024, 4, 15)
+        self.assertEqual(self.archive.compact(keep_months=2, now=now), 2)
+        self.assertEqual(
+            sorted(os.listdir(self.directory)),
+            ["2024-01.zip", "2024-02.zip", "2024-03", INDEX_NAME],
+        )
+        with zipfile.ZipFile(self.directory / "2024-01.zip") as zf:
+            self.assertEqual(zf.read("manifest.yml"), b"name: 2024-01\n")
+        self.assertEqual(self.archive.lookup("2024-02").path, "2024-02.zip/manifest.yml")
+        self.assertEqual(
+            self.archive.lookup("2024-03").path, os.path.join("2024-03", "manifest.yml")
+        )
+
+    def test_compact_again(self):
+        """Test compacting a month twice keeps the manifests zipped first"""
+        now = datetime.datetime(2024, 4, 15)
+        first = self._manifest(self.directory / "2024-01", "a_manifest.yml", "a")
+        self.archive.add("a", str(first), None)
+        self.archive.compact(keep_months=1, now=now)
+        (self.directory / "2024-01").mkdir()
+        second = self._manifest(self.directory / "2024-01", "b_manifest.yml", "b")
+        self.archive.add("b", str(second), None)
+        # Same file name as a zipped manifest, different content
+        third = self._manifest(self.directory / "2024-01", "a_manifest.yml", "c")
+        self.archive.add("c", str(third), None)
+        self.assertEqual(self.archive.compact(keep_months=1, now=now), 1)
+        with zipfile.ZipFile(self.directory / "2024-01.zip") as zf:
+            self.assertEqual(
+                sorted(zf.namelist()),
+                ["a_manifest.yml", "a_manifest_1.yml", "b_manifest.yml"],
+            )
+            for name in ("a", "b", "c"):
+                member = self.archive.lookup(name).path.split("/", 1)[1]
+                self.assertEqual(zf.read(member), f"name: {name}\n".encode())
+        self.assertFalse((self.directory / "2024-01.zip.partial").exists())
+
+    def test_rotate_into_zip(self):
+        """Test a loose manifest of a compacted month is added to its zip"""
+        now = datetime.datetime(2024, 4, 15)
+        first = self._manifest(self.directory / "2024-01", "a_manifest.yml", "a")
+        self.archive.add("a", str(first), None)
+        self.archive.compact(keep_months=1, now=now)
+        loose = self._manifest(self.directory, "b_manifest.yml", "b")
+        stamp = time.mktime((2024, 1, 20, 12, 0, 0, 0, 0, -1))
+        os.utime(loose, (stamp, stamp))
+        self.assertEqual(self.archive.rotate(), 1)
+        self.assertEqual(sorted(os.listdir(self.directory)), ["2024-01.zip", INDEX_NAME])
+        self.assertEqual(self.archive.lookup("b").path, "2024-01.zip/b_manifest.yml")
+        with zipfile.ZipFile(self.directory / "2024-01.zip") as zf:
+            self.assertEqual(sorted(zf.namelist()), ["a_manifest.yml", "b_manifest.yml"])
+        self.assertEqual(self.archive.lookup("a").path, "2024-01.zip/a_manifest.yml")
+
+    def test_maintain_missing_directory(self):
+        """Test maintenance failures are logged, not raised"""
+        archive = ManifestArchive(str(self.directory / "missing"))
+        with self.assertLogs(level="WARNING"):
+            archive.maintain(keep_months=12)
+
+    def test_maintain_once_at_a_time(self):
+        """Test maintenance is skipped while another thread maintains"""
+        with patch.object(self.archive, "rotate") as rotate:
+            with self.archive._maintaining:
+                self.archive.maintain(keep_months=None)
+            rotate.assert_not_called()
+            rotate.return_value = 0
+            self.archive.maintain(keep_months=None)
+            rotate.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
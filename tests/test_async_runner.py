@@ -0,0 +1,167 @@
+"""Test the asyncio job runner"""
+
+import asyncio
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import yaml
+
+from aind_watchdog_service.async_runner import AsyncRunner
+from aind_watchdog_service.job_control import JobCancelled
+from aind_watchdog_service.models.manifest_config import ManifestConfig
+from aind_watchdog_service.models.watch_config import SourceReadinessConfig, WatchConfig
+from aind_watchdog_service.readiness import SourceWatcher
+from aind_watchdog_service.run_job import RunJob
+
+TEST_DIRECTORY = Path(__file__).resolve().parent
+
+COPY = (
+    "import shutil, sys, time; time.sleep(float(sys.argv[3]));"
+    " shutil.copy(*sys.argv[1:3])"
+)
+
+
+class TestAsyncRunner(unittest.TestCase):
+    """Test AsyncRunner"""
+
+    def test_job_slots(self):
+        """Test coroutine jobs run concurrently up to the job limit"""
+        runner = AsyncRunner(max_jobs=2)
+        runner.start()
+        running = []
+        peak = []
+        finished = threading.Event()
+
+        async def job():
+            running.append(1)
+            peak.append(len(running))
+            await asyncio.sleep(0.1)
+            running.pop()
+            if len(peak) == 5 and not running:
+                finished.set()
+
+        try:
+            for _ in range(5):
+                runner.scheduler.add_job(job)
+            self.assertTrue(finished.wait(5))
+        finally:
+            runner.stop()
+        self.assertEqual(max(peak), 2)
+
+
+class TestRunJobAsync(unittest.TestCase):
+    """Test the coroutine copy path of RunJob"""
+
+    def setUp(self) -> None:
+        """Load configs and create source files"""
+        with open(TEST_DIRECTORY / "resources" / "watch_config.yml") as yam:
+            # Copy through the stand-in command even on reflink filesystems
+            self.watch_config = WatchConfig(
+                **yaml.safe_load(yam) | {"same_device_staging": "copy"}
+            )
+        with open(TEST_DIRECTORY / "resources" / "manifest.yml") as yam:
+            self.manifest_config = ManifestConfig(**yaml.safe_load(yam))
+        self.tmp = tempfile.TemporaryDirectory()
+        self.sources = []
+        for number in range(3):
+            source = Path(self.tmp.name) / f"source_{number}.bin"
+            source.write_bytes(b"x" * 100)
+            self.sources.append(str(source))
+        self.config = self.manifest_config.model_copy(
+            update={
+                "destination": str(Path(self.tmp.name) / "vast"),
+                "modalities": {"behavior": self.sources},
+                "schemas": [],
+            }
+        )
+
+    def tearDown(self) -> None:
+        """Remove the files"""
+        self.tmp.cleanup()
+
+    def _copy_command(self, delay: float):
+        """Stand-in for rsync that copies a file after a delay"""
+        return lambda src, dest: [sys.executable, "-c", COPY, src, dest, str(delay)]
+
+    def test_copy_to_vast_async(self):
+        """Test copies run as concurrent asyncio subprocesses"""
+        watch_config = self.watch_config.model_copy(update={"copy_workers": 3})
+        execute = RunJob("manifest.yml", self.config, watch_config)
+        with patch.object(execute, "_rsync_command", self._copy_command(0.5)):
+            with patch("aind_watchdog_service.run_job.PLATFORM", "linux"):
+                start = time.monotonic()
+                self.assertTrue(asyncio.run(execute.copy_to_vast_async()))
+                elapsed = time.monotonic() - start
+        modality_dir = Path(self.config.destination) / self.config.name / "behavior"
+        self.assertEqual(len(list(modality_dir.iterdir())), 3)
+        self.assertEqual(execute.progress.files_copied, 3)
+        self.assertLess(elapsed, 1.4)
+
+    def test_cancel(self):
+        """Test cancelling terminates the running copy subprocess"""
+        # One rsync run per file, so the stand-in command is used
+        watch_config = self.watch_config.model_copy(update={"group_copies": False})
+        execute = RunJob("manifest.yml", self.config, watch_config)
+        threading.Timer(0.5, execute.control.cancel).start()
+        with patch.object(execute, "_rsync_command", self._copy_command(30)):
+            with patch("aind_watchdog_service.run_job.PLATFORM", "linux"):
+                start = time.monotonic()
+                with self.assertRaises(JobCancelled):
+                    asyncio.run(execute.copy_to_vast_async())
+        self.assertLess(time.monotonic() - start, 10)
+
+    def test_wait_for_sources_off_loop(self):
+        """Test sources are scanned in worker threads, not on the event loop"""
+        watch_config = self.watch_config.model_copy(
+            update={"source_readiness": SourceReadinessConfig(stable_s=0.05, poll_s=0.01)}
+        )
+        execute = RunJob("manifest.yml", self.config, watch_config)
+        threads = []
+        poll = SourceWatcher.poll
+
+        def record_poll(watcher: SourceWatcher):
+            """Record the thread polling the sources"""
+            threads.append(threading.get_ident())
+            return poll(watcher)
+
+        async def wait():
+            """Wait for the sources and return the event loop's thread"""
+            self.assertTrue(await execute.wait_for_sources_async())
+            return threading.get_ident()
+
+        with patch.object(SourceWatcher, "poll", record_poll):
+            loop_thread = asyncio.run(wait())
+        self.assertTrue(threads)
+        self.assertNotIn(loop_thread, threads)
+
+    def test_paused_copy_keeps_loop_running(self):
+        """Test a paused job waits for resume without blocking the event loop"""
+        execute = RunJob("manifest.yml", self.config, self.watch_config)
+        execute.control.pause()
+        # Fails the test instead of hanging if the loop is blocked
+        guard = threading.Timer(5, execute.control.cancel)
+        guard.start()
+
+        async def resume():
+            """Resume the job from another task on the loop"""
+            await asyncio.sleep(0.1)
+            execute.control.resume()
+
+        async def copy():
+            """Copy nothing while paused, resuming concurrently"""
+            copied, _ = await asyncio.gather(execute._copy_files_async([]), resume())
+            return copied
+
+        try:
+            self.assertTrue(asyncio.run(copy()))
+        finally:
+            guard.cancel()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+"""Test the post-copy audit of staged files"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from aind_watchdog_service.audit import Mismatch, audit
+
+
+class TestAudit(unittest.TestCase):
+    """Test audit"""
+
+    def setUp(self) -> None:
+        """Stage a copy of a small session"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.source = Path(self.tmp.name) / "source"
+        (self.source / "sub").mkdir(parents=True)
+        for name in ("a.bin", "b.bin", "sub/c.bin"):
+            (self.source / name).write_bytes(b"x" * 100)
+        self.staged = Path(self.tmp.name) / "staged"
+        shutil.copytree(self.source, self.staged)
+        self.expected = [
+            (str(self.source / name), str(self.staged / name), False)
+            for name in ("a.bin", "b.bin", "sub/c.bin")
+        ]
+
+    def tearDown(self) -> None:
+        """Remove the files"""
+        self.tmp.cleanup()
+
+    def test_matching_copy(self):
+        """Test a complete copy has no mismatches"""
+        self.assertEqual(audit(self.expected), [])
+        self.assertEqual(audit([]), [])
+
+    def test_mismatches(self):
+        """Test missing, short and stale files are reported"""
+        (self.staged / "a.bin").write_bytes(b"x" * 10)
+        shutil.copystat(self.source / "a.bin", self.staged / "a.bin")
+        (self.staged / "sub" / "c.bin").unlink()
+        stat = os.stat(self.source / "b.bin")
+        os.utime(self.staged / "b.bin", ns=(stat.st_atime_ns, stat.st_mtime_ns - 10**10))
+        self.assertEqual(
+            sorted(audit(self.expected, workers=2)),
+            [
+                Mismatch(*self.expected[0][:2], "short"),
+                Mismatch(*self.expected[1][:2], "mtime"),
+                Mismatch(*self.expected[2][:2], "missing"),
+            ],
+        )
+
+    def test_compressed(self):
+        """Test compressed copies are checked by name and mtime only"""
+        (self.staged / "a.bin").rename(self.staged / "a.bin.zst")
+        expected = [(*self.expected[0][:2], True)]
+        self.assertEqual(audit(expected), [])
+        (self.staged / "a.bin.zst").unlink()
+        self.assertEqual(audit(expected)[0].problem, "missing")
+
+    def test_missing_directory(self):
+        """Test files of a directory that was never created are missing"""
+        shutil.rmtree(self.staged / "sub")
+        self.assertEqual(
+            [mismatch.problem for mismatch in audit(self.expected)], ["missing"]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,292 @@
+"""Test batch execution of jobs sharing a trigger time"""
+
+import datetime
+import os
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import requests
+import yaml
+from watchdog.events import FileDeletedEvent
+
+from aind_watchdog_service.batch import BatchJob, interleave
+from aind_watchdog_service.event_handler import EventHandler
+from aind_watchdog_service.models.manifest_config import ManifestConfig
+from aind_watchdog_service.health import HealthMonitor
+from aind_watchdog_service.models.watch_config import HealthConfig, WatchConfig
+from aind_watchdog_service.run_job import RunJob
+from aind_watchdog_service.status_api import StatusServer
+
+TEST_DIRECTORY = Path(__file__).resolve().parent
+
+
+class TestBatch(unittest.TestCase):
+    """Test BatchJob"""
+
+    def setUp(self) -> None:
+        """Load configurations and create two sessions"""
+        self.tmp = tempfile.TemporaryDirectory()
+        with open(TEST_DIRECTORY / "resources" / "watch_config.yml") as yam:
+            self.watch_config = WatchConfig(**yaml.safe_load(yam)).model_copy(
+                update={
+                    "copy_backend": "python",
+                    "copy_workers": 2,
+                    "history_db": os.path.join(self.tmp.name, "job_history.sqlite"),
+                }
+            )
+        with open(TEST_DIRECTORY / "resources" / "manifest.yml") as yam:
+            self.manifest_config = ManifestConfig(**yaml.safe_load(yam))
+        self.configs = []
+        for number in range(2):
+            source = Path(self.tmp.name) / f"frames_{number}.bin"
+            source.write_bytes(b"f" * (number + 1) * 100)
+            self.configs.append(
+                self.manifest_config.model_copy(
+                    update={
+                        "name": f"session_{number}",
+                        "destination": str(Path(self.tmp.name) / "vast"),
+                        "modalities": {"behavior": [str(source)]},
+                        "schemas": [],
+                    }
+                )
+            )
+
+    def tearDown(self) -> None:
+        """Remove the sessions"""
+        self.tmp.cleanup()
+
+    def test_interleave(self):
+        """Test large and small copies alternate"""
+        self.assertEqual(
+            interleave(["a", "b", "c", "d", "e"], [5, 1, 4, 2, 3]),
+            ["a", "b", "c", "d", "e"],
+        )
+        self.assertEqual(interleave(["s", "l"], [1, 9]), ["l", "s"])
+        self.assertEqual(interleave([], []), [])
+
+    @patch("aind_watchdog_service.run_job.RunJob.move_manifest_to_archive")
+    @patch("requests.post")
+    def test_run(self, mock_post: MagicMock, mock_move_mani: MagicMock):
+        """Test members are copied and submitted in one request"""
+        response = requests.Response()
+        response.status_code = 200
+        mock_post.return_value = response
+        # The second session is missing a file and fails alone
+        missing = self.configs[1].model_copy(
+            update={"name": "session_2", "modalities": {"behavior": ["/missing.bin"]}}
+        )
+        batch = BatchJob(self.watch_config)
+        runs = [
+            RunJob(f"manifest_{index}.yml", config, self.watch_config)
+            for index, config in enumerate(self.configs + [missing])
+        ]
+        for index, run in enumerate(runs):
+            self.assertTrue(batch.add(f"manifest_{index}.yml", run))
+        with self.assertLogs(level="INFO"):
+            batch.run()
+        self.assertEqual(
+            [run.control.state for run in runs], ["succeeded", "succeeded", "failed"]
+        )
+        mock_post.assert_called_once()
+        upload_jobs = mock_post.call_args.kwargs["json"]["upload_jobs"]
+        self.assertEqual(len(upload_jobs), 2)
+        self.assertEqual(mock_move_mani.call_count, 2)
+        for number in range(2):
+            staged = Path(self.tmp.name) / "vast" / f"session_{number}" / "behavior"
+            self.assertEqual(
+                (staged / f"frames_{number}.bin").stat().st_size, (number + 1) * 100
+            )
+        self.assertFalse(batch.add("late.yml", runs[0]))
+
+    @patch("requests.post")
+    def test_submission_failure(self, mock_post: MagicMock):
+        """Test every member fails when the combined submission fails"""
+        mock_post.side_effect = requests.ConnectionError("refused")
+        batch = BatchJob(self.watch_config)
+        runs = [RunJob("m.yml", config, self.watch_config) for config in self.configs]
+        for index, run in enumerate(runs):
+            batch.add(f"manifest_{index}.yml", run)
+        with self.assertLogs(level="ERROR"):
+            batch.run()
+        self.assertEqual([run.control.state for run in runs], ["failed", "failed"])
+        self.assertEqual(runs[0].transfer_response, (None, "refused"))
+
+    @patch("aind_watchdog_service.run_job.RunJob.move_manifest_to_archive")
+    @patch("requests.post")
+    def test_copy_error_fails_member(
+        self, mock_post: MagicMock, mock_move_mani: MagicMock
+    ):
+        """Test an error raised by one member's copy fails only that member"""
+        response = requests.Response()
+        response.status_code = 200
+        mock_post.return_value = response
+        batch = BatchJob(self.watch_config)
+        runs = [RunJob("m.yml", config, self.watch_config) for config in self.configs]
+        for index, run in enumerate(runs):
+            batch.add(f"manifest_{index}.yml", run)
+        copy_in_slot = RunJob._copy_in_slot
+
+        def raise_first(run: RunJob, sources: list, dests: list) -> bool:
+            """Raise while copying the first session"""
+            if run is runs[0]:
+                raise PermissionError("denied")
+            return copy_in_slot(run, sources, dests)
+
+        with patch.object(RunJob, "_copy_in_slot", raise_first):
+            with self.assertLogs(level="ERROR") as logs:
+                batch.run()
+        self.assertEqual([run.control.state for run in runs], ["failed", "succeeded"])
+        self.assertTrue(any("denied" in line for line in logs.output))
+        self.assertEqual(len(mock_post.call_args.kwargs["json"]["upload_jobs"]), 1)
+
+    @patch("aind_watchdog_service.run_job.RunJob.move_manifest_to_archive")
+    @patch("requests.post")
+    def test_plan_error_fails_member(
+        self, mock_post: MagicMock, mock_move_mani: MagicMock
+    ):
+        """Test members wait for their sources together and an error raised
+        while planning one member fails only that member"""
+        response = requests.Response()
+        response.status_code = 200
+        mock_post.return_value = response
+        batch = BatchJob(self.watch_config)
+        runs = [RunJob("m.yml", config, self.watch_config) for config in self.configs]
+        for index, run in enumerate(runs):
+            batch.add(f"manifest_{index}.yml", run)
+        # Only returns if both members wait at the same time
+        barrier = threading.Barrier(len(runs), timeout=5)
+        plan_copy = RunJob._plan_copy
+
+        def raise_first(run: RunJob):
+            """Raise while planning the first session"""
+            if run is runs[0]:
+                raise FileNotFoundError("gone")
+            return plan_copy(run)
+
+        wait = patch.object(
+            RunJob, "wait_for_sources", lambda run: barrier.wait() is not None
+        )
+        plan = patch.object(RunJob, "_plan_copy", raise_first)
+        with wait, plan, self.assertLogs(level="ERROR") as logs:
+            batch.run()
+        self.assertEqual([run.control.state for run in runs], ["failed", "succeeded"])
+        self.assertTrue(any("gone" in line for line in logs.output))
+        self.assertEqual(len(mock_post.call_args.kwargs["json"]["upload_jobs"]), 1)
+
+    @patch.object(HealthMonitor, "hold", return_value=None)
+    @patch.object(HealthMonitor, "trip", return_value=True)
+    @patch("aind_watchdog_service.run_job.RunJob.move_manifest_to_archive")
+    @patch("requests.post")
+    def test_replay_on_outage(
+        self,
+        mock_post: MagicMock,
+        mock_move_mani: MagicMock,
+        mock_trip: MagicMock,
+        mock_hold: MagicMock,
+    ):
+        """Test a member whose copy failed during an outage is copied again on
+        its own and a failed submission is sent again once the target is up"""
+        response = requests.Response()
+        response.status_code = 200
+        mock_post.side_effect = [requests.ConnectionError("refused"), response]
+        watch_config = self.watch_config.model_copy(
+            update={"health": HealthConfig(max_replays=2)}
+        )
+        batch = BatchJob(watch_config)
+        runs = [RunJob("m.yml", config, watch_config) for config in self.configs]
+        for index, run in enumerate(runs):
+            batch.add(f"manifest_{index}.yml", run)
+        copy_in_slot = RunJob._copy_in_slot
+        failures = [runs[0]]
+
+        def fail_first(run: RunJob, sources: list, dests: list) -> bool:
+            """Fail the first copy of the first session"""
+            if run in failures:
+                failures.remove(run)
+                return False
+            return copy_in_slot(run, sources, dests)
+
+        with patch.object(RunJob, "_copy_in_slot", fail_first):
+            with self.assertLogs(level="WARNING"):
+                batch.run()
+        self.assertEqual([run.control.state for run in runs], ["succeeded"] * 2)
+        self.assertEqual(mock_post.call_count, 2)
+        self.assertEqual(
+            len(mock_post.call_args.kwargs["json"]["upload_jobs"]), len(runs)
+        )
+        staged = Path(self.tmp.name) / "vast" / "session_0" / "behavior"
+        self.assertTrue((staged / "frames_0.bin").exists())
+
+
+class TestEventHandlerBatch(unittest.TestCase):
+    """Test jobs sharing a trigger time are batched by the event handler"""
+
+    @patch.object(EventHandler, "_startup_manifest_check")
+    def test_schedule_batch(self, mock_startup_manifest_check: MagicMock):
+        """Test one scheduler job runs every manifest of a trigger time"""
+        with open(TEST_DIRECTORY / "resources" / "watch_config.yml") as yam:
+            watch_config = WatchConfig(**yaml.safe_load(yam)).model_copy(
+                update={"batch_scheduled_jobs": True}
+            )
+        with open(TEST_DIRECTORY / "resources" / "manifest.yml") as yam:
+            manifest_config = ManifestConfig(**yaml.safe_load(yam)).model_copy(
+                update={"schedule_time": datetime.time(3, 0)}
+            )
+        scheduler = MagicMock()
+        event_handler = EventHandler(scheduler, watch_config)
+        for path in ("a_manifest.yml", "b_manifest.yml"):
+            event_handler.schedule_job(path, manifest_config)
+        scheduler.add_job.assert_called_once()
+        batch = next(iter(event_handler.batches.values()))
+        self.assertEqual(sorted(batch.members), ["a_manifest.yml", "b_manifest.yml"])
+        self.assertEqual(scheduler.add_job.call_args.args[0], batch.run)
+
+        event_handler.on_deleted(FileDeletedEvent("a_manifest.yml"))
+        self.assertEqual(list(batch.members), ["b_manifest.yml"])
+        scheduler.remove_job.assert_not_called()
+        event_handler.on_deleted(FileDeletedEvent("b_manifest.yml"))
+        scheduler.remove_job.assert_called_once()
+
+        batch.started = True
+        event_handler.schedule_job("c_manifest.yml", manifest_config)
+        self.assertEqual(scheduler.add_job.call_count, 2)
+
+    @patch.object(EventHandler, "_startup_manifest_check")
+    def test_cancel_member(self, mock_startup_manifest_check: MagicMock):
+        """Test members have their own ids and cancelling one leaves the others
+        in the batch"""
+        with open(TEST_DIRECTORY / "resources" / "watch_config.yml") as yam:
+            watch_config = WatchConfig(**yaml.safe_load(yam)).model_copy(
+                update={"batch_scheduled_jobs": True}
+            )
+        with open(TEST_DIRECTORY / "resources" / "manifest.yml") as yam:
+            manifest_config = ManifestConfig(**yaml.safe_load(yam)).model_copy(
+                update={"schedule_time": datetime.time(3, 0)}
+            )
+        scheduler = MagicMock()
+        event_handler = EventHandler(scheduler, watch_config)
+        for path in ("a_manifest.yml", "b_manifest.yml"):
+            event_handler.schedule_job(path, manifest_config)
+        runs = event_handler.runs
+        self.assertNotEqual(runs["a_manifest.yml"].job_id, runs["b_manifest.yml"].job_id)
+
+        server = StatusServer(event_handler, port=0)
+        status, _ = server.act(runs["a_manifest.yml"].job_id, "cancel", {})
+        self.assertEqual(status, 200)
+        batch = next(iter(event_handler.batches.values()))
+        self.assertEqual(list(batch.members), ["b_manifest.yml"])
+        self.assertEqual(runs["a_manifest.yml"].control.state, "cancelled")
+        self.assertEqual(runs["b_manifest.yml"].control.state, "pending")
+        scheduler.remove_job.assert_not_called()
+        status, _ = server.act(runs["b_manifest.yml"].job_id, "priority", {})
+        self.assertEqual(status, 409)
+
+        server.act(runs["b_manifest.yml"].job_id, "cancel", {})
+        scheduler.remove_job.assert_called_once_with(batch.job.id)
+
+
+if __name__ == "__main__":
+    unittest.main()
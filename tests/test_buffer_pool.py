@@ -0,0 +1,58 @@
+"""Test the shared copy buffer pool"""
+
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from aind_watchdog_service import buffer_pool, copy_engine
+
+
+class TestBufferPool(unittest.TestCase):
+    """Test BufferPool"""
+
+    def test_ceiling(self):
+        """Test the pool never lends more buffers than fit in its memory"""
+        pool = buffer_pool.BufferPool(1000, 3 * buffer_pool.ALIGNMENT)
+        self.assertEqual(pool.buffer_size, buffer_pool.ALIGNMENT)
+        self.assertEqual(pool.capacity, 3)
+        buffers = [pool.acquire() for _ in range(3)]
+        acquired = threading.Event()
+
+        def worker():
+            pool.release(pool.acquire())
+            acquired.set()
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        self.assertFalse(acquired.wait(0.2))
+        pool.release(buffers.pop())
+        self.assertTrue(acquired.wait(5))
+        thread.join()
+        for buffer in buffers:
+            pool.release(buffer)
+        self.assertEqual(pool.available, 3)
+
+    def test_shared_pool(self):
+        """Test jobs with the same settings share one pool"""
+        pool = buffer_pool.shared_pool(4096, 1024 * 1024)
+        self.assertIs(buffer_pool.shared_pool(4096, 1024 * 1024), pool)
+        self.assertIsNot(buffer_pool.shared_pool(4096, 2 * 1024 * 1024), pool)
+
+    def test_copy_with_pool(self):
+        """Test copies borrow and return buffers, with and without direct reads"""
+        with tempfile.TemporaryDirectory() as tmp:
+            src = Path(tmp) / "data.bin"
+            src.write_bytes(bytes(range(256)) * 1000)
+            for direct in (False, True):
+                pool = buffer_pool.BufferPool(64 * 1024, 128 * 1024, direct=direct)
+                dest = Path(tmp) / f"dest_{direct}"
+                dest.mkdir()
+                copied = copy_engine.copy_file(str(src), str(dest), pool=pool)
+                self.assertEqual(copied, 256_000)
+                self.assertEqual((dest / "data.bin").read_bytes(), src.read_bytes())
+                self.assertEqual(pool.available, pool.capacity)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+"""Test streaming compression"""
+
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from aind_watchdog_service import compression
+
+
+@unittest.skipUnless(compression.available(), "zstandard is not installed")
+class TestCompression(unittest.TestCase):
+    """Test compressed copies"""
+
+    def test_tee_compressed_file(self):
+        """Test compressible files are staged as .zst in every destination"""
+        with tempfile.TemporaryDirectory() as tmp:
+            src = Path(tmp) / "log.csv"
+            src.write_bytes(b"trial,reward,lick\n" * 50_000)
+            dests = [Path(tmp) / "a", Path(tmp) / "b"]
+            for dest in dests:
+                dest.mkdir()
+            stats = compression.CompressionStats()
+            read = []
+            copied, errors = compression.tee_compressed_file(
+                str(src),
+                [str(dest) for dest in dests],
+                stats=stats,
+                chunk_size=64 * 1024,
+                progress=read.append,
+            )
+            self.assertEqual(copied, src.stat().st_size)
+            self.assertEqual(sum(read), copied)
+            self.assertEqual(errors, {str(dest): None for dest in dests})
+            for dest in dests:
+                staged = dest / "log.csv.zst"
+                with open(staged, "rb") as f:
+                    data = (
+                        compression.zstandard.ZstdDecompressor().stream_reader(f).read()
+                    )
+                self.assertEqual(data, src.read_bytes())
+                self.assertEqual(staged.stat().st_mtime_ns, src.stat().st_mtime_ns)
+            snapshot = stats.snapshot()
+            self.assertEqual(snapshot["files_compressed"], 1)
+            self.assertGreater(snapshot["compression_ratio"], 10)
+            self.assertEqual(stats.bytes_in, copied)
+
+    def test_incompressible_skipped(self):
+        """Test files failing the probe are copied unchanged"""
+        with tempfile.TemporaryDirectory() as tmp:
+            src = Path(tmp) / "frames"
+            (src / "sub").mkdir(parents=True)
+            (src / "sub" / "noise.bin").write_bytes(os.urandom(200_000))
+            (src / "meta.json").write_text('{"frames": 1}' * 1000)
+            dest = Path(tmp) / "dest"
+            dest.mkdir()
+            stats = compression.CompressionStats()
+            _, errors = compression.tee_compressed_tree(
+                str(src), [str(dest)], stats=stats
+            )
+            self.assertIsNone(errors[str(dest)])
+            self.assertEqual(
+                (dest / "sub" / "noise.bin").read_bytes(),
+                (src / "sub" / "noise.bin").read_bytes(),
+            )
+            self.assertTrue((dest / "meta.json.zst").exists())
+            self.assertEqual(stats.files_skipped, 1)
+            self.assertEqual(stats.files_compressed, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
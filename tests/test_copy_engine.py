@@ -0,0 +1,188 @@
+"""Test the in-process copy engine"""
+
+import errno
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+from aind_watchdog_service import copy_engine
+
+
+class TestCopyEngine(unittest.TestCase):
+    """Test the chunked copy engine"""
+
+    def test_copy_tree(self):
+        """Test files and subdirectories are copied with mtimes"""
+        with tempfile.TemporaryDirectory() as tmp:
+            src = Path(tmp) / "src"
+            (src / "sub").mkdir(parents=True)
+            (src / "a.bin").write_bytes(b"a" * 100)
+            (src / "sub" / "b.bin").write_bytes(b"b" * 10)
+            dest = Path(tmp) / "dest"
+            dest.mkdir()
+            checkpoints = []
+            copied = copy_engine.copy_tree(
+                str(src),
+                str(dest),
+                checkpoint=lambda: checkpoints.append(1),
+                chunk_size=32,
+            )
+            self.assertEqual(copied, 110)
+            self.assertEqual((dest / "sub" / "b.bin").read_bytes(), b"b" * 10)
+            self.assertEqual(
+                (dest / "a.bin").stat().st_mtime_ns, (src / "a.bin").stat().st_mtime_ns
+            )
+            self.assertGreater(len(checkpoints), 4)
+
+    def test_tee_file(self):
+        """Test one read is written to every destination"""
+        with tempfile.TemporaryDirectory() as tmp:
+            src = Path(tmp) / "data.bin"
+            src.write_bytes(b"x" * 1000)
+            dests = [Path(tmp) / "a", Path(tmp) / "b"]
+            for dest in dests:
+                dest.mkdir()
+            progress = []
+            copied, errors = copy_engine.tee_file(
+                str(src),
+                [str(d) for d in dests],
+                chunk_size=100,
+                progress=progress.append,
+            )
+            self.assertEqual(copied, 1000)
+            self.assertEqual(sum(progress), 1000)
+            self.assertTrue(all(error is None for error in errors.values()))
+            for dest in dests:
+                self.assertEqual((dest / "data.bin").read_bytes(), b"x" * 1000)
+
+    def test_tee_skip_identical(self):
+        """Test destinations already holding the same file are not rewritten"""
+        with tempfile.TemporaryDirectory() as tmp:
+            src = Path(tmp) / "data.bin"
+            src.write_bytes(b"x" * 1000)
+            staged, stale = Path(tmp) / "staged", Path(tmp) / "stale"
+            for dest in (staged, stale):
+                dest.mkdir()
+            copy_engine.copy_file(str(src), str(staged))
+            (stale / "data.bin").write_bytes(b"x" * 10)
+            copied, errors = copy_engine.tee_file(
+                str(src), [str(staged), str(stale)], skip_identical=True
+            )
+            self.assertEqual(copied, 1000)
+            self.assertEqual(errors, {str(staged): None, str(stale): None})
+            self.assertTrue(copy_engine.is_identical(str(src), str(stale / "data.bin")))
+            copied, _ = copy_engine.tee_file(
+                str(src), [str(staged), str(stale)], skip_identical=True
+            )
+            self.assertEqual(copied, 0)
+
+    def test_tee_failed_destination(self):
+        """Test a failing destination does not stop the others"""
+        with tempfile.TemporaryDirectory() as tmp:
+            src = Path(tmp) / "src"
+            src.mkdir()
+            (src / "data.bin").write_bytes(b"x" * 10)
+            good = Path(tmp) / "good"
+            good.mkdir()
+            # A file where a directory is expected makes the destination fail
+            bad = Path(tmp) / "bad"
+            bad.write_bytes(b"")
+            _, errors = copy_engine.tee_tree(str(src), [str(good), str(bad)])
+            self.assertIsNone(errors[str(good)])
+            self.assertIsNotNone(errors[str(bad)])
+            self.assertEqual((good / "data.bin").read_bytes(), b"x" * 10)
+            with self.assertRaises(OSError):
+                copy_engine.copy_tree(str(src), str(bad))
+
+
+class TestLinkPath(unittest.TestCase):
+    """Test staging with reflinks and hard links"""
+
+    def setUp(self) -> None:
+        """Create a source directory"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.src = Path(self.tmp.name) / "src"
+        (self.src / "sub").mkdir(parents=True)
+        (self.src / "a.bin").write_bytes(b"a" * 100)
+        (self.src / "sub" / "b.bin").write_bytes(b"b" * 10)
+        self.dest = Path(self.tmp.name) / "dest"
+
+    def tearDown(self) -> None:
+        """Remove the files"""
+        self.tmp.cleanup()
+
+    def test_reflink(self):
+        """Test files are cloned with FICLONE and keep their mtimes"""
+        fcntl = MagicMock()
+        with patch.object(copy_engine, "fcntl", fcntl):
+            nbytes = copy_engine.link_path(str(self.src), str(self.dest))
+        self.assertEqual(nbytes, 110)
+        self.assertEqual(fcntl.ioctl.call_count, 2)
+        self.assertEqual(fcntl.ioctl.call_args.args[1], copy_engine.FICLONE)
+        self.assertEqual(
+            (self.dest / "a.bin").stat().st_mtime_ns,
+            (self.src / "a.bin").stat().st_mtime_ns,
+        )
+        self.assertFalse(os.path.samefile(self.dest / "a.bin", self.src / "a.bin"))
+
+    def test_unsupported(self):
+        """Test a filesystem without reflinks leaves nothing behind"""
+        fcntl = MagicMock()
+        fcntl.ioctl.side_effect = OSError(errno.EOPNOTSUPP, "not supported")
+        with patch.object(copy_engine, "fcntl", fcntl):
+            self.assertIsNone(copy_engine.link_path(str(self.src), str(self.dest)))
+            self.assertEqual(
+                [path for path in self.dest.rglob("*") if path.is_file()], []
+            )
+            self.assertEqual(
+                copy_engine.link_path(str(self.src), str(self.dest), hardlink=True),
+                110,
+            )
+        self.assertTrue(
+            os.path.samefile(self.dest / "sub" / "b.bin", self.src / "sub" / "b.bin")
+        )
+
+    def test_failed_clone_keeps_staged_file(self):
+        """Test a clone that fails leaves a file already staged in place"""
+        (self.dest / "sub").mkdir(parents=True)
+        (self.dest / "a.bin").write_bytes(b"staged")
+        fcntl = MagicMock()
+        fcntl.ioctl.side_effect = OSError(errno.EOPNOTSUPP, "not supported")
+        with patch.object(copy_engine, "fcntl", fcntl):
+            self.assertIsNone(copy_engine.link_path(str(self.src), str(self.dest)))
+        self.assertEqual((self.dest / "a.bin").read_bytes(), b"staged")
+        self.assertEqual(sorted(os.listdir(self.dest)), ["a.bin", "sub"])
+
+    def test_other_device(self):
+        """Test destinations on another device are not linked"""
+        self.dest.mkdir()
+        real_stat = os.stat
+
+        def stat(path, *args, **kwargs):
+            """Report the destination on its own device"""
+            result = real_stat(path, *args, **kwargs)
+            if Path(path) != self.dest:
+                return result
+            values = list(result)
+            values[2] += 1  # st_dev
+            return os.stat_result(values)
+
+        with patch.object(copy_engine.os, "stat", side_effect=stat):
+            self.assertIsNone(copy_engine.link_path(str(self.src), str(self.dest)))
+        self.assertEqual(list(self.dest.iterdir()), [])
+
+    def test_copy_breaks_hardlink(self):
+        """Test copying over a hard linked destination leaves its source intact"""
+        self.dest.mkdir()
+        os.link(self.src / "a.bin", self.dest / "a.bin")
+        other = Path(self.tmp.name) / "a.bin"
+        other.write_bytes(b"new")
+        copy_engine.copy_file(str(other), str(self.dest))
+        self.assertEqual((self.dest / "a.bin").read_bytes(), b"new")
+        self.assertEqual((self.src / "a.bin").read_bytes(), b"a" * 100)
+
+
+if __name__ == "__main__":
+    unittest.main()
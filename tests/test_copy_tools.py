@@ -0,0 +1,126 @@
+"""Test the copy_tools module"""
+
+import os
+import subprocess
+import unittest
+from pathlib import Path
+
+from aind_watchdog_service import copy_tools
+from aind_watchdog_service.models.watch_config import RobocopyProfile
+
+RESOURCES = Path(__file__).resolve().parent / "resources"
+
+RSYNC_STDERR = b"""rsync: [sender] send_files failed to open "/data/session/b.tiff": \
+Permission denied (13)
+rsync error: some files/attrs were not transferred (see previous errors) (code 23)
+"""
+
+ROBOCOPY_STDOUT = b"""\
+-------------------------------------------------------------------------------
+   ROBOCOPY     ::     Robust File Copy for Windows
+-------------------------------------------------------------------------------
+  Source : D:\\data\\session\\
+    Dest : \\\\vast\\staging\\behavior\\
+\t    New File  \t\t    4096\ta.tiff
+2024/01/01 12:00:00 ERROR 32 (0x00000020) Copying File D:\\data\\session\\b.tiff
+The process cannot access the file because it is being used by another process.
+"""
+
+
+class TestCopyTools(unittest.TestCase):
+    """Test command line grouping and failure attribution"""
+
+    def test_chunk_files(self):
+        """Test groups stay under the character budget in order"""
+        files = [f"/data/file_{number}.bin" for number in range(5)]
+        groups = copy_tools.chunk_files(files, max_chars=30)
+        self.assertEqual(sum(groups, []), files)
+        self.assertEqual([len(group) for group in groups], [2, 2, 1])
+        self.assertEqual(copy_tools.chunk_files([]), [])
+
+    def test_files_from(self):
+        """Test the list file is NUL separated and removed afterwards"""
+        with copy_tools.files_from(["a.bin", "b c.bin"]) as path:
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(), b"a.bin\0b c.bin")
+        self.assertFalse(os.path.exists(path))
+
+    def test_rsync_failed_files(self):
+        """Test rsync errors are attributed to the named files"""
+        names = ["a.tiff", "b.tiff"]
+        run = subprocess.CompletedProcess([], 23, b"", RSYNC_STDERR)
+        self.assertEqual(copy_tools.rsync_failed_files(run, names), {"b.tiff"})
+        run = subprocess.CompletedProcess([], 0, b"", b"")
+        self.assertEqual(copy_tools.rsync_failed_files(run, names), set())
+        run = subprocess.CompletedProcess([], 12, b"", b"rsync error: protocol")
+        self.assertEqual(copy_tools.rsync_failed_files(run, names), set(names))
+
+    def test_robocopy_failed_files(self):
+        """Test robocopy errors are attributed to the named files"""
+        names = ["a.tiff", "b.tiff"]
+        run = subprocess.CompletedProcess([], 9, ROBOCOPY_STDOUT, b"")
+        self.assertEqual(copy_tools.robocopy_failed_files(run, names), {"b.tiff"})
+        run = subprocess.CompletedProcess([], 1, ROBOCOPY_STDOUT, b"")
+        self.assertEqual(copy_tools.robocopy_failed_files(run, names), set())
+        run = subprocess.CompletedProcess([], 16, b"", b"")
+        self.assertEqual(copy_tools.robocopy_failed_files(run, names), set(names))
+
+
+class TestRobocopySummary(unittest.TestCase):
+    """Test robocopy profiles and job summary parsing"""
+
+    def test_profile_options(self):
+        """Test profiles map to robocopy options"""
+        self.assertEqual(RobocopyProfile().options(), ["/j", "/r:5"])
+        self.assertEqual(RobocopyProfile().options(directory=True), ["/z", "/j", "/r:5"])
+        profile = RobocopyProfile(threads=8, restartable=False, retries=1, wait_s=2)
+        self.assertEqual(
+            profile.options(directory=True, report=True),
+            ["/mt:8", "/j", "/r:1", "/w:2", "/np", "/bytes"],
+        )
+
+    def test_parse_file(self):
+        """Test the summary of a single file copy"""
+        summary = copy_tools.parse_robocopy_summary(
+            (RESOURCES / "robocopy_file.txt").read_bytes()
+        )
+        self.assertEqual(
+            summary,
+            copy_tools.RobocopySummary(1, 0, 0, 10485760, 0, 0, 218453333),
+        )
+
+    def test_parse_multithreaded_failure(self):
+        """Test a /MT summary with skipped and failed files and separators"""
+        summary = copy_tools.parse_robocopy_summary(
+            (RESOURCES / "robocopy_mt_failed.txt").read_bytes()
+        )
+        self.assertEqual((summary.files_copied, summary.files_skipped), (2, 1))
+        self.assertEqual(summary.files_failed, 1)
+        self.assertEqual(summary.bytes_copied, 4294967296)
+        self.assertEqual(summary.bytes_failed, 2147483648)
+        self.assertEqual(summary.bytes_per_s, 429496729)
+
+    def test_parse_units(self):
+        """Test sizes printed without /BYTES and a summary without speed"""
+        summary = copy_tools.parse_robocopy_summary(
+            (RESOURCES / "robocopy_units.txt").read_bytes()
+        )
+        self.assertEqual(summary.bytes_copied, 1610612736)
+        self.assertIsNone(summary.bytes_per_s)
+        self.assertIsNone(copy_tools.parse_robocopy_summary(b"ERROR : Invalid"))
+        self.assertIsNone(copy_tools.parse_robocopy_summary(None))
+
+    def test_stats(self):
+        """Test runs are totalled into job throughput"""
+        stats = copy_tools.RobocopyStats()
+        stats.add(copy_tools.RobocopySummary(1, 0, 0, 100_000_000, 0, 0, 50_000_000))
+        stats.add(copy_tools.RobocopySummary(3, 1, 1, 200_000_000, 10, 5, 100_000_000))
+        snapshot = stats.snapshot()
+        self.assertEqual(snapshot["robocopy_runs"], 2)
+        self.assertEqual(snapshot["robocopy_files_copied"], 4)
+        self.assertEqual(snapshot["robocopy_files_failed"], 1)
+        self.assertEqual(snapshot["robocopy_mbps"], 75.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
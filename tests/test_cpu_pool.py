@@ -0,0 +1,35 @@
+"""Test the CPU worker process pool"""
+
+import os
+import unittest
+import zlib
+
+from aind_watchdog_service import cpu_pool
+
+
+class TestCpuPool(unittest.TestCase):
+    """Test CpuPool"""
+
+    def test_run_and_recycle(self):
+        """Test tasks run in worker processes that are recycled"""
+        pool = cpu_pool.CpuPool(workers=1, max_tasks_per_child=1)
+        data = b"abc" * 100_000
+        try:
+            first = pool.run(zlib.crc32, data)
+            second = pool.run(zlib.crc32, data)
+        finally:
+            pool.shutdown()
+        expected = zlib.crc32(data)
+        self.assertEqual(first.value, expected)
+        self.assertEqual(second.value, expected)
+        self.assertNotEqual(first.pid, os.getpid())
+        self.assertNotEqual(first.pid, second.pid)
+        self.assertEqual(set(pool.cpu_seconds), {first.pid, second.pid})
+
+    def test_shared_pool_disabled(self):
+        """Test no pool is started without workers"""
+        self.assertIsNone(cpu_pool.shared_cpu_pool(0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,14 +1,18 @@
 """Test EventHandler constructor."""
 
+import os
+import tempfile
+import time
 import unittest
 from datetime import datetime as dt
 from datetime import timedelta
 from pathlib import Path
 from unittest.mock import MagicMock, patch
 
+import apscheduler
 import yaml
 from apscheduler.schedulers.background import BackgroundScheduler
-from watchdog.events import FileCreatedEvent
+from watchdog.events import FileCreatedEvent, FileDeletedEvent
 
 from aind_watchdog_service.event_handler import EventHandler
 from aind_watchdog_service.models.manifest_config import ManifestConfig
@@ -124,6 +128,150 @@ class TestEventHandler(unittest.TestCase):
                 )
                 self.assertEqual(trigger_time, date_now + timedelta(minutes=1))
 
+    @patch.object(EventHandler, "_startup_manifest_check")
+    def test_delete_running_job(self, mock_startup_manifest_check: MagicMock):
+        """Deleting the manifest of a running job cancels it"""
+        scheduler = MagicMock()
+        event_handler = EventHandler(scheduler, WatchConfig(**self.config))
+        event_handler.schedule_job(
+            "/path/to/manifest.yml", ManifestConfig(**self.manifest_config)
+        )
+        run = event_handler.runs["/path/to/manifest.yml"]
+        run.control.state = "running"
+        scheduler.remove_job.side_effect = apscheduler.jobstores.base.JobLookupError(
+            "1234"
+        )
+        event_handler.on_deleted(FileDeletedEvent("/path/to/manifest.yml"))
+        self.assertTrue(run.control.cancelled)
+        self.assertNotIn("/path/to/manifest.yml", event_handler.jobs)
+
+    @patch.object(EventHandler, "_startup_manifest_check")
+    def test_duplicate_manifest(self, mock_startup_manifest_check: MagicMock):
+        """Manifests whose name was already archived are flagged or skipped"""
+        manifest_config = ManifestConfig(**self.manifest_config)
+        with tempfile.TemporaryDirectory() as tmp:
+            manifest = Path(tmp) / "manifest.yml"
+            manifest.write_text("name: session")
+            watch_config = WatchConfig(**self.config).model_copy(
+                update={"manifest_complete": tmp}
+            )
+            scheduler = MagicMock()
+            event_handler = EventHandler(scheduler, watch_config)
+            event_handler.archive.add(manifest_config.name, str(manifest), None)
+            with self.assertLogs(level="WARNING") as logs:
+                event_handler.schedule_job(str(manifest), manifest_config)
+            self.assertIn("Manifest name already submitted", logs.output[0])
+            scheduler.add_job.assert_called_once()
+
+            event_handler = EventHandler(
+                scheduler,
+                watch_config.model_copy(update={"duplicate_manifests": "skip"}),
+            )
+            with self.assertLogs(level="WARNING"):
+                event_handler.schedule_job(str(manifest), manifest_config)
+            scheduler.add_job.assert_called_once()
+            self.assertNotIn(str(manifest), event_handler.jobs)
+
+    @patch("aind_watchdog_service.event_handler.EventHandler.schedule_job")
+    def test_startup_ingestion(self, mock_schedule_job: MagicMock):
+        """Manifests present at startup are scheduled in the background, oldest
+        or smallest first"""
+        with tempfile.TemporaryDirectory() as tmp:
+            now = time.time()
+            for number, size in enumerate([30, 10, 20]):
+                manifest = Path(tmp) / f"manifest_{number}.yml"
+                manifest.write_text(
+                    yaml.safe_dump(self.manifest_config) + "#" * size * 100
+                )
+                os.utime(manifest, (now - 60 * number, now - 60 * number))
+            (Path(tmp) / "notes.txt").write_text("")
+            # A manifest that cannot be read is skipped
+            os.symlink(Path(tmp) / "removed.yml", Path(tmp) / "manifest_3.yml")
+            watch_config = WatchConfig(**self.config).model_copy(
+                update={"flag_dir": tmp, "manifest_complete": tmp, "startup_workers": 1}
+            )
+            with self.assertLogs(level="INFO") as logs:
+                event_handler = EventHandler(MagicMock(), watch_config)
+                event_handler.startup_thread.join(10)
+            scheduled = [Path(call.args[0]).name for call in mock_schedule_job.mock_calls]
+            self.assertEqual(
+                scheduled, ["manifest_2.yml", "manifest_1.yml", "manifest_0.yml"]
+            )
+            self.assertIn("manifest_3.yml", logs.output[0])
+            self.assertIn("'Manifests': 3", logs.output[-1])
+
+            mock_schedule_job.reset_mock()
+            with self.assertLogs(level="INFO") as logs:
+                event_handler = EventHandler(
+                    MagicMock(),
+                    watch_config.model_copy(update={"startup_order": "smallest"}),
+                )
+                event_handler.startup_thread.join(10)
+            scheduled = [Path(call.args[0]).name for call in mock_schedule_job.mock_calls]
+            self.assertEqual(
+                scheduled, ["manifest_1.yml", "manifest_2.yml", "manifest_0.yml"]
+            )
+            self.assertIn("'Oldest_age_s': 120", logs.output[-1])
+
+    def test_startup_ingestion_skips_live_jobs(self):
+        """A manifest already scheduled by a live event is not scheduled again"""
+        with tempfile.TemporaryDirectory() as tmp:
+            manifest = Path(tmp) / "manifest.yml"
+            manifest.write_text(yaml.safe_dump(self.manifest_config))
+            watch_config = WatchConfig(**self.config).model_copy(
+                update={"flag_dir": tmp, "manifest_complete": tmp}
+            )
+            scheduler = MagicMock()
+            with patch.object(EventHandler, "_startup_manifest_check"):
+                event_handler = EventHandler(scheduler, watch_config)
+            event_handler.jobs[str(manifest)] = MagicMock()
+            self.assertFalse(event_handler._ingest(str(manifest)))
+            scheduler.add_job.assert_not_called()
+            del event_handler.jobs[str(manifest)]
+            self.assertTrue(event_handler._ingest(str(manifest)))
+            scheduler.add_job.assert_called_once()
+
+    @patch("time.sleep")
+    def test_live_event_skips_ingested_job(self, mock_sleep: MagicMock):
+        """A manifest ingested while its live event waits is not scheduled twice"""
+        with tempfile.TemporaryDirectory() as tmp:
+            manifest = Path(tmp) / "manifest.yml"
+            manifest.write_text(yaml.safe_dump(self.manifest_config))
+            watch_config = WatchConfig(**self.config).model_copy(
+                update={"flag_dir": tmp, "manifest_complete": tmp}
+            )
+            scheduler = MagicMock()
+            with patch.object(EventHandler, "_startup_manifest_check"):
+                event_handler = EventHandler(scheduler, watch_config)
+            # Startup ingestion schedules the manifest during the event's sleep
+            mock_sleep.side_effect = lambda _: event_handler._ingest(str(manifest))
+            with self.assertLogs(level="INFO") as logs:
+                event_handler.on_created(FileCreatedEvent(str(manifest)))
+            scheduler.add_job.assert_called_once()
+            self.assertEqual(list(event_handler.jobs), [str(manifest)])
+            self.assertIn("is already scheduled", logs.output[-1])
+
+    @patch("time.sleep")
+    def test_mirror_named_manifest(self, mock_sleep: MagicMock):
+        """A manifest whose name contains mirror is scheduled when mirroring is
+        not configured"""
+        with tempfile.TemporaryDirectory() as tmp:
+            manifest = Path(tmp) / "mirror_rig_manifest.yml"
+            manifest.write_text(yaml.safe_dump(self.manifest_config))
+            watch_config = WatchConfig(**self.config).model_copy(
+                update={"flag_dir": tmp, "manifest_complete": tmp}
+            )
+            scheduler = MagicMock()
+            with patch.object(EventHandler, "_startup_manifest_check"):
+                event_handler = EventHandler(scheduler, watch_config)
+            self.assertEqual(
+                [entry.name for entry in event_handler._backlog()], [manifest.name]
+            )
+            with self.assertLogs(level="INFO"):
+                event_handler.on_created(FileCreatedEvent(str(manifest)))
+            scheduler.add_job.assert_called_once()
+            self.assertEqual(event_handler.mirrors, {})
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,213 @@
+"""Test health probes, circuit breakers and job replay"""
+
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import requests
+import yaml
+
+from aind_watchdog_service import health
+from aind_watchdog_service.health import CircuitBreaker, HealthMonitor
+from aind_watchdog_service.models.manifest_config import ManifestConfig
+from aind_watchdog_service.models.watch_config import HealthConfig, WatchConfig
+from aind_watchdog_service.run_job import RunJob
+
+TEST_DIRECTORY = Path(__file__).resolve().parent
+
+
+class TestProbes(unittest.TestCase):
+    """Test destination and endpoint probes"""
+
+    def test_probe_path(self):
+        """Test existing directories are healthy"""
+        with tempfile.TemporaryDirectory() as tmp:
+            self.assertTrue(health.probe_path(tmp, 1))
+            self.assertFalse(health.probe_path(str(Path(tmp) / "missing"), 1))
+
+    @patch("os.path.isdir", side_effect=lambda path: time.sleep(2))
+    def test_probe_path_hung(self, _: MagicMock):
+        """Test a share that does not answer is down after the timeout"""
+        start = time.monotonic()
+        self.assertFalse(health.probe_path("//vast/share", 0.1))
+        self.assertLess(time.monotonic() - start, 1)
+
+    @patch("requests.head")
+    def test_probe_endpoint(self, mock_head: MagicMock):
+        """Test only server errors and connection failures are down"""
+        mock_head.return_value = MagicMock(status_code=405)
+        self.assertTrue(health.probe_endpoint("http://service/api/submit_jobs", 1))
+        mock_head.return_value = MagicMock(status_code=503)
+        self.assertFalse(health.probe_endpoint("http://service/api/submit_jobs", 1))
+        mock_head.side_effect = requests.ConnectionError()
+        self.assertFalse(health.probe_endpoint("http://service/api/submit_jobs", 1))
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """Test opening, recovery and controlled replay"""
+
+    def test_trip_and_recover(self):
+        """Test the breaker opens on a failed probe and closes on recovery"""
+        probe = MagicMock(return_value=False)
+        breaker = CircuitBreaker("//vast", probe, probe_interval_s=0, replay_interval_s=0)
+        self.assertIsNotNone(breaker.release_time())
+        with self.assertLogs(level="WARNING"):
+            self.assertTrue(breaker.trip())
+        self.assertTrue(breaker.open)
+        self.assertIsNone(breaker.release_time())
+        probe.return_value = True
+        self.assertIsNotNone(breaker.release_time())
+        self.assertFalse(breaker.open)
+
+    def test_probe_interval(self):
+        """Test an open breaker is probed at most once per interval"""
+        probe = MagicMock(return_value=False)
+        breaker = CircuitBreaker(
+            "//vast", probe, probe_interval_s=60, replay_interval_s=0
+        )
+        with self.assertLogs(level="WARNING"):
+            breaker.trip()
+        for _ in range(5):
+            self.assertIsNone(breaker.release_time())
+        self.assertEqual(probe.call_count, 1)
+
+    def test_replay_rate(self):
+        """Test held jobs are released one replay interval apart"""
+        probe = MagicMock(return_value=False)
+        breaker = CircuitBreaker("//vast", probe, probe_interval_s=0, replay_interval_s=5)
+        with self.assertLogs(level="WARNING"):
+            breaker.trip()
+        probe.return_value = True
+        releases = [breaker.release_time() for _ in range(3)]
+        self.assertAlmostEqual(releases[1] - releases[0], 5)
+        self.assertAlmostEqual(releases[2] - releases[1], 5)
+
+    def test_monitor(self):
+        """Test holds cover only open breakers"""
+        monitor = HealthMonitor(HealthConfig(probe_timeout_s=1))
+        with tempfile.TemporaryDirectory() as tmp:
+            missing = str(Path(tmp) / "missing")
+            self.assertIsNone(monitor.hold([tmp, missing]))
+            with self.assertLogs(level="WARNING"):
+                self.assertTrue(monitor.trip([tmp, missing]))
+            self.assertEqual(monitor.hold([tmp, missing]).targets, [missing])
+            self.assertIs(monitor.breaker(tmp), monitor.breaker(tmp))
+
+
+class TestJobReplay(unittest.TestCase):
+    """Test jobs are held during an outage and replayed"""
+
+    def setUp(self) -> None:
+        """Load configs"""
+        with open(TEST_DIRECTORY / "resources" / "watch_config.yml") as yam:
+            self.watch_config = WatchConfig(**yaml.safe_load(yam))
+        with open(TEST_DIRECTORY / "resources" / "manifest.yml") as yam:
+            self.manifest_config = ManifestConfig(**yaml.safe_load(yam))
+        self.tmp = tempfile.TemporaryDirectory()
+        self.destination = Path(self.tmp.name) / "vast"
+        self.config = self.manifest_config.model_copy(
+            update={"destination": str(self.destination)}
+        )
+        self.watch_config = self.watch_config.model_copy(
+            update={
+                "manifest_complete": self.tmp.name,
+                "health": HealthConfig(
+                    probe_interval_s=0.1, replay_interval_s=0, max_replays=2
+                ),
+            }
+        )
+
+    def tearDown(self) -> None:
+        """Remove the files"""
+        self.tmp.cleanup()
+
+    @patch("aind_watchdog_service.run_job.RunJob.move_manifest_to_archive")
+    @patch("aind_watchdog_service.run_job.RunJob.trigger_transfer_service")
+    @patch("aind_watchdog_service.run_job.RunJob.copy_to_vast")
+    def test_replay_after_outage(
+        self, mock_copy: MagicMock, mock_trigger: MagicMock, mock_move: MagicMock
+    ):
+        """Test a copy failing while the share is down is replayed once it
+        is back"""
+
+        def copy() -> bool:
+            """Fail until the destination comes back"""
+            if mock_copy.call_count == 1:
+                # Share comes back during the hold
+                threading.Timer(0.3, self.destination.mkdir).start()
+                return False
+            return True
+
+        mock_copy.side_effect = copy
+        mock_trigger.return_value = True
+        execute = RunJob("manifest.yml", self.config, self.watch_config)
+        with self.assertLogs(level="INFO") as logs:
+            execute.run_job()
+        self.assertEqual(execute.control.state, "succeeded")
+        self.assertEqual(mock_copy.call_count, 2)
+        self.assertIn("Target recovered", "\n".join(logs.output))
+        self.assertGreater(execute.phases["outage_s"], 0.2)
+        mock_move.assert_called_once()
+
+    @patch("aind_watchdog_service.run_job.RunJob.copy_to_vast", return_value=False)
+    def test_healthy_target_fails(self, mock_copy: MagicMock):
+        """Test a failure with a reachable destination is not replayed"""
+        self.destination.mkdir()
+        execute = RunJob("manifest.yml", self.config, self.watch_config)
+        with self.assertLogs(level="ERROR"):
+            execute.run_job()
+        self.assertEqual(execute.control.state, "failed")
+        mock_copy.assert_called_once()
+
+    @patch("aind_watchdog_service.run_job.RunJob.copy_to_vast", return_value=False)
+    def test_max_replays(self, mock_copy: MagicMock):
+        """Test a job stops being replayed after max_replays"""
+        execute = RunJob("manifest.yml", self.config, self.watch_config)
+        with patch.object(HealthMonitor, "hold", return_value=None):
+            with self.assertLogs(level="WARNING"):
+                execute.run_job()
+        self.assertEqual(execute.control.state, "failed")
+        self.assertEqual(mock_copy.call_count, 3)
+
+    @patch("aind_watchdog_service.run_job.RunJob.move_manifest_to_archive")
+    @patch("aind_watchdog_service.run_job.RunJob.trigger_transfer_service")
+    @patch("aind_watchdog_service.run_job.RunJob.copy_to_vast")
+    def test_replay_after_copy_error(
+        self, mock_copy: MagicMock, mock_trigger: MagicMock, mock_move: MagicMock
+    ):
+        """Test a copy raising because the share is down, e.g. while creating
+        the session directory, is held and replayed"""
+
+        def copy() -> bool:
+            """Raise until the destination comes back"""
+            if mock_copy.call_count == 1:
+                threading.Timer(0.3, self.destination.mkdir).start()
+                raise FileNotFoundError(str(self.destination))
+            return True
+
+        mock_copy.side_effect = copy
+        mock_trigger.return_value = True
+        execute = RunJob("manifest.yml", self.config, self.watch_config)
+        with self.assertLogs(level="INFO") as logs:
+            execute.run_job()
+        self.assertEqual(execute.control.state, "succeeded")
+        self.assertEqual(mock_copy.call_count, 2)
+        self.assertIn("Target recovered", "\n".join(logs.output))
+
+    @patch("aind_watchdog_service.run_job.RunJob.wait_for_sources")
+    def test_unexpected_error_fails_job(self, mock_wait: MagicMock):
+        """Test a job raising is recorded as failed instead of running"""
+        mock_wait.side_effect = RuntimeError("boom")
+        execute = RunJob("manifest.yml", self.config, self.watch_config)
+        with patch.object(execute, "record_history") as record:
+            with self.assertLogs(level="ERROR"):
+                execute.run_job()
+        self.assertEqual(execute.control.state, "failed")
+        record.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+"""Test the job history database"""
+
+import os
+import tempfile
+import time
+import unittest
+
+from aind_watchdog_service.history import JobHistory, format_table
+
+
+class TestJobHistory(unittest.TestCase):
+    """Test JobHistory"""
+
+    def setUp(self) -> None:
+        """Record a few jobs"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.history = JobHistory(os.path.join(self.tmp.name, "history.sqlite"))
+        now = time.time()
+        for name, destination, state, nbytes, copy_s in (
+            ("session_1", "//vast/fast", "succeeded", 4_000_000_000, 20.0),
+            ("session_2", "//vast/fast", "failed", 2_000_000_000, 20.0),
+            ("session_3", "//nas/slow", "succeeded", 1_000_000_000, 100.0),
+        ):
+            self.history.record(
+                {
+                    "name": name,
+                    "destination": destination,
+                    "state": state,
+                    "started": now - copy_s,
+                    "finished": now,
+                    "copy_s": copy_s,
+                    "bytes": nbytes,
+                    "files": 2,
+                },
+                {"behavior": (nbytes // 4, 1), "ecephys": (nbytes * 3 // 4, 1)},
+            )
+
+    def tearDown(self) -> None:
+        """Remove the database"""
+        self.tmp.cleanup()
+
+    def test_aggregate_by_destination(self):
+        """Test slowest destinations are listed first"""
+        rows = self.history.aggregate("destination")
+        self.assertEqual([row["group"] for row in rows], ["//nas/slow", "//vast/fast"])
+        self.assertEqual(rows[0]["mbps"], 10.0)
+        self.assertEqual(rows[1]["jobs"], 2)
+        self.assertEqual(rows[1]["failed"], 1)
+        self.assertEqual(rows[1]["gb"], 6.0)
+        self.assertEqual(rows[1]["mbps"], 150.0)
+
+    def test_aggregate_by_modality(self):
+        """Test modality volumes come from the modality records"""
+        rows = {row["group"]: row for row in self.history.aggregate("modality")}
+        self.assertEqual(rows["behavior"]["gb"], 1.75)
+        self.assertEqual(rows["ecephys"]["gb"], 5.25)
+        self.assertEqual(rows["ecephys"]["files"], 3)
+
+    def test_since(self):
+        """Test old jobs are filtered out"""
+        self.history.record({"name": "old", "finished": time.time() - 7200}, {})
+        self.assertEqual(
+            sum(row["jobs"] for row in self.history.aggregate("hour", since_s=3600)), 3
+        )
+        self.assertEqual(sum(row["jobs"] for row in self.history.aggregate("hour")), 4)
+
+    def test_format_table(self):
+        """Test rows are rendered as aligned columns"""
+        lines = format_table(self.history.aggregate("destination")).splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[0].startswith("group"))
+        self.assertEqual(lines[1].index("1"), lines[0].index("jobs"))
+        self.assertEqual(format_table([]), "No jobs recorded")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+"""Test disk I/O pressure sampling"""
+
+import unittest
+from unittest.mock import patch
+
+from aind_watchdog_service.io_pressure import DiskPressureMonitor
+
+
+class TestDiskPressureMonitor(unittest.TestCase):
+    """Test DiskPressureMonitor"""
+
+    @patch.object(DiskPressureMonitor, "_find_device", return_value="sda")
+    @patch.object(DiskPressureMonitor, "_read_write_ms")
+    @patch("time.monotonic")
+    def test_utilization(self, mock_time, mock_counter, mock_device):
+        """Test utilization is the write-time share of the sample interval"""
+        mock_time.return_value = 100.0
+        mock_counter.return_value = 0
+        monitor = DiskPressureMonitor("/", threshold_pct=50, sample_s=1.0)
+        self.assertTrue(monitor.enabled)
+
+        # 800 ms of writes in 1 s of wall time
+        mock_time.return_value = 101.0
+        mock_counter.return_value = 800
+        self.assertAlmostEqual(monitor.utilization(), 80.0)
+        self.assertTrue(monitor.is_busy())
+
+        # Within the sample interval the cached value is reused
+        mock_time.return_value = 101.5
+        mock_counter.return_value = 10_000
+        self.assertAlmostEqual(monitor.utilization(), 80.0)
+
+        # Disk went quiet
+        mock_time.return_value = 103.0
+        mock_counter.return_value = 800
+        self.assertAlmostEqual(monitor.utilization(), 0.0)
+        self.assertFalse(monitor.is_busy())
+
+    @patch.object(DiskPressureMonitor, "_find_device", return_value=None)
+    @patch.object(DiskPressureMonitor, "_read_write_ms", return_value=None)
+    def test_disabled(self, mock_counter, mock_device):
+        """Test monitor never blocks when counters are unavailable"""
+        with self.assertLogs(level="WARNING"):
+            monitor = DiskPressureMonitor("/", threshold_pct=1)
+        self.assertFalse(monitor.enabled)
+        self.assertFalse(monitor.is_busy())
+        self.assertLess(monitor.wait_for_idle(), 1.0)
+
+    @patch("time.sleep")
+    @patch.object(DiskPressureMonitor, "is_busy", side_effect=[True, True, False])
+    @patch.object(DiskPressureMonitor, "_read_write_ms", return_value=0)
+    def test_wait_for_idle(self, mock_counter, mock_busy, mock_sleep):
+        """Test waiting polls until the disk is idle"""
+        monitor = DiskPressureMonitor("/", threshold_pct=50)
+        monitor.wait_for_idle(poll_s=5)
+        self.assertEqual(mock_sleep.call_count, 2)
+        mock_sleep.assert_called_with(5)
+
+
+if __name__ == "__main__":
+    unittest.main()
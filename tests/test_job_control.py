@@ -0,0 +1,94 @@
+"""Test cooperative cancellation and live control of jobs"""
+
+import subprocess
+import sys
+import threading
+import time
+import unittest
+
+from aind_watchdog_service.job_control import JobCancelled, JobControl
+
+
+class TestJobControl(unittest.TestCase):
+    """Test JobControl"""
+
+    def test_cancel(self):
+        """Test checkpoints raise once cancelled"""
+        control = JobControl()
+        control.checkpoint()
+        control.cancel()
+        self.assertTrue(control.cancelled)
+        with self.assertRaises(JobCancelled):
+            control.checkpoint()
+        with self.assertRaises(JobCancelled):
+            control.acquire_slot()
+
+    def test_pause_resume(self):
+        """Test a paused job blocks at its checkpoint until resumed"""
+        control = JobControl()
+        control.pause()
+        passed = threading.Event()
+
+        def worker():
+            control.checkpoint()
+            passed.set()
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        self.assertFalse(passed.wait(0.2))
+        control.resume()
+        self.assertTrue(passed.wait(5))
+        thread.join()
+
+    def test_concurrency(self):
+        """Test slots follow live concurrency changes"""
+        control = JobControl(concurrency=1)
+        control.acquire_slot()
+        acquired = threading.Event()
+
+        def worker():
+            control.acquire_slot()
+            acquired.set()
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        self.assertFalse(acquired.wait(0.2))
+        control.set_concurrency(2)
+        self.assertTrue(acquired.wait(5))
+        thread.join()
+        control.set_concurrency(100)
+        self.assertEqual(control.concurrency, 16)
+
+    def test_bandwidth(self):
+        """Test the bandwidth cap is stored in bytes per second and invalid
+        settings are rejected"""
+        control = JobControl()
+        control.set_bandwidth(10)
+        self.assertEqual(control.bandwidth, 10_000_000)
+        control.set_bandwidth(None)
+        self.assertIsNone(control.bandwidth)
+        for mbps in ("5", -1, 0, True):
+            with self.assertRaises(ValueError):
+                control.set_bandwidth(mbps)
+        for concurrency in (0, "2", 1.5):
+            with self.assertRaises(ValueError):
+                control.set_concurrency(concurrency)
+        self.assertEqual((control.bandwidth, control.concurrency), (None, 1))
+
+    def test_cancel_terminates_process(self):
+        """Test registered child processes are terminated on cancel"""
+        control = JobControl()
+        with subprocess.Popen(
+            [sys.executable, "-c", "import time; time.sleep(30)"]
+        ) as proc:
+            control.register_process(proc)
+            start = time.monotonic()
+            control.cancel()
+            proc.wait(timeout=10)
+            control.unregister_process(proc)
+        self.assertLess(time.monotonic() - start, 10)
+        self.assertNotEqual(proc.returncode, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,225 @@
+"""Test live mirroring of sessions being acquired"""
+
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import yaml
+
+from aind_watchdog_service.event_handler import EventHandler
+from aind_watchdog_service.mirror import SessionMirror
+from aind_watchdog_service.models.manifest_config import (
+    ManifestConfig,
+    MirrorConfig,
+    PackingConfig,
+)
+from aind_watchdog_service.models.watch_config import (
+    IOPressureConfig,
+    MirrorSettings,
+    WatchConfig,
+)
+from aind_watchdog_service.run_job import RunJob
+from aind_watchdog_service.throttle import TransferSchedule, TransferWindow
+
+TEST_DIRECTORY = Path(__file__).resolve().parent
+
+
+class TestSessionMirror(unittest.TestCase):
+    """Test scans of a mirrored session"""
+
+    def setUp(self) -> None:
+        """Create a session directory being written"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.session = Path(self.tmp.name) / "session"
+        (self.session / "trials").mkdir(parents=True)
+        (self.session / "video.bin").write_bytes(b"v" * 100)
+        (self.session / "trials" / "trial_0.json").write_text("{}")
+        self.destination = Path(self.tmp.name) / "vast"
+        self.config = MirrorConfig(
+            name="session_1",
+            destination=str(self.destination),
+            modalities={"behavior": [str(self.session)]},
+        )
+
+    def tearDown(self) -> None:
+        """Remove the session"""
+        self.tmp.cleanup()
+
+    def mirror(self, stable_s: float = 0, rsync_layout: bool = False) -> SessionMirror:
+        """Mirror of the session"""
+        return SessionMirror(
+            self.config,
+            MirrorSettings(stable_s=stable_s),
+            TransferSchedule([]),
+            rsync_layout,
+        )
+
+    def test_scan(self):
+        """Test stable files are copied once and again after they change"""
+        mirror = self.mirror()
+        self.assertEqual(mirror.scan(), 2)
+        modality_dir = self.destination / "session_1" / "behavior"
+        self.assertEqual((modality_dir / "video.bin").read_bytes(), b"v" * 100)
+        self.assertTrue((modality_dir / "trials" / "trial_0.json").exists())
+        self.assertEqual(mirror.scan(), 0)
+
+        (self.session / "video.bin").write_bytes(b"v" * 200)
+        self.assertEqual(mirror.scan(), 1)
+        self.assertEqual((mirror.files_copied, mirror.bytes_copied), (3, 302))
+
+    def test_rsync_layout(self):
+        """Test directories are staged under their name like rsync does"""
+        self.mirror(rsync_layout=True).scan()
+        self.assertTrue(
+            (
+                self.destination / "session_1" / "behavior" / "session" / "video.bin"
+            ).exists()
+        )
+
+    @patch("time.monotonic")
+    def test_stable_window(self, mock_monotonic: MagicMock):
+        """Test files are only copied once they stop changing"""
+        mock_monotonic.return_value = 1000.0
+        mirror = self.mirror(stable_s=60)
+        self.assertEqual(mirror.scan(), 0)
+        mock_monotonic.return_value = 1030.0
+        (self.session / "video.bin").write_bytes(b"v" * 200)
+        self.assertEqual(mirror.scan(), 0)
+        mock_monotonic.return_value = 1060.0
+        self.assertEqual(mirror.scan(), 1)
+        mock_monotonic.return_value = 1090.0
+        self.assertEqual(mirror.scan(), 1)
+        self.assertEqual(mirror.bytes_copied, 202)
+
+    def test_throttled_copies(self):
+        """Test copies charge the window's shared bucket and wait while the
+        acquisition disk is busy"""
+        schedule = TransferSchedule(
+            [TransferWindow(start="00:00:00", end="23:59:59", max_bandwidth_mbps=80)]
+        )
+        mirror = SessionMirror(
+            self.config,
+            MirrorSettings(stable_s=0),
+            schedule,
+            rsync_layout=False,
+            io_pressure=IOPressureConfig(path=self.tmp.name, poll_s=1),
+        )
+        mirror.io_monitor = MagicMock()
+        mirror.io_monitor.is_busy.side_effect = [True, False, False]
+        with patch.object(mirror._stop, "wait") as wait:
+            with patch(
+                "aind_watchdog_service.copy_engine.copy_file", return_value=1
+            ) as copy_file:
+                mirror._copy(str(self.session / "video.bin"), self.destination)
+                mirror._checkpoint()
+        wait.assert_called_once_with(1)
+        self.assertIs(copy_file.call_args.kwargs["bucket"], schedule.shared_bucket())
+
+    def test_job_removes_packed_mirror_files(self):
+        """Test the job removes mirrored files it packed, keeping the ones it
+        staged as they are"""
+        (self.session / "video.bin").write_bytes(b"v" * 2000)
+        self.mirror().scan()
+        with open(TEST_DIRECTORY / "resources" / "watch_config.yml") as yam:
+            watch_config = WatchConfig(**yaml.safe_load(yam)).model_copy(
+                update={
+                    "copy_backend": "python",
+                    "same_device_staging": "copy",
+                    "mirror": MirrorSettings(),
+                }
+            )
+        with open(TEST_DIRECTORY / "resources" / "manifest.yml") as yam:
+            manifest_config = ManifestConfig(**yaml.safe_load(yam)).model_copy(
+                update={
+                    "name": "session_1",
+                    "destination": str(self.destination),
+                    "modalities": {"behavior": [str(self.session)]},
+                    "schemas": [],
+                    "packing": PackingConfig(threshold_kb=1),
+                }
+            )
+        run = RunJob("manifest.yml", manifest_config, watch_config)
+        self.assertTrue(run.copy_to_vast())
+        modality_dir = self.destination / "session_1" / "behavior"
+        self.assertEqual(
+            sorted(
+                path.relative_to(modality_dir).as_posix()
+                for path in modality_dir.rglob("*")
+                if path.is_file()
+            ),
+            [
+                "behavior_pack_000.tar",
+                "behavior_pack_index.json",
+                "video.bin",
+            ],
+        )
+
+    def test_tail_copy(self):
+        """Test the job of the session only copies files the mirror missed"""
+        self.mirror().scan()
+        (self.session / "trials" / "trial_1.json").write_text("{}")
+        with open(TEST_DIRECTORY / "resources" / "watch_config.yml") as yam:
+            watch_config = WatchConfig(**yaml.safe_load(yam)).model_copy(
+                update={"copy_backend": "python", "same_device_staging": "copy"}
+            )
+        with open(TEST_DIRECTORY / "resources" / "manifest.yml") as yam:
+            manifest_config = ManifestConfig(**yaml.safe_load(yam)).model_copy(
+                update={
+                    "name": "session_1",
+                    "destination": str(self.destination),
+                    "modalities": {"behavior": [str(self.session)]},
+                    "schemas": [],
+                }
+            )
+        run = RunJob("manifest.yml", manifest_config, watch_config)
+        self.assertTrue(run.copy_to_vast())
+        self.assertEqual(run.progress.bytes_copied, 2)
+        modality_dir = self.destination / "session_1" / "behavior"
+        self.assertTrue((modality_dir / "trials" / "trial_1.json").exists())
+
+
+class TestEventHandlerMirrors(unittest.TestCase):
+    """Test mirror files start and stop mirrors"""
+
+    @patch.object(EventHandler, "_startup_manifest_check")
+    def setUp(self, mock_startup_manifest_check: MagicMock) -> None:
+        """Write a mirror file"""
+        self.tmp = tempfile.TemporaryDirectory()
+        with open(TEST_DIRECTORY / "resources" / "watch_config.yml") as yam:
+            watch_config = WatchConfig(**yaml.safe_load(yam)).model_copy(
+                update={"mirror": MirrorSettings(poll_s=60)}
+            )
+        with open(TEST_DIRECTORY / "resources" / "manifest.yml") as yam:
+            self.manifest_config = ManifestConfig(**yaml.safe_load(yam))
+        self.mirror_path = os.path.join(self.tmp.name, "session_mirror.yml")
+        with open(self.mirror_path, "w") as f:
+            yaml.safe_dump(
+                {
+                    "name": self.manifest_config.name,
+                    "destination": self.tmp.name,
+                    "modalities": {"behavior": [os.path.join(self.tmp.name, "none")]},
+                },
+                f,
+            )
+        self.event_handler = EventHandler(MagicMock(), watch_config)
+
+    def tearDown(self) -> None:
+        """Stop mirrors and remove the mirror file"""
+        for mirror in self.event_handler.mirrors.values():
+            mirror.stop()
+        self.tmp.cleanup()
+
+    def test_manifest_stops_mirror(self):
+        """Test the manifest of a mirrored session stops its mirror"""
+        self.event_handler._start_mirror(self.mirror_path)
+        mirror = self.event_handler.mirrors[self.mirror_path]
+        self.assertTrue(mirror._thread.is_alive())
+        self.event_handler.schedule_job("/path/to/manifest.yml", self.manifest_config)
+        self.assertEqual(self.event_handler.mirrors, {})
+        self.assertFalse(mirror._thread.is_alive())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+"""Test small file packing"""
+
+import json
+import tarfile
+import tempfile
+import unittest
+from pathlib import Path
+
+from aind_watchdog_service import packing
+
+
+class TestPacking(unittest.TestCase):
+    """Test planning and writing packs"""
+
+    def setUp(self) -> None:
+        """Create a directory of small files and one large file"""
+        self.tmp = tempfile.TemporaryDirectory()
+        root = Path(self.tmp.name)
+        self.trials = root / "trials"
+        (self.trials / "sub").mkdir(parents=True)
+        for number in range(5):
+            (self.trials / f"trial_{number}.json").write_text(f'{{"trial": {number}}}')
+        (self.trials / "sub" / "frame.bin").write_bytes(b"f" * 700)
+        (self.trials / "sub" / "video.bin").write_bytes(b"v" * 5000)
+        self.single = root / "settings.json"
+        self.single.write_text("{}")
+
+    def tearDown(self) -> None:
+        """Remove the files"""
+        self.tmp.cleanup()
+
+    def test_plan_packing(self):
+        """Test small files are packed and large files keep their subdirectory"""
+        small, large = packing.plan_packing([str(self.trials), str(self.single)], 1000)
+        self.assertEqual(
+            sorted(name for _, name in small),
+            ["settings.json", "sub/frame.bin"]
+            + [f"trial_{number}.json" for number in range(5)],
+        )
+        self.assertEqual(large, [(str(self.trials / "sub" / "video.bin"), "sub")])
+
+    def test_write_packs(self):
+        """Test containers roll over, land in every destination and the index
+        points at each file's data"""
+        small, _ = packing.plan_packing([str(self.trials)], 1000)
+        dests = [Path(self.tmp.name) / "primary", Path(self.tmp.name) / "backup"]
+        for dest in dests:
+            dest.mkdir()
+        read = []
+        index, errors = packing.write_packs(
+            small,
+            [str(dest) for dest in dests],
+            "behavior",
+            max_pack_bytes=4096,
+            progress=read.append,
+        )
+        self.assertEqual(errors, {str(dest): None for dest in dests})
+        self.assertEqual(len(index["packs"]), 2)
+        self.assertEqual(len(index["members"]), 6)
+        self.assertEqual(sum(read), sum(member["size"] for member in index["members"]))
+        for dest in dests:
+            self.assertEqual(
+                json.loads((dest / "behavior_pack_index.json").read_text()), index
+            )
+            self.assertEqual(list(dest.glob("*.partial")), [])
+            for member in index["members"]:
+                with open(dest / member["pack"], "rb") as f:
+                    f.seek(member["offset"])
+                    data = f.read(member["size"])
+                self.assertEqual(data, (self.trials / member["name"]).read_bytes())
+            with tarfile.open(dest / "behavior_pack_000.tar") as tar:
+                self.assertIn("sub/frame.bin", tar.getnames())
+
+    def test_write_packs_in_segments(self):
+        """Test a container written one segment per call is a valid tar whose
+        index offsets span the segments"""
+        small, _ = packing.plan_packing([str(self.trials)], 1000)
+        dest = Path(self.tmp.name) / "primary"
+        dest.mkdir()
+        offsets = []
+
+        def segment_writer(segment, partials, offset):
+            """Record the offset each segment starts at"""
+            offsets.append(offset)
+            return packing.write_members(segment, partials, offset)
+
+        index, errors = packing.write_packs(
+            small,
+            [str(dest)],
+            "behavior",
+            max_pack_bytes=1024 * 1024,
+            segment_writer=segment_writer,
+            segment_bytes=2048,
+        )
+        self.assertEqual(errors, {str(dest): None})
+        self.assertEqual(len(index["packs"]), 1)
+        self.assertGreater(len(offsets), 1)
+        self.assertEqual(offsets[0], 0)
+        with tarfile.open(dest / "behavior_pack_000.tar") as tar:
+            self.assertEqual(
+                sorted(tar.getnames()),
+                sorted(member["name"] for member in index["members"]),
+            )
+            for member in index["members"]:
+                self.assertEqual(
+                    tar.extractfile(member["name"]).read(),
+                    (self.trials / member["name"]).read_bytes(),
+                )
+        self.assertEqual(
+            (dest / "behavior_pack_000.tar").stat().st_size, index["packs"][0]["bytes"]
+        )
+
+    def test_write_packs_failed_destination(self):
+        """Test a missing destination fails alone"""
+        small, _ = packing.plan_packing([str(self.single)], 1000)
+        good = Path(self.tmp.name) / "good"
+        good.mkdir()
+        missing = Path(self.tmp.name) / "missing"
+        _, errors = packing.write_packs(
+            small, [str(good), str(missing)], "behavior", 4096
+        )
+        self.assertIsNone(errors[str(good)])
+        self.assertIsInstance(errors[str(missing)], OSError)
+        self.assertTrue((good / "behavior_pack_000.tar").exists())
+
+    def test_write_packs_failed_rename(self):
+        """Test a container that cannot be renamed into place fails only its
+        destination"""
+        small, _ = packing.plan_packing([str(self.single)], 1000)
+        primary = Path(self.tmp.name) / "primary"
+        primary.mkdir()
+        secondary = Path(self.tmp.name) / "secondary"
+        # A directory in the way of the container
+        (secondary / "behavior_pack_000.tar" / "taken").mkdir(parents=True)
+        _, errors = packing.write_packs(
+            small, [str(primary), str(secondary)], "behavior", 4096
+        )
+        self.assertIsNone(errors[str(primary)])
+        self.assertIsInstance(errors[str(secondary)], OSError)
+        self.assertTrue((primary / "behavior_pack_000.tar").is_file())
+        self.assertTrue((primary / "behavior_pack_index.json").exists())
+        self.assertFalse((secondary / "behavior_pack_index.json").exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+"""Test expansion of modality entry patterns"""
+
+import tempfile
+import unittest
+from pathlib import Path
+
+from aind_watchdog_service import patterns
+
+
+class TestPatterns(unittest.TestCase):
+    """Test expand and expand_modalities"""
+
+    def setUp(self) -> None:
+        """Create a small acquisition tree"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name).as_posix()
+        for name in (
+            "a.tiff",
+            "b.tiff",
+            "notes.txt",
+            ".hidden.tiff",
+            "plane_0/c.tiff",
+            "plane_0/deep/d.tiff",
+            "plane_1/e.tiff",
+        ):
+            path = Path(self.tmp.name) / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(name)
+
+    def tearDown(self) -> None:
+        """Remove the tree"""
+        self.tmp.cleanup()
+
+    def relative(self, paths):
+        """Paths relative to the tree"""
+        return [Path(path).relative_to(self.root).as_posix() for path in paths]
+
+    def test_has_magic(self):
+        """Test wildcards are detected"""
+        self.assertTrue(patterns.has_magic("D:/data/*.tiff"))
+        self.assertTrue(patterns.has_magic("D:/data/plane_[01]"))
+        self.assertFalse(patterns.has_magic("D:/data/a.tiff"))
+
+    def test_expand(self):
+        """Test wildcards, character sets and recursive globs"""
+        self.assertEqual(
+            self.relative(patterns.expand(f"{self.root}/*.tiff")), ["a.tiff", "b.tiff"]
+        )
+        self.assertEqual(
+            self.relative(patterns.expand(f"{self.root}/plane_?")),
+            ["plane_0", "plane_1"],
+        )
+        self.assertEqual(
+            self.relative(patterns.expand(f"{self.root}/plane_[1]/*.tiff")),
+            ["plane_1/e.tiff"],
+        )
+        self.assertEqual(
+            self.relative(patterns.expand(f"{self.root}/**/*.tiff")),
+            [
+                "a.tiff",
+                "b.tiff",
+                "plane_0/c.tiff",
+                "plane_0/deep/d.tiff",
+                "plane_1/e.tiff",
+            ],
+        )
+        self.assertEqual(
+            self.relative(patterns.expand(f"{self.root}/plane_0/**")),
+            ["plane_0/c.tiff", "plane_0/deep/d.tiff"],
+        )
+
+    def test_expand_literal(self):
+        """Test paths without wildcards are kept, even if missing"""
+        self.assertEqual(patterns.expand("D:/data/a.tiff"), ["D:/data/a.tiff"])
+        self.assertEqual(patterns.expand(f"{self.root}/missing/*.tiff"), [])
+
+    def test_expand_brackets(self):
+        """Test existing paths with brackets in their names are literal"""
+        literal = Path(self.tmp.name) / "run[1]" / "frames[0].tiff"
+        literal.parent.mkdir()
+        literal.write_text("frames")
+        self.assertFalse(patterns.is_pattern(literal.as_posix()))
+        self.assertTrue(patterns.is_pattern(f"{self.root}/run[1]/*.tiff"))
+        self.assertEqual(patterns.expand(literal.as_posix()), [literal.as_posix()])
+        self.assertEqual(
+            self.relative(patterns.expand(f"{self.root}/run[1]/*.tiff")),
+            ["run[1]/frames[0].tiff"],
+        )
+
+    def test_expand_modalities(self):
+        """Test patterns and paths are expanded in manifest order"""
+        modalities = patterns.expand_modalities(
+            {"behavior": [f"{self.root}/notes.txt", f"{self.root}/plane_1/*"]}
+        )
+        self.assertEqual(
+            self.relative(modalities["behavior"]), ["notes.txt", "plane_1/e.tiff"]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
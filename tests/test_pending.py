@@ -0,0 +1,147 @@
+"""Test pending job records and their activation"""
+
+import datetime
+import os
+import tempfile
+import tracemalloc
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import yaml
+
+from aind_watchdog_service.event_handler import EventHandler
+from aind_watchdog_service.models.manifest_config import ManifestConfig
+from aind_watchdog_service.models.watch_config import WatchConfig
+from aind_watchdog_service.pending import PendingJob
+from aind_watchdog_service.run_job import RunJob
+from aind_watchdog_service.status_api import StatusServer
+
+TEST_DIRECTORY = Path(__file__).resolve().parent
+
+
+def per_job_bytes(make, count: int) -> float:
+    """Memory allocated per object kept alive by make"""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        kept = [make(i) for i in range(count)]
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del kept
+    return allocated / count
+
+
+class TestPendingJob(unittest.TestCase):
+    """Test scheduling, firing and cancelling pending jobs"""
+
+    @patch.object(EventHandler, "_startup_manifest_check")
+    def setUp(self, mock_startup_manifest_check: MagicMock) -> None:
+        """Write a manifest scheduled for later"""
+        self.tmp = tempfile.TemporaryDirectory()
+        with open(TEST_DIRECTORY / "resources" / "watch_config.yml") as yam:
+            self.watch_config = WatchConfig(**yaml.safe_load(yam))
+        with open(TEST_DIRECTORY / "resources" / "manifest.yml") as yam:
+            self.manifest = yaml.safe_load(yam)
+        self.manifest["schedule_time"] = "23:00:00"
+        self.src_path = os.path.join(self.tmp.name, "manifest_test.yml")
+        self.write_manifest()
+        self.scheduler = MagicMock()
+        self.scheduler.add_job.return_value.id = "job1"
+        self.scheduler.add_job.return_value.next_run_time = None
+        self.event_handler = EventHandler(self.scheduler, self.watch_config)
+
+    def tearDown(self) -> None:
+        """Remove the manifest"""
+        self.tmp.cleanup()
+
+    def write_manifest(self) -> ManifestConfig:
+        """Write self.manifest to src_path"""
+        with open(self.src_path, "w") as f:
+            yaml.safe_dump(self.manifest, f)
+        return ManifestConfig(**self.manifest)
+
+    def test_schedule_later(self):
+        """Test a deferred job keeps a record instead of a RunJob"""
+        self.event_handler.schedule_job(self.src_path, ManifestConfig(**self.manifest))
+        self.assertEqual(self.event_handler.runs, {})
+        pending = self.event_handler.pending[self.src_path]
+        self.assertEqual(pending.job_id, "job1")
+        self.assertEqual(pending.trigger.time(), datetime.time(23))
+        self.assertEqual(pending.estimated_bytes, 0)
+        _, kwargs = self.scheduler.add_job.call_args
+        self.assertEqual(kwargs["args"], [self.src_path])
+
+    @patch.object(RunJob, "run_job")
+    def test_fire_reloads_manifest(self, mock_run_job: MagicMock):
+        """Test the manifest is parsed again when the job fires"""
+        self.event_handler.schedule_job(self.src_path, ManifestConfig(**self.manifest))
+        self.manifest["capsule_id"] = "edited"
+        self.write_manifest()
+        self.event_handler._fire(self.src_path)
+        mock_run_job.assert_called_once()
+        run = self.event_handler.runs[self.src_path]
+        self.assertEqual(run.job_id, "job1")
+        self.assertEqual(run.config.capsule_id, "edited")
+        self.assertEqual(self.event_handler.pending, {})
+
+    @patch.object(RunJob, "run_job")
+    def test_fire_deleted_manifest(self, mock_run_job: MagicMock):
+        """Test a job whose manifest is gone does not run"""
+        self.event_handler.schedule_job(self.src_path, ManifestConfig(**self.manifest))
+        os.remove(self.src_path)
+        self.event_handler._fire(self.src_path)
+        mock_run_job.assert_not_called()
+        self.assertNotIn(self.src_path, self.event_handler.jobs)
+
+    @patch.object(RunJob, "run_job")
+    def test_status_api(self, mock_run_job: MagicMock):
+        """Test pending jobs are listed and keep settings until they fire"""
+        self.event_handler.schedule_job(self.src_path, ManifestConfig(**self.manifest))
+        server = StatusServer(self.event_handler, port=0)
+        jobs = server.list_jobs()["jobs"]
+        self.assertEqual(jobs[0]["state"], "pending")
+        self.assertEqual(jobs[0]["estimated_bytes"], 0)
+        self.assertEqual(server.act("job1", "pause", {})[0], 409)
+        code, status = server.act("job1", "settings", {"concurrency": 3})
+        self.assertEqual((code, status["concurrency"]), (200, 3))
+        self.event_handler._fire(self.src_path)
+        self.assertEqual(self.event_handler.runs[self.src_path].control.concurrency, 3)
+        server.httpd.server_close()
+
+    def test_cancel(self):
+        """Test cancelling a pending job drops its record"""
+        self.event_handler.schedule_job(self.src_path, ManifestConfig(**self.manifest))
+        server = StatusServer(self.event_handler, port=0)
+        code, status = server.act("job1", "cancel", {})
+        server.httpd.server_close()
+        self.assertEqual((code, status["state"]), (200, "cancelled"))
+        self.scheduler.remove_job.assert_called_once_with("job1")
+        self.assertEqual(self.event_handler.pending, {})
+
+    def test_memory_per_job(self):
+        """Benchmark the memory a pending record and a RunJob keep per job"""
+        trigger = datetime.datetime.now()
+        config = ManifestConfig(**self.manifest)
+        count = 500
+
+        def record(i: int) -> PendingJob:
+            return PendingJob(
+                f"{self.src_path}.{i}", f"{config.name}_{i}", i, i, trigger, i
+            )
+
+        def run(i: int) -> RunJob:
+            manifest = ManifestConfig(**(self.manifest | {"name": f"{config.name}_{i}"}))
+            return RunJob(f"{self.src_path}.{i}", manifest, self.watch_config)
+
+        pending_bytes = per_job_bytes(record, count)
+        run_bytes = per_job_bytes(run, count)
+        print(f"pending job: {pending_bytes:.0f} B, RunJob: {run_bytes:.0f} B")
+        self.assertLess(pending_bytes, 1024)
+        self.assertLess(pending_bytes * 10, run_bytes)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+"""Test source readiness detection"""
+
+import os
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+from aind_watchdog_service.readiness import SourceWatcher, source_signature
+
+
+class TestSourceWatcher(unittest.TestCase):
+    """Test SourceWatcher"""
+
+    def setUp(self) -> None:
+        """Create a session directory"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.session = Path(self.tmp.name) / "session"
+        (self.session / "sub").mkdir(parents=True)
+        self.frame = self.session / "sub" / "frame.tiff"
+        self.frame.write_bytes(b"f" * 10)
+
+    def tearDown(self) -> None:
+        """Remove the files"""
+        self.tmp.cleanup()
+
+    def test_signature(self):
+        """Test directories are scanned and missing files flagged"""
+        missing = str(Path(self.tmp.name) / "missing.h5")
+        signature = source_signature([str(self.session), missing])
+        self.assertEqual(signature[str(self.frame)][0], 10)
+        self.assertIsNone(signature[missing])
+
+    def test_finished_session(self):
+        """Test files untouched for longer than the window are ready at once"""
+        old = time.time() - 120
+        os.utime(self.frame, (old, old))
+        watcher = SourceWatcher([str(self.session)], stable_s=60)
+        self.assertTrue(watcher.poll())
+
+    def test_growing_file(self):
+        """Test the wait lasts until a file stops growing"""
+        stop = threading.Event()
+
+        def writer():
+            with open(self.frame, "ab") as f:
+                while not stop.wait(0.05):
+                    f.write(b"f")
+                    f.flush()
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        threading.Timer(0.6, stop.set).start()
+        watcher = SourceWatcher([str(self.session)], stable_s=0.3, timeout_s=10)
+        self.assertTrue(watcher.wait(poll_s=0.05))
+        thread.join()
+        self.assertGreater(watcher.waited, 0.8)
+
+    def test_timeout(self):
+        """Test a file that never appears times out"""
+        missing = str(Path(self.tmp.name) / "missing.h5")
+        watcher = SourceWatcher([missing], stable_s=0.1, timeout_s=0.3)
+        self.assertFalse(watcher.wait(poll_s=0.05))
+
+
+if __name__ == "__main__":
+    unittest.main()
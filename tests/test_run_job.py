@@ -1,7 +1,9 @@
 """Test the run_job module"""
 
 import json
+import os
 import subprocess
+import tempfile
 import unittest
 from pathlib import Path
 from unittest.mock import MagicMock, patch
@@ -10,8 +12,15 @@ import requests
 import yaml
 from watchdog.events import FileCreatedEvent
 
-from aind_watchdog_service.models.manifest_config import ManifestConfig
-from aind_watchdog_service.models.watch_config import WatchConfig
+from aind_watchdog_service import compression
+from aind_watchdog_service.archive import shared_archive
+from aind_watchdog_service.history import JobHistory
+from aind_watchdog_service.models.manifest_config import (
+    CompressionConfig,
+    ManifestConfig,
+    PackingConfig,
+)
+from aind_watchdog_service.models.watch_config import TransferWindow, WatchConfig
 from aind_watchdog_service.run_job import RunJob
 
 TEST_DIRECTORY = Path(__file__).resolve().parent
@@ -52,24 +61,33 @@ class TestRunSubprocess(unittest.TestCase):
             manifest_with_run_script = yaml.safe_load(yam)
         with open(manifest_config_upload_only_fp) as yam:
             manifest_upload_only = yaml.safe_load(yam)
-        cls.watch_config = WatchConfig(**watch_config)
-        cls.watch_config_no_webhook = WatchConfig(**watch_config_no_webhook)
+        # Keep the job history out of the configured manifest_complete
+        cls.history = tempfile.TemporaryDirectory()
+        history_db = os.path.join(cls.history.name, "job_history.sqlite")
+        cls.watch_config = WatchConfig(**watch_config | {"history_db": history_db})
+        cls.watch_config_no_webhook = WatchConfig(
+            **watch_config_no_webhook | {"history_db": history_db}
+        )
         cls.manifest_config = ManifestConfig(**manifest_config)
         cls.manifest_with_run_script = ManifestConfig(**manifest_with_run_script)
         cls.manifest_config_upload_only = ManifestConfig(**manifest_upload_only)
         cls.mock_event = MockFileCreatedEvent("/path/to/file.txt")
         cls.run_script_config = manifest_with_run_script
 
-    @patch("subprocess.run")
+    def tearDown(self) -> None:
+        """Remove the job history"""
+        self.history.cleanup()
+
+    @patch("subprocess.Popen")
     def test_run_subprocess_vast(self, mock_subproc: MagicMock):
         """Test run_subprocess function"""
 
         # Test command
         cmd = ["ls", "-l"]
-        # Mock mock_subproc to return a CompletedProcess object
-        mock_subproc.return_value = subprocess.CompletedProcess(
-            args=cmd, returncode=8, stdout=b"Mock stdout", stderr=b"Mock stderr"
-        )
+        # Mock mock_subproc to return a process that exits with code 8
+        proc = mock_subproc.return_value.__enter__.return_value
+        proc.communicate.return_value = (b"Mock stdout", b"Mock stderr")
+        proc.returncode = 8
         execute_manifest_config = RunJob(
             self.mock_event,
             self.manifest_config,
@@ -78,7 +96,7 @@ class TestRunSubprocess(unittest.TestCase):
         result = execute_manifest_config.run_subprocess(cmd)
         # # Assert that mock_subproc was called with the correct arguments
         mock_subproc.assert_called_once_with(
-            cmd, check=False, stderr=subprocess.PIPE, stdout=subprocess.PIPE
+            cmd, stderr=subprocess.PIPE, stdout=subprocess.PIPE
         )
         # Assert the return value of the function
         self.assertEqual(result.args, cmd)
@@ -86,16 +104,16 @@ class TestRunSubprocess(unittest.TestCase):
         self.assertEqual(result.stdout, b"Mock stdout")
         self.assertEqual(result.stderr, b"Mock stderr")
 
-    @patch("subprocess.run")
+    @patch("subprocess.Popen")
     def test_run_subprocess_script(self, mock_subproc: MagicMock):
         """Test run_subprocess function"""
 
         # Test command
         cmd = ["ls", "-l"]
-        # Mock mock_subproc to return a CompletedProcess object
-        mock_subproc.return_value = subprocess.CompletedProcess(
-            args=cmd, returncode=8, stdout=b"Mock stdout", stderr=b"Mock stderr"
-        )
+        # Mock mock_subproc to return a process that exits with code 8
+        proc = mock_subproc.return_value.__enter__.return_value
+        proc.communicate.return_value = (b"Mock stdout", b"Mock stderr")
+        proc.returncode = 8
         execute_script_config = RunJob(
             self.mock_event,
             self.manifest_config,
@@ -104,7 +122,7 @@ class TestRunSubprocess(unittest.TestCase):
         result = execute_script_config.run_subprocess(cmd)
         # # Assert that mock_subproc was called with the correct arguments
         mock_subproc.assert_called_once_with(
-            cmd, check=False, stderr=subprocess.PIPE, stdout=subprocess.PIPE
+            cmd, stderr=subprocess.PIPE, stdout=subprocess.PIPE
         )
         # Assert the return value of the function
         self.assertEqual(result.args, cmd)
@@ -112,13 +130,15 @@ class TestRunSubprocess(unittest.TestCase):
         self.assertEqual(result.stdout, b"Mock stdout")
         self.assertEqual(result.stderr, b"Mock stderr")
 
-    @patch("subprocess.run")
+    @patch("subprocess.Popen")
     def test_os_calls(self, mock_subproc: MagicMock):
         """Test execute_windows_command and execute_linux_command functions"""
         src_dir = "/path/to/some_directory"
         src_file = "/path/to/some_file.txt"
         dest = "/some_place/on_a/hardrive"
-        mock_subproc.return_value = subprocess.CompletedProcess(args=[], returncode=0)
+        proc = mock_subproc.return_value.__enter__.return_value
+        proc.communicate.return_value = (b"", b"")
+        proc.returncode = 0
 
         with patch.object(Path, "exists") as mock_file:
             mock_file.return_value = True
@@ -172,6 +192,30 @@ class TestRunSubprocess(unittest.TestCase):
             self.assertEqual(winx_file, False)
             mock_subproc.assert_called()
 
+    def test_rsync_bwlimit_shared(self):
+        """Test the window cap is shared by jobs and split between rsync runs"""
+        watch_config = self.watch_config.model_copy(
+            update={
+                "copy_workers": 2,
+                "transfer_windows": [
+                    TransferWindow(
+                        start="00:00:00", end="23:59:59", max_bandwidth_mbps=8.192
+                    )
+                ],
+            }
+        )
+        first, second = [
+            RunJob(self.mock_event.src_path, self.manifest_config, watch_config)
+            for _ in range(2)
+        ]
+        self.assertIs(first.bucket.parent, second.bucket.parent)
+        self.assertIn("--bwlimit=4000", first._rsync_options())
+        with first.bucket.use(), first.bucket.use(), second.bucket.use():
+            self.assertIn("--bwlimit=2666", second._rsync_options())
+        second.control.set_bandwidth(2.048)
+        second._checkpoint()
+        self.assertIn("--bwlimit=1000", second._rsync_options())
+
     @patch("os.path.join")
     @patch("os.makedirs")
     @patch("aind_watchdog_service.run_job.RunJob.execute_windows_command")
@@ -307,7 +351,9 @@ class TestRunSubprocess(unittest.TestCase):
                 # Assert that the error message was logged
                 self.assertEqual(len(log_context.records), 1)
                 self.assertTrue(
-                    log_context.records[0].getMessage().startswith(
+                    log_context.records[0]
+                    .getMessage()
+                    .startswith(
                         f"Could not trigger aind-data-transfer-service for "
                         f"{self.mock_event.src_path}"
                     ),
@@ -421,13 +467,22 @@ class TestRunSubprocess(unittest.TestCase):
     def test_move_manifest_win(self, mock_execute: MagicMock, mock_remove: MagicMock):
         """Test the move manifest function"""
         mock_execute.return_value = True
-        execute = RunJob(
-            self.mock_event,
-            self.manifest_config,
-            self.watch_config,
-        )
-        execute.move_manifest_to_archive()
-        mock_remove.assert_called_once()
+        with tempfile.TemporaryDirectory() as tmp:
+            watch_config = self.watch_config.model_copy(update={"manifest_complete": tmp})
+            execute = RunJob(
+                self.mock_event.src_path,
+                self.manifest_config,
+                watch_config,
+            )
+            execute.move_manifest_to_archive()
+            mock_remove.assert_called_once()
+            archive_dir = mock_execute.call_args.args[1]
+            self.assertEqual(Path(archive_dir).parent, Path(tmp))
+            entry = shared_archive(tmp).lookup(self.manifest_config.name)
+            self.assertEqual(
+                Path(tmp) / entry.path,
+                Path(archive_dir) / Path(self.mock_event.src_path).name,
+            )
 
     @patch("aind_watchdog_service.run_job.RunJob.run_subprocess")
     @patch("aind_watchdog_service.run_job.PLATFORM", "linux")
@@ -436,13 +491,16 @@ class TestRunSubprocess(unittest.TestCase):
         mock_subproc.return_value = subprocess.CompletedProcess(
             args=[], returncode=0, stdout=b"Mock stdout", stderr=b"Mock stderr"
         )
-        execute = RunJob(
-            self.mock_event,
-            self.manifest_config,
-            self.watch_config,
-        )
-        execute.move_manifest_to_archive()
-        mock_subproc.assert_called_once()
+        with tempfile.TemporaryDirectory() as tmp:
+            watch_config = self.watch_config.model_copy(update={"manifest_complete": tmp})
+            execute = RunJob(
+                self.mock_event.src_path,
+                self.manifest_config,
+                watch_config,
+            )
+            execute.move_manifest_to_archive()
+            mock_subproc.assert_called_once()
+            self.assertIsNotNone(shared_archive(tmp).lookup(self.manifest_config.name))
 
     @patch("aind_watchdog_service.alert_bot.AlertBot.send_message")
     @patch("aind_watchdog_service.run_job.RunJob.copy_to_vast")
@@ -478,6 +536,410 @@ class TestRunSubprocess(unittest.TestCase):
                 mock_alert.assert_called_with("Job complete", self.mock_event.src_path)
                 mock_move_mani.assert_called_once()
 
+    @patch("aind_watchdog_service.run_job.RunJob.trigger_transfer_service")
+    @patch("aind_watchdog_service.run_job.RunJob.move_manifest_to_archive")
+    @patch("aind_watchdog_service.run_job.RunJob.copy_file")
+    def test_run_job_cancelled(
+        self,
+        mock_copy_file: MagicMock,
+        mock_move_mani: MagicMock,
+        mock_trigger_transfer: MagicMock,
+    ):
+        """test a job cancelled mid-copy stops without archiving its manifest"""
+        execute = RunJob(
+            self.mock_event.src_path,
+            self.manifest_config,
+            self.watch_config,
+        )
+
+        def cancel_during_copy(src, dest):
+            execute.control.cancel()
+            return False
+
+        mock_copy_file.side_effect = cancel_during_copy
+        with patch.object(Path, "exists", return_value=True):
+            with patch.object(Path, "is_dir", return_value=True):
+                execute.run_job()
+        self.assertEqual(execute.control.state, "cancelled")
+        mock_trigger_transfer.assert_not_called()
+        mock_move_mani.assert_not_called()
+
+    @patch("aind_watchdog_service.run_job.RunJob.copy_file")
+    def test_copy_files_failure_cancels_queued(self, mock_copy_file: MagicMock):
+        """test a failed copy cancels the queued copies without raising"""
+        execute = RunJob(
+            self.mock_event.src_path,
+            self.manifest_config,
+            self.watch_config.model_copy(update={"copy_backend": "python"}),
+        )
+        # One copy slot, so every transfer past the pool's threads is still queued
+        mock_copy_file.side_effect = lambda src, dest: src != "/data/file_00.bin"
+        transfers = [(f"/data/file_{number:02d}.bin", ["/vast"]) for number in range(24)]
+        with self.assertLogs(level="ERROR"):
+            self.assertFalse(execute._copy_files(transfers))
+        self.assertLess(mock_copy_file.call_count, len(transfers))
+
+    @patch("aind_watchdog_service.run_job.RunJob.move_manifest_to_archive")
+    @patch("requests.post")
+    def test_run_job_history(self, mock_post: MagicMock, mock_move_mani: MagicMock):
+        """test finished jobs are recorded in the job history"""
+        with tempfile.TemporaryDirectory() as tmp:
+            source = Path(tmp) / "frames.bin"
+            source.write_bytes(b"f" * 1000)
+            config = self.manifest_config.model_copy(
+                update={
+                    "destination": str(Path(tmp) / "vast"),
+                    "modalities": {"behavior": [str(source)]},
+                    "schemas": [],
+                }
+            )
+            database = str(Path(tmp) / "history.sqlite")
+            watch_config = self.watch_config.model_copy(
+                update={"copy_backend": "python", "history_db": database}
+            )
+            response = requests.Response()
+            response.status_code = 200
+            response._content = b'{"message": "submitted"}'
+            mock_post.return_value = response
+            RunJob(self.mock_event.src_path, config, watch_config).run_job()
+            mock_post.return_value.status_code = 500
+            RunJob(self.mock_event.src_path, config, watch_config).run_job()
+
+            rows = JobHistory(database).aggregate("modality")
+            self.assertEqual(len(rows), 1)
+            self.assertEqual(rows[0]["group"], "behavior")
+            self.assertEqual((rows[0]["jobs"], rows[0]["failed"]), (2, 1))
+            self.assertEqual(rows[0]["files"], 2)
+            mock_move_mani.assert_called_once()
+
+    def test_copy_to_vast_fan_out(self):
+        """test sources are copied to every destination and secondary
+        failures do not fail the job"""
+        with tempfile.TemporaryDirectory() as tmp:
+            source = Path(tmp) / "source.bin"
+            source.write_bytes(b"data")
+            schema = Path(tmp) / "session.json"
+            schema.write_text("{}")
+            primary = Path(tmp) / "primary"
+            backup = Path(tmp) / "backup"
+            config = self.manifest_config.model_copy(
+                update={
+                    "destination": str(primary),
+                    "extra_destinations": [str(backup)],
+                    "modalities": {"behavior": [str(source)]},
+                    "schemas": [str(schema)],
+                }
+            )
+            execute = RunJob(self.mock_event.src_path, config, self.watch_config)
+            self.assertTrue(execute.copy_to_vast())
+            for root in (primary, backup):
+                job_dir = root / config.name
+                self.assertEqual(
+                    (job_dir / "behavior" / "source.bin").read_bytes(), b"data"
+                )
+                self.assertTrue((job_dir / "session.json").exists())
+            self.assertEqual(execute.progress.bytes_copied, 6)
+
+            # The backup share refuses new files
+            (backup / config.name / "behavior").rename(backup / "moved")
+            (backup / config.name / "behavior").write_text("")
+            execute = RunJob(self.mock_event.src_path, config, self.watch_config)
+            with self.assertLogs(level="ERROR"):
+                self.assertTrue(execute.copy_to_vast())
+            self.assertEqual(execute.destination_errors, {str(backup): [str(source)]})
+
+    def test_copy_to_vast_packing(self):
+        """test small files are packed and large files are copied directly"""
+        with tempfile.TemporaryDirectory() as tmp:
+            trials = Path(tmp) / "trials"
+            trials.mkdir()
+            for number in range(3):
+                (trials / f"trial_{number}.json").write_text("{}")
+            video = Path(tmp) / "video.bin"
+            video.write_bytes(b"v" * 4096)
+            primary = Path(tmp) / "primary"
+            config = self.manifest_config.model_copy(
+                update={
+                    "destination": str(primary),
+                    "modalities": {"behavior": [str(trials), str(video)]},
+                    "schemas": [],
+                    "packing": PackingConfig(threshold_kb=1),
+                }
+            )
+            watch_config = self.watch_config.model_copy(update={"copy_backend": "python"})
+            execute = RunJob(self.mock_event.src_path, config, watch_config)
+            self.assertTrue(execute.copy_to_vast())
+            modality_dir = primary / config.name / "behavior"
+            self.assertEqual(
+                sorted(path.name for path in modality_dir.iterdir()),
+                ["behavior_pack_000.tar", "behavior_pack_index.json", "video.bin"],
+            )
+            self.assertEqual(execute.progress.files_copied, 4)
+
+    def test_copy_to_vast_patterns(self):
+        """test modality patterns are expanded when the job copies"""
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in ("plane_0/a.tiff", "plane_1/b.tiff", "plane_1/notes.txt"):
+                path = Path(tmp) / "data" / name
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_text(name)
+            primary = Path(tmp) / "primary"
+            config = self.manifest_config.model_copy(
+                update={
+                    "destination": str(primary),
+                    "modalities": {
+                        "behavior": [(Path(tmp) / "data" / "**" / "*.tiff").as_posix()],
+                        "pophys": [(Path(tmp) / "data" / "*.h5").as_posix()],
+                    },
+                    "schemas": [],
+                }
+            )
+            watch_config = self.watch_config.model_copy(update={"copy_backend": "python"})
+            execute = RunJob(self.mock_event.src_path, config, watch_config)
+            with self.assertLogs(level="ERROR"):
+                self.assertFalse(execute.copy_to_vast())
+
+            config.modalities.pop("pophys")
+            execute = RunJob(self.mock_event.src_path, config, watch_config)
+            self.assertTrue(execute.copy_to_vast())
+            modality_dir = primary / config.name / "behavior"
+            self.assertEqual(
+                sorted(path.name for path in modality_dir.iterdir()), ["a.tiff", "b.tiff"]
+            )
+            self.assertEqual(execute.progress.files_copied, 2)
+
+    @unittest.skipUnless(compression.available(), "zstandard is not installed")
+    def test_copy_to_vast_compression(self):
+        """test modalities with a compression policy are staged as .zst"""
+        with tempfile.TemporaryDirectory() as tmp:
+            log = Path(tmp) / "behavior.csv"
+            log.write_text("trial,reward\n" * 10_000)
+            primary = Path(tmp) / "primary"
+            config = self.manifest_config.model_copy(
+                update={
+                    "destination": str(primary),
+                    "modalities": {"behavior": [str(log)]},
+                    "schemas": [],
+                    "compression": {"behavior": CompressionConfig(level=1)},
+                }
+            )
+            execute = RunJob(self.mock_event.src_path, config, self.watch_config)
+            self.assertTrue(execute.copy_to_vast())
+            modality_dir = primary / config.name / "behavior"
+            self.assertEqual(
+                [path.name for path in modality_dir.iterdir()], ["behavior.csv.zst"]
+            )
+            self.assertEqual(execute.compression.files_compressed, 1)
+            self.assertEqual(execute.progress.files_copied, 1)
+
+    def test_copy_to_vast_audit(self):
+        """test files a copy tool reported but did not stage are copied again"""
+        with tempfile.TemporaryDirectory() as tmp:
+            session = Path(tmp) / "session"
+            session.mkdir()
+            (session / "frames.bin").write_bytes(b"f" * 100)
+            (session / "log.txt").write_text("log")
+            primary = Path(tmp) / "primary"
+            config = self.manifest_config.model_copy(
+                update={
+                    "destination": str(primary),
+                    "modalities": {"behavior": [str(session)]},
+                    "schemas": [],
+                }
+            )
+            watch_config = self.watch_config.model_copy(
+                update={"copy_backend": "python", "audit_copies": True}
+            )
+            execute = RunJob(self.mock_event.src_path, config, watch_config)
+            modality_dir = primary / config.name / "behavior"
+            real_copy = execute.execute_python_copy
+
+            def partial_copy(src: str, dest: str) -> bool:
+                """Stage the directory, then lose one file and truncate another"""
+                real_copy(src, dest)
+                if Path(src).is_dir():
+                    (modality_dir / "log.txt").unlink()
+                    (modality_dir / "frames.bin").write_bytes(b"f" * 10)
+                return True
+
+            with patch.object(execute, "execute_python_copy", side_effect=partial_copy):
+                with self.assertLogs(level="WARNING") as logs:
+                    self.assertTrue(execute.copy_to_vast())
+            self.assertIn("frames.bin': 'short'", "\n".join(logs.output))
+            self.assertEqual((modality_dir / "frames.bin").read_bytes(), b"f" * 100)
+            self.assertEqual((modality_dir / "log.txt").read_text(), "log")
+
+            # A file that cannot be staged fails the job
+            (modality_dir / "log.txt").unlink()
+            execute = RunJob(self.mock_event.src_path, config, watch_config)
+            with patch.object(execute, "execute_python_copy", return_value=True):
+                with self.assertLogs(level="ERROR"):
+                    self.assertFalse(
+                        execute.audit_copies([(str(session), [modality_dir])])
+                    )
+
+    def test_copy_to_vast_hardlink(self):
+        """test sources on the destination device are linked, not copied"""
+        with tempfile.TemporaryDirectory() as tmp:
+            session = Path(tmp) / "session"
+            (session / "sub").mkdir(parents=True)
+            (session / "sub" / "frames.bin").write_bytes(b"f" * 100)
+            video = Path(tmp) / "video.bin"
+            video.write_bytes(b"v" * 10)
+            primary = Path(tmp) / "primary"
+            config = self.manifest_config.model_copy(
+                update={
+                    "destination": str(primary),
+                    "modalities": {"behavior": [str(session), str(video)]},
+                    "schemas": [],
+                }
+            )
+            watch_config = self.watch_config.model_copy(
+                update={"same_device_staging": "hardlink"}
+            )
+            execute = RunJob(self.mock_event.src_path, config, watch_config)
+            with patch.object(execute, "run_subprocess") as run:
+                self.assertTrue(execute.copy_to_vast())
+            run.assert_not_called()
+            modality_dir = primary / config.name / "behavior"
+            self.assertTrue(os.path.samefile(modality_dir / "video.bin", video))
+            self.assertEqual(
+                (modality_dir / "session" / "sub" / "frames.bin").read_bytes(),
+                b"f" * 100,
+            )
+            self.assertEqual(execute.progress.bytes_copied, 110)
+            self.assertEqual(execute.progress.files_copied, 2)
+
+    def test_copy_to_vast_grouped(self):
+        """test files of a directory are copied with one run per copy worker
+        and failures are attributed to the files named in the output"""
+        with tempfile.TemporaryDirectory() as tmp:
+            sources = []
+            for name in ("a.bin", "b.bin", "c.bin", "d.bin"):
+                (Path(tmp) / name).write_bytes(b"data")
+                sources.append(str(Path(tmp) / name))
+            config = self.manifest_config.model_copy(
+                update={
+                    "destination": str(Path(tmp) / "primary"),
+                    "modalities": {"behavior": sources},
+                    "schemas": [],
+                }
+            )
+            watch_config = self.watch_config.model_copy(
+                update={"copy_workers": 2, "group_copies": True}
+            )
+
+            def rsync(cmd: list) -> subprocess.CompletedProcess:
+                """Fail to open d.bin"""
+                list_file = cmd[-4].split("=", 1)[1]
+                with open(list_file, "rb") as f:
+                    names = f.read().split(b"\0")
+                if b"d.bin" not in names:
+                    return subprocess.CompletedProcess(cmd, 0, b"", b"")
+                stderr = f'rsync: [sender] send_files failed to open "{tmp}/d.bin"'
+                return subprocess.CompletedProcess(cmd, 23, b"", stderr.encode())
+
+            execute = RunJob(self.mock_event.src_path, config, watch_config)
+            with patch("aind_watchdog_service.run_job.PLATFORM", "linux"):
+                with patch.object(execute, "run_subprocess", side_effect=rsync) as run:
+                    with self.assertLogs(level="ERROR") as logs:
+                        self.assertFalse(execute.copy_to_vast())
+            self.assertEqual(run.call_count, 2)
+            self.assertEqual(run.call_args_list[0].args[0][-2], os.path.join(tmp, ""))
+            failed = [line for line in logs.output if "Could not copy file" in line]
+            self.assertEqual(len(failed), 1)
+            self.assertIn("d.bin", failed[0])
+            self.assertEqual(execute.progress.files_copied, 3)
+
+            summary = (TEST_DIRECTORY / "resources" / "robocopy_file.txt").read_bytes()
+            execute = RunJob(self.mock_event.src_path, config, watch_config)
+            with patch("aind_watchdog_service.run_job.PLATFORM", "windows"):
+                with patch.object(
+                    execute,
+                    "run_subprocess",
+                    return_value=subprocess.CompletedProcess([], 1, summary, b""),
+                ) as run:
+                    self.assertTrue(execute.copy_to_vast())
+            commands = sorted(call.args[0][3:5] for call in run.call_args_list)
+            self.assertEqual(commands, [["a.bin", "c.bin"], ["b.bin", "d.bin"]])
+            self.assertIn("/bytes", run.call_args.args[0])
+            self.assertEqual(execute.robocopy.snapshot()["robocopy_runs"], 2)
+
+    @unittest.skipUnless(compression.available(), "zstandard is not installed")
+    def test_copy_to_vast_cpu_workers(self):
+        """test compression and packing run in CPU worker processes"""
+        with tempfile.TemporaryDirectory() as tmp:
+            trials = Path(tmp) / "trials"
+            trials.mkdir()
+            (trials / "trial_0.json").write_text("{}")
+            log = Path(tmp) / "behavior.csv"
+            log.write_text("trial,reward\n" * 10_000)
+            primary = Path(tmp) / "primary"
+            config = self.manifest_config.model_copy(
+                update={
+                    "destination": str(primary),
+                    "modalities": {"behavior": [str(trials), str(log)]},
+                    "schemas": [],
+                    "packing": PackingConfig(threshold_kb=1),
+                    "compression": {"behavior": CompressionConfig(level=1)},
+                }
+            )
+            watch_config = self.watch_config.model_copy(update={"cpu_workers": 1})
+            execute = RunJob(self.mock_event.src_path, config, watch_config)
+            self.assertTrue(execute.copy_to_vast())
+            job_dir = primary / config.name
+            self.assertEqual(
+                sorted(path.name for path in (job_dir / "behavior").iterdir()),
+                [
+                    "behavior.csv.zst",
+                    "behavior_pack_000.tar",
+                    "behavior_pack_index.json",
+                ],
+            )
+            self.assertEqual(execute.compression.files_compressed, 1)
+            self.assertEqual(execute.progress.bytes_copied, execute.progress.bytes_total)
+            self.assertTrue(execute.cpu_seconds)
+            self.assertNotIn(os.getpid(), execute.cpu_seconds)
+
+    @unittest.skipUnless(compression.available(), "zstandard is not installed")
+    def test_cpu_workers_checkpoint_between_tasks(self):
+        """test each file compressed in a CPU worker is its own task, with a
+        checkpoint before it and its output charged to the bucket"""
+        with tempfile.TemporaryDirectory() as tmp:
+            session = Path(tmp) / "session"
+            session.mkdir()
+            for number in range(3):
+                (session / f"log_{number}.csv").write_text("trial,reward\n" * 1000)
+            config = self.manifest_config.model_copy(
+                update={
+                    "destination": str(Path(tmp) / "primary"),
+                    "modalities": {"behavior": [str(session)]},
+                    "schemas": [],
+                    "compression": {"behavior": CompressionConfig(level=1)},
+                }
+            )
+            watch_config = self.watch_config.model_copy(update={"cpu_workers": 1})
+            execute = RunJob(self.mock_event.src_path, config, watch_config)
+            calls = []
+            run_cpu = execute._run_cpu
+            checkpoint = patch.object(
+                execute, "_checkpoint", side_effect=lambda: calls.append("checkpoint")
+            )
+            task = patch.object(
+                execute,
+                "_run_cpu",
+                side_effect=lambda *args: calls.append("task") or run_cpu(*args),
+            )
+            charge = patch.object(execute.bucket, "consume", wraps=execute.bucket.consume)
+            with checkpoint, task, charge as consume:
+                self.assertTrue(execute.copy_to_vast())
+            self.assertEqual(calls.count("task"), 3)
+            for number, call in enumerate(calls):
+                if call == "task":
+                    self.assertEqual(calls[number - 1], "checkpoint")
+            self.assertEqual(consume.call_count, 3)
+            self.assertEqual(execute.compression.files_compressed, 3)
+
 
 if __name__ == "__main__":
     unittest.main()
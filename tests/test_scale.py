@@ -0,0 +1,215 @@
+"""Scale tests of EventHandler with large manifest directories and event storms
+
+The load tests are slow and only run with WATCHDOG_SCALE_TEST=1. Sizes and
+budgets can be overridden with environment variables:
+
+    WATCHDOG_SCALE_MANIFESTS        manifests in the flag directory (10000)
+    WATCHDOG_SCALE_EVENTS           create/delete events of the storm (20000)
+    WATCHDOG_SCALE_P99_MS           99th percentile event latency budget (50)
+    WATCHDOG_SCALE_MIN_RATE         startup manifests per second budget (100)
+    WATCHDOG_SCALE_MAX_RSS_MB       resident memory growth budget (1024)
+
+Each test prints a JSON report of its measurements.
+"""
+
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+from unittest.mock import MagicMock, patch
+
+import yaml
+from apscheduler.schedulers.background import BackgroundScheduler
+from watchdog.events import FileCreatedEvent, FileDeletedEvent
+
+from aind_watchdog_service.event_handler import EventHandler
+from aind_watchdog_service.job_control import JobControl
+from aind_watchdog_service.models.watch_config import WatchConfig
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+TEST_DIRECTORY = Path(__file__).resolve().parent
+
+SCALE_TEST = os.environ.get("WATCHDOG_SCALE_TEST") == "1"
+MANIFESTS = int(os.environ.get("WATCHDOG_SCALE_MANIFESTS", 10_000))
+EVENTS = int(os.environ.get("WATCHDOG_SCALE_EVENTS", 20_000))
+P99_MS = float(os.environ.get("WATCHDOG_SCALE_P99_MS", 50))
+MIN_RATE = float(os.environ.get("WATCHDOG_SCALE_MIN_RATE", 100))
+MAX_RSS_MB = float(os.environ.get("WATCHDOG_SCALE_MAX_RSS_MB", 1024))
+
+
+class StubRunJob:
+    """RunJob that records being run instead of copying anything"""
+
+    def __init__(self, src_path, config, watch_config):
+        """Keep what the event handler and status API read"""
+        self.src_path = src_path
+        self.config = config
+        self.control = JobControl()
+        self.job_id = None
+
+    def run_job(self) -> None:
+        """Do nothing"""
+
+    async def run_job_async(self) -> None:
+        """Do nothing"""
+
+
+def rss_mb() -> Optional[float]:
+    """Peak resident memory of the process, None where it is unavailable"""
+    if resource is None:
+        return None
+    # kilobytes on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentiles(latencies: List[float]) -> Dict[str, float]:
+    """p50, p95, p99 and max of latencies in seconds, in milliseconds"""
+    cuts = statistics.quantiles(latencies, n=100)
+    return {
+        "p50_ms": round(cuts[49] * 1000, 3),
+        "p95_ms": round(cuts[94] * 1000, 3),
+        "p99_ms": round(cuts[98] * 1000, 3),
+        "max_ms": round(max(latencies) * 1000, 3),
+    }
+
+
+def measure(step: Callable[[], None]) -> Dict[str, float]:
+    """Wall time, CPU time and resident memory growth of a step"""
+    rss = rss_mb()
+    cpu = time.process_time()
+    wall = time.perf_counter()
+    step()
+    report = {
+        "wall_s": round(time.perf_counter() - wall, 3),
+        "cpu_s": round(time.process_time() - cpu, 3),
+    }
+    if rss is not None:
+        report["rss_growth_mb"] = round(rss_mb() - rss, 1)
+    return report
+
+
+class TestOnDeletedCost(unittest.TestCase):
+    """Test deletions do not list every scheduled job"""
+
+    @patch.object(EventHandler, "_startup_manifest_check")
+    def test_on_deleted_skips_get_jobs(self, mock_startup_manifest_check: MagicMock):
+        """Test on_deleted logs a job count instead of scheduler.get_jobs()"""
+        with open(TEST_DIRECTORY / "resources" / "watch_config.yml") as yam:
+            watch_config = WatchConfig(**yaml.safe_load(yam))
+        scheduler = MagicMock()
+        event_handler = EventHandler(scheduler, watch_config)
+        event_handler.on_deleted(FileDeletedEvent("/path/to/manifest.yml"))
+        scheduler.get_jobs.assert_not_called()
+
+
+@unittest.skipUnless(SCALE_TEST, "set WATCHDOG_SCALE_TEST=1 to run scale tests")
+@patch("aind_watchdog_service.event_handler.RunJob", StubRunJob)
+class TestScale(unittest.TestCase):
+    """Load EventHandler and a paused BackgroundScheduler with thousands of
+    manifests and events"""
+
+    def setUp(self) -> None:
+        """Write the flag directory"""
+        self.tmp = tempfile.TemporaryDirectory()
+        root = Path(self.tmp.name)
+        with open(TEST_DIRECTORY / "resources" / "watch_config.yml") as yam:
+            self.watch_config = WatchConfig(**yaml.safe_load(yam)).model_copy(
+                update={
+                    "flag_dir": str(root / "flags"),
+                    "manifest_complete": str(root / "complete"),
+                }
+            )
+        os.makedirs(self.watch_config.flag_dir)
+        os.makedirs(self.watch_config.manifest_complete)
+        with open(TEST_DIRECTORY / "resources" / "manifest.yml") as yam:
+            manifest = yaml.safe_load(yam)
+        self.paths = []
+        for number in range(MANIFESTS):
+            # Every other job is deferred, exercising pending records
+            manifest["name"] = f"scale_{number:06d}"
+            manifest["schedule_time"] = "23:59:00" if number % 2 else None
+            path = os.path.join(self.watch_config.flag_dir, f"manifest_{number:06d}.yml")
+            with open(path, "w") as f:
+                yaml.safe_dump(manifest, f)
+            self.paths.append(path)
+        self.scheduler = BackgroundScheduler()
+        self.scheduler.start(paused=True)
+
+    def tearDown(self) -> None:
+        """Stop the scheduler and remove the flag directory"""
+        self.scheduler.shutdown(wait=False)
+        self.tmp.cleanup()
+
+    def report(self, name: str, values: dict) -> None:
+        """Print the measurements of a test"""
+        print(json.dumps({"test": name, "manifests": MANIFESTS} | values))
+
+    def start_handler(self) -> EventHandler:
+        """Event handler having ingested the flag directory"""
+        event_handler = EventHandler(self.scheduler, self.watch_config)
+        event_handler.startup_thread.join()
+        return event_handler
+
+    def test_startup_ingestion(self):
+        """Test the startup backlog is ingested within budget"""
+        handlers = []
+        usage = measure(lambda: handlers.append(self.start_handler()))
+        event_handler = handlers[0]
+        rate = MANIFESTS / usage["wall_s"]
+        start = time.perf_counter()
+        scheduled = len(self.scheduler.get_jobs())
+        get_jobs_ms = (time.perf_counter() - start) * 1000
+        self.report(
+            "startup_ingestion",
+            usage
+            | {
+                "manifests_per_s": round(rate, 1),
+                "scheduled": scheduled,
+                "get_jobs_ms": round(get_jobs_ms, 3),
+            },
+        )
+        self.assertEqual(len(event_handler.jobs), MANIFESTS)
+        self.assertEqual(scheduled, MANIFESTS)
+        self.assertGreaterEqual(rate, MIN_RATE)
+        self.assertLess(usage.get("rss_growth_mb", 0), MAX_RSS_MB)
+
+    @patch("time.sleep")
+    def test_event_storm(self, mock_sleep: MagicMock):
+        """Test create/delete storms are handled within the latency budget"""
+        event_handler = self.start_handler()
+        latencies = []
+
+        def storm() -> None:
+            for number in range(EVENTS):
+                path = self.paths[number % MANIFESTS]
+                deleted = number // MANIFESTS % 2 == 0
+                event = FileDeletedEvent(path) if deleted else FileCreatedEvent(path)
+                start = time.perf_counter()
+                if deleted:
+                    event_handler.on_deleted(event)
+                else:
+                    event_handler.on_created(event)
+                latencies.append(time.perf_counter() - start)
+
+        usage = measure(storm)
+        latency = percentiles(latencies)
+        self.report(
+            "event_storm",
+            usage | latency | {"events": EVENTS, "threads": threading.active_count()},
+        )
+        self.assertLessEqual(latency["p99_ms"], P99_MS)
+        self.assertLess(usage.get("rss_growth_mb", 0), MAX_RSS_MB)
+        self.assertEqual(len(event_handler.jobs), len(self.scheduler.get_jobs()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+"""Test the local status API"""
+
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import requests
+import yaml
+from apscheduler.jobstores.base import JobLookupError
+
+from aind_watchdog_service.event_handler import EventHandler
+from aind_watchdog_service.models.manifest_config import ManifestConfig
+from aind_watchdog_service.models.watch_config import WatchConfig
+from aind_watchdog_service.status_api import StatusServer
+
+TEST_DIRECTORY = Path(__file__).resolve().parent
+
+
+class TestStatusServer(unittest.TestCase):
+    """Test StatusServer endpoints"""
+
+    @patch.object(EventHandler, "_startup_manifest_check")
+    def setUp(self, mock_startup_manifest_check: MagicMock) -> None:
+        """Start a server over an event handler with one scheduled job"""
+        with open(TEST_DIRECTORY / "resources" / "watch_config.yml") as yam:
+            watch_config = WatchConfig(**yaml.safe_load(yam))
+        with open(TEST_DIRECTORY / "resources" / "manifest.yml") as yam:
+            manifest_config = ManifestConfig(**yaml.safe_load(yam))
+        self.scheduler = MagicMock()
+        self.scheduler.add_job.return_value.id = "job1"
+        self.scheduler.add_job.return_value.next_run_time = None
+        self.event_handler = EventHandler(self.scheduler, watch_config)
+        self.event_handler.schedule_job("/path/to/manifest.yml", manifest_config)
+        self.server = StatusServer(self.event_handler, port=0)
+        self.server.start()
+        self.url = f"http://127.0.0.1:{self.server.port}"
+
+    def tearDown(self) -> None:
+        """Stop the server"""
+        self.server.stop()
+
+    def test_list_jobs(self):
+        """Test scheduled jobs are listed with progress fields"""
+        response = requests.get(f"{self.url}/jobs", timeout=5)
+        self.assertEqual(response.status_code, 200)
+        jobs = response.json()["jobs"]
+        self.assertEqual(len(jobs), 1)
+        self.assertEqual(jobs[0]["id"], "job1")
+        self.assertEqual(jobs[0]["state"], "pending")
+        self.assertEqual(jobs[0]["bytes_copied"], 0)
+
+    def test_control(self):
+        """Test settings, priority and cancel actions"""
+        response = requests.post(
+            f"{self.url}/jobs/job1/settings",
+            json={"bandwidth_mbps": 20, "concurrency": 4},
+            timeout=5,
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["concurrency"], 4)
+        self.assertEqual(response.json()["bandwidth_mbps"], 20)
+
+        response = requests.post(
+            f"{self.url}/jobs/job1/priority", json={"run_at": "now"}, timeout=5
+        )
+        self.assertEqual(response.status_code, 200)
+        self.scheduler.modify_job.assert_called_once()
+
+        response = requests.post(f"{self.url}/jobs/job1/cancel", timeout=5)
+        self.assertEqual(response.json()["state"], "cancelled")
+        self.scheduler.remove_job.assert_called_once_with("job1")
+        run = self.event_handler.runs["/path/to/manifest.yml"]
+        self.assertTrue(run.control.cancelled)
+
+    def test_bad_settings(self):
+        """Test invalid settings and bodies return 400 and change nothing"""
+        for body in (
+            {"bandwidth_mbps": "5"},
+            {"bandwidth_mbps": -1},
+            {"bandwidth_mbps": 0},
+            {"concurrency": 0},
+            {"concurrency": 2.5},
+            {"concurrency": True},
+            {"concurrency": 2, "bandwidth_mbps": "fast"},
+            [1, 2],
+            "settings",
+        ):
+            response = requests.post(
+                f"{self.url}/jobs/job1/settings", json=body, timeout=5
+            )
+            self.assertEqual(response.status_code, 400, body)
+            self.assertIn("error", response.json())
+        response = requests.post(
+            f"{self.url}/jobs/job1/settings", data=b"{not json", timeout=5
+        )
+        self.assertEqual(response.status_code, 400)
+        control = self.event_handler.runs["/path/to/manifest.yml"].control
+        self.assertEqual((control.bandwidth, control.concurrency), (None, 1))
+
+    def test_cancel_started(self):
+        """Test cancelling a job that started since it was found returns 409"""
+        self.scheduler.remove_job.side_effect = JobLookupError("job1")
+        response = requests.post(f"{self.url}/jobs/job1/cancel", timeout=5)
+        self.assertEqual(response.status_code, 409)
+        run = self.event_handler.runs["/path/to/manifest.yml"]
+        self.assertFalse(run.control.cancelled)
+
+    def test_unknown(self):
+        """Test unknown jobs and paths return 404"""
+        response = requests.post(f"{self.url}/jobs/nope/cancel", timeout=5)
+        self.assertEqual(response.status_code, 404)
+        response = requests.get(f"{self.url}/queue", timeout=5)
+        self.assertEqual(response.status_code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
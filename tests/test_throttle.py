@@ -0,0 +1,141 @@
+"""Test transfer windows and bandwidth shaping"""
+
+import datetime
+import unittest
+from unittest.mock import patch
+
+from aind_watchdog_service.models.watch_config import TransferWindow, WatchConfig
+from aind_watchdog_service.throttle import TokenBucket, TransferSchedule
+
+
+class TestTransferWindow(unittest.TestCase):
+    """Test TransferWindow model"""
+
+    def test_contains(self):
+        """Test same-day and overnight windows"""
+        day = TransferWindow(start="08:00:00", end="17:00:00")
+        self.assertTrue(day.contains(datetime.time(12)))
+        self.assertFalse(day.contains(datetime.time(17)))
+        night = TransferWindow(start="20:00:00", end="06:00:00")
+        self.assertTrue(night.contains(datetime.time(23)))
+        self.assertTrue(night.contains(datetime.time(5)))
+        self.assertFalse(night.contains(datetime.time(12)))
+
+    def test_watch_config_windows(self):
+        """Test windows are parsed from the watch config"""
+        config = WatchConfig(
+            flag_dir="/some/dir",
+            manifest_complete="/some/dir/manifest_complete",
+            transfer_windows=[
+                {"start": "20:00:00", "end": "06:00:00", "max_bandwidth_mbps": 100}
+            ],
+        )
+        self.assertEqual(config.transfer_windows[0].max_bandwidth_mbps, 100)
+        self.assertEqual(config.copy_backend, "system")
+
+
+class TestTransferSchedule(unittest.TestCase):
+    """Test TransferSchedule"""
+
+    def setUp(self) -> None:
+        """Overnight window with a cap and an unthrottled lunch window"""
+        self.schedule = TransferSchedule(
+            [
+                TransferWindow(start="20:00:00", end="06:00:00", max_bandwidth_mbps=50),
+                TransferWindow(start="12:00:00", end="13:00:00"),
+            ]
+        )
+
+    def test_no_windows_always_open(self):
+        """Test an empty schedule never blocks"""
+        schedule = TransferSchedule([])
+        now = datetime.datetime(2024, 1, 1, 15)
+        self.assertTrue(schedule.is_open(now))
+        self.assertEqual(schedule.next_opening(now), now)
+        self.assertIsNone(schedule.bandwidth(now))
+
+    def test_bandwidth(self):
+        """Test the cap of the active window"""
+        self.assertEqual(
+            self.schedule.bandwidth(datetime.datetime(2024, 1, 1, 22)), 50_000_000
+        )
+        self.assertIsNone(self.schedule.bandwidth(datetime.datetime(2024, 1, 1, 12, 30)))
+
+    def test_next_opening(self):
+        """Test the next opening rolls to the nearest window start"""
+        self.assertEqual(
+            self.schedule.next_opening(datetime.datetime(2024, 1, 1, 9)),
+            datetime.datetime(2024, 1, 1, 12),
+        )
+        self.assertEqual(
+            self.schedule.next_opening(datetime.datetime(2024, 1, 1, 14)),
+            datetime.datetime(2024, 1, 1, 20),
+        )
+        inside = datetime.datetime(2024, 1, 1, 23)
+        self.assertEqual(self.schedule.next_opening(inside), inside)
+
+
+class TestTokenBucket(unittest.TestCase):
+    """Test TokenBucket"""
+
+    def test_unthrottled(self):
+        """Test a bucket without a rate never sleeps"""
+        bucket = TokenBucket()
+        self.assertEqual(bucket.consume(10**12), 0.0)
+
+    @patch("time.sleep")
+    def test_throttled(self, mock_sleep):
+        """Test debt is paid back by sleeping"""
+        bucket = TokenBucket(rate=1000)
+        self.assertEqual(bucket.consume(500), 0.0)
+        delay = bucket.consume(1500)
+        self.assertAlmostEqual(delay, 1.0, places=1)
+        mock_sleep.assert_called_once()
+        bucket.set_rate(None)
+        self.assertEqual(bucket.consume(10**9), 0.0)
+
+    @patch("time.sleep")
+    def test_parent(self, mock_sleep):
+        """Test consuming from a job's bucket also charges its window's bucket"""
+        window = TokenBucket(rate=1000)
+        jobs = [TokenBucket(), TokenBucket()]
+        for job in jobs:
+            job.parent = window
+        self.assertEqual(jobs[0].consume(1000), 0.0)
+        # The second job finds the window's bucket empty
+        self.assertAlmostEqual(jobs[1].consume(1000), 1.0, places=1)
+        mock_sleep.assert_called_once()
+
+    def test_share(self):
+        """Test rates are split between the copies using a bucket"""
+        window = TokenBucket(rate=1000)
+        job = TokenBucket(rate=300)
+        job.parent = window
+        self.assertEqual(TokenBucket().share(), None)
+        self.assertEqual(job.share(), 300)
+        self.assertEqual(job.share(workers=4), 75)
+        other = TokenBucket()
+        other.parent = window
+        with job.use(), other.use(), other.use():
+            self.assertEqual(window._users, 3)
+            self.assertAlmostEqual(other.share(), 1000 / 3)
+            self.assertEqual(job.share(), 300)
+        self.assertEqual(window._users, 0)
+
+
+class TestSharedBucket(unittest.TestCase):
+    """Test the process-wide buckets of transfer windows"""
+
+    def test_shared_between_schedules(self):
+        """Test jobs of the same window draw from one bucket"""
+        windows = [TransferWindow(start="00:00:00", end="23:59:59", max_bandwidth_mbps=8)]
+        first, second = TransferSchedule(windows), TransferSchedule(list(windows))
+        self.assertIs(first.shared_bucket(), second.shared_bucket())
+        self.assertEqual(first.shared_bucket().rate, 8_000_000)
+        unthrottled = [TransferWindow(start="00:00:00", end="23:59:59")]
+        self.assertIsNone(TransferSchedule(unthrottled).shared_bucket())
+        self.assertIsNone(TransferSchedule([]).shared_bucket())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,230 @@
+"""Test tracking of jobs submitted to aind-data-transfer-service"""
+
+import json
+import os
+import tempfile
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from threading import Thread
+from unittest.mock import MagicMock, patch
+from urllib.parse import parse_qs, urlsplit
+
+import yaml
+
+from aind_watchdog_service import tracker
+from aind_watchdog_service.history import JobHistory
+from aind_watchdog_service.models.manifest_config import ManifestConfig
+from aind_watchdog_service.models.watch_config import TransferTrackingConfig, WatchConfig
+from aind_watchdog_service.run_job import RunJob
+from aind_watchdog_service.tracker import TransferTracker
+
+TEST_DIRECTORY = Path(__file__).resolve().parent
+
+
+class StubService:
+    """Local stand-in for the transfer service status endpoint"""
+
+    def __init__(self):
+        """Serve job states from self.states on a free port"""
+        self.states = {}
+        self.requests = []
+        self.clients = set()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            """Answer get_job_status_list"""
+
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self) -> None:
+                """List the states of the requested jobs"""
+                url = urlsplit(self.path)
+                job_ids = parse_qs(url.query).get("job_id", [])
+                stub.requests.append(job_ids)
+                stub.clients.add(self.client_address)
+                statuses = [
+                    {"job_id": job_id, "job_state": stub.states[job_id]}
+                    for job_id in job_ids
+                    if job_id in stub.states
+                ]
+                payload = json.dumps({"data": {"job_status_list": statuses}}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format: str, *args) -> None:
+                """Keep the test output clean"""
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        Thread(target=self.httpd.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def stop(self) -> None:
+        """Stop serving"""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class TestHelpers(unittest.TestCase):
+    """Test response parsing and status URLs"""
+
+    def test_submitted_job_ids(self):
+        """Test job identifiers are read from a submit_jobs response"""
+        text = json.dumps(
+            {"data": {"responses": [{"dag_run_id": "run_1"}, {"job_id": "job_2"}]}}
+        )
+        self.assertEqual(tracker.submitted_job_ids(text), ["run_1", "job_2"])
+        self.assertEqual(tracker.submitted_job_ids("not json"), [])
+        self.assertEqual(tracker.submitted_job_ids('{"message": "ok"}'), [])
+
+    def test_status_url(self):
+        """Test the status endpoint is on the submit endpoint's host"""
+        self.assertEqual(
+            tracker.status_url(
+                "http://aind-data-transfer-service/api/v1/submit_jobs",
+                "/api/v1/get_job_status_list",
+            ),
+            "http://aind-data-transfer-service/api/v1/get_job_status_list",
+        )
+
+
+class TestTransferTracker(unittest.TestCase):
+    """Test batched polling against a stub service"""
+
+    def setUp(self) -> None:
+        """Start the stub service"""
+        self.service = StubService()
+        self.url = f"{self.service.url}/api/v1/get_job_status_list"
+        self.config = TransferTrackingConfig(
+            min_interval_s=0.05, max_interval_s=0.4, batch_size=2
+        )
+
+    def tearDown(self) -> None:
+        """Stop the stub service"""
+        self.service.stop()
+
+    def test_poll_batches(self):
+        """Test outstanding jobs are polled in batches on one connection"""
+        job_tracker = TransferTracker(self.config)
+        states = {}
+        with patch.object(job_tracker, "_run"):
+            for number in range(5):
+                job_id = f"job_{number}"
+                self.service.states[job_id] = "running"
+                job_tracker.track(
+                    job_id,
+                    self.url,
+                    lambda state, job_id=job_id: states.update({job_id: state}),
+                )
+        self.assertTrue(job_tracker.poll())
+        self.assertEqual([len(batch) for batch in self.service.requests], [2, 2, 1])
+        self.assertEqual(len(self.service.clients), 1)
+        self.assertEqual(set(states.values()), {"running"})
+
+        # Unchanged states are not reported again
+        self.assertFalse(job_tracker.poll())
+
+        self.service.states.update({"job_0": "success", "job_1": "upstream_failed"})
+        self.assertTrue(job_tracker.poll())
+        self.assertEqual((states["job_0"], states["job_1"]), ("succeeded", "failed"))
+        self.assertEqual(job_tracker.outstanding, 3)
+
+    def test_adaptive_interval(self):
+        """Test polls back off while nothing changes and stop once jobs finish"""
+        job_tracker = TransferTracker(self.config)
+        states = []
+        self.service.states["job_0"] = "queued"
+        job_tracker.track("job_0", self.url, states.append)
+        deadline = time.monotonic() + 5
+        while job_tracker.interval < self.config.max_interval_s:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.05)
+        self.assertEqual(states, ["queued"])
+
+        self.service.states["job_0"] = "success"
+        while job_tracker.outstanding:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.05)
+        self.assertEqual(states, ["queued", "succeeded"])
+
+    def test_expire(self):
+        """Test jobs that never finish stop being tracked"""
+        job_tracker = TransferTracker(self.config.model_copy(update={"max_age_h": 1e-9}))
+        states = []
+        with patch.object(job_tracker, "_run"):
+            job_tracker.track("job_0", self.url, states.append)
+        with self.assertLogs(level="WARNING"):
+            job_tracker.poll()
+        self.assertEqual((states, job_tracker.outstanding), (["untracked"], 0))
+
+    def test_callback_error(self):
+        """Test a failing state callback is logged and other jobs still report"""
+        job_tracker = TransferTracker(self.config)
+        states = []
+        self.service.states.update({"job_0": "running", "job_1": "running"})
+        with patch.object(job_tracker, "_run"):
+            job_tracker.track("job_0", self.url, MagicMock(side_effect=OSError("full")))
+            job_tracker.track("job_1", self.url, states.append)
+        with self.assertLogs(level="ERROR") as logs:
+            self.assertTrue(job_tracker.poll())
+        self.assertIn("full", logs.output[0])
+        self.assertEqual(states, ["running"])
+
+
+class TestRunJobTracking(unittest.TestCase):
+    """Test a submitted job's record follows the transfer service"""
+
+    def setUp(self) -> None:
+        """Load configs"""
+        self.tmp = tempfile.TemporaryDirectory()
+        with open(TEST_DIRECTORY / "resources" / "watch_config.yml") as yam:
+            self.watch_config = WatchConfig(**yaml.safe_load(yam)).model_copy(
+                update={
+                    "transfer_tracking": TransferTrackingConfig(min_interval_s=0.05),
+                    "history_db": os.path.join(self.tmp.name, "history.sqlite"),
+                }
+            )
+        with open(TEST_DIRECTORY / "resources" / "manifest.yml") as yam:
+            self.manifest_config = ManifestConfig(**yaml.safe_load(yam))
+
+    def tearDown(self) -> None:
+        """Remove the history"""
+        self.tmp.cleanup()
+
+    @patch("aind_watchdog_service.run_job.submit_upload_jobs")
+    @patch("aind_watchdog_service.tracker.shared_tracker")
+    def test_track_submission(
+        self, mock_shared_tracker: MagicMock, mock_submit: MagicMock
+    ):
+        """Test the history record is updated with the final remote state"""
+        mock_submit.return_value = MagicMock(
+            status_code=200,
+            text=json.dumps({"data": {"responses": [{"dag_run_id": "run_1"}]}}),
+        )
+        run = RunJob("manifest.yml", self.manifest_config, self.watch_config)
+        self.assertTrue(run.trigger_transfer_service())
+        job_id, url, on_state = mock_shared_tracker.return_value.track.call_args[0]
+        self.assertEqual(job_id, "run_1")
+        self.assertEqual(
+            url, "http://aind-data-transfer-service/api/v1/get_job_status_list"
+        )
+        run.record_history()
+
+        with self.assertLogs(level="ERROR"):
+            on_state("failed")
+        history = JobHistory(self.watch_config.history_db)
+        with history._connect() as connection:
+            row = connection.execute(
+                "SELECT remote_job_id, remote_state FROM jobs"
+            ).fetchone()
+        self.assertEqual(tuple(row), ("run_1", "failed"))
+        self.assertEqual(run.remote_state, "failed")
+
+
+if __name__ == "__main__":
+    unittest.main()